@@ -31,6 +31,7 @@ class Config:
     WALLET_ENCRYPTION_KEY = os.environ.get('WALLET_ENCRYPTION_KEY')
     
     # Blockchain Configuration - RPCs must be provided via environment variables (no demo defaults)
+    # Each may list several comma-separated URLs; calls are routed to the fastest healthy one
     ETHEREUM_RPC_URL = os.getenv('ETHEREUM_RPC_URL', '')
     ETHEREUM_TESTNET_RPC_URL = os.getenv('ETHEREUM_TESTNET_RPC_URL', '')
     POLYGON_RPC_URL = os.getenv('POLYGON_RPC_URL', '')
@@ -43,6 +44,87 @@ class Config:
     # Network Configuration
     NETWORK_MODE = os.getenv('NETWORK_MODE', 'testnet')  # 'mainnet' or 'testnet'
     
+    # RPC Connection Pooling
+    RPC_POOL_SIZE = int(os.getenv('RPC_POOL_SIZE', 20))  # Keep-alive connections per network
+    RPC_REQUEST_TIMEOUT = float(os.getenv('RPC_REQUEST_TIMEOUT', 10))  # Seconds
+    RPC_HEALTH_CHECK_INTERVAL = int(os.getenv('RPC_HEALTH_CHECK_INTERVAL', 30))  # Seconds
+    RPC_ENDPOINT_BACKOFF = float(os.getenv('RPC_ENDPOINT_BACKOFF', 5))  # Seconds out of rotation after a first failure
+    RPC_ENDPOINT_MAX_BACKOFF = float(os.getenv('RPC_ENDPOINT_MAX_BACKOFF', 300))  # Cap for exponential backoff
+    RPC_HEDGING_ENABLED = os.getenv('RPC_HEDGING_ENABLED', 'false').lower() == 'true'  # Hedge slow reads to a second endpoint
+    RPC_HEDGE_PERCENTILE = float(os.getenv('RPC_HEDGE_PERCENTILE', 95))  # Hedge after this percentile of recent latency
+    RPC_HEDGE_MAX_RATIO = float(os.getenv('RPC_HEDGE_MAX_RATIO', 0.1))  # Hedges at most this share of reads
+    RPC_BATCH_SIZE = int(os.getenv('RPC_BATCH_SIZE', 100))  # Calls per JSON-RPC batch request
+    MULTICALL_BATCH_SIZE = int(os.getenv('MULTICALL_BATCH_SIZE', 500))  # Calls per Multicall3 aggregate3
+    
+    # Gas Price Oracle
+    GAS_ORACLE_REFRESH_INTERVAL = int(os.getenv('GAS_ORACLE_REFRESH_INTERVAL', 15))  # Seconds
+    GAS_ORACLE_MAX_STALENESS = int(os.getenv('GAS_ORACLE_MAX_STALENESS', 60))  # Seconds before a snapshot is refetched inline
+    GAS_ORACLE_BLOCK_COUNT = int(os.getenv('GAS_ORACLE_BLOCK_COUNT', 20))  # Blocks of eth_feeHistory per refresh
+    
+    # Chain Head Tracking
+    CHAIN_HEAD_POLL_INTERVAL = float(os.getenv('CHAIN_HEAD_POLL_INTERVAL', 4))  # Seconds between block number polls
+    CHAIN_HEAD_MAX_STALENESS = float(os.getenv('CHAIN_HEAD_MAX_STALENESS', 30))  # Seconds before a head is refetched inline
+    
+    # Pending Transaction Polling
+    TX_POLL_MIN_INTERVAL = float(os.getenv('TX_POLL_MIN_INTERVAL', 5))  # Seconds before the first recheck
+    TX_POLL_MAX_INTERVAL = float(os.getenv('TX_POLL_MAX_INTERVAL', 600))  # Cap for exponential backoff
+    TX_DROP_TIMEOUT = float(os.getenv('TX_DROP_TIMEOUT', 86400))  # Seconds pending before marked dropped
+    TX_SCHEDULER_TICK = float(os.getenv('TX_SCHEDULER_TICK', 2))  # Seconds between due-check passes
+    TX_SCHEDULER_SYNC_INTERVAL = float(os.getenv('TX_SCHEDULER_SYNC_INTERVAL', 15))  # Seconds between pending-set reloads
+    
+    # Incoming Transaction Scanning
+    BLOCK_SCANNER_INTERVAL = float(os.getenv('BLOCK_SCANNER_INTERVAL', 5))  # Seconds between block scans
+    BLOCK_SCANNER_CONFIRMATIONS = int(os.getenv('BLOCK_SCANNER_CONFIRMATIONS', 3))  # Blocks behind head before a transfer is recorded
+    BLOCK_SCANNER_MAX_BLOCKS = int(os.getenv('BLOCK_SCANNER_MAX_BLOCKS', 50))  # Blocks fetched per network per scan
+    
+    # Token Transfer Indexing
+    TOKEN_INDEXER_INTERVAL = float(os.getenv('TOKEN_INDEXER_INTERVAL', 15))  # Seconds between eth_getLogs passes
+    TOKEN_INDEXER_INITIAL_RANGE = int(os.getenv('TOKEN_INDEXER_INITIAL_RANGE', 2000))  # Blocks per log query before adapting
+    TOKEN_INDEXER_MAX_RANGE = int(os.getenv('TOKEN_INDEXER_MAX_RANGE', 10000))  # Upper bound for the adaptive range
+    TOKEN_INDEXER_MAX_BLOCKS = int(os.getenv('TOKEN_INDEXER_MAX_BLOCKS', 100000))  # Blocks indexed per contract per pass
+    
+    # Explorer Sync
+    EXPLORER_PAGE_SIZE = int(os.getenv('EXPLORER_PAGE_SIZE', 100))  # Transactions per explorer request
+    EXPLORER_MAX_PAGES = int(os.getenv('EXPLORER_MAX_PAGES', 10))  # Explorer requests per sync
+    EXPLORER_RATE_LIMIT = float(os.getenv('EXPLORER_RATE_LIMIT', 4))  # Requests per second for the API key, shared by all chains
+    EXPLORER_RATE_BURST = float(os.getenv('EXPLORER_RATE_BURST', 4))
+    EXPLORER_QUOTA_STORAGE_URL = os.getenv('EXPLORER_QUOTA_STORAGE_URL')  # redis:// URL to share the quota between workers
+    EXPLORER_SYNC_CONCURRENCY = int(os.getenv('EXPLORER_SYNC_CONCURRENCY', 4))  # Wallets synced at once
+    EXPLORER_SYNC_INTERVAL = float(os.getenv('EXPLORER_SYNC_INTERVAL', 60))  # Seconds between background sync passes
+    EXPLORER_SYNC_BATCH_SIZE = int(os.getenv('EXPLORER_SYNC_BATCH_SIZE', 100))  # Wallets per pass
+    EXPLORER_SYNC_ACTIVE_STALE_AFTER = float(os.getenv('EXPLORER_SYNC_ACTIVE_STALE_AFTER', 60))  # Resync age for recently viewed wallets
+    EXPLORER_SYNC_IDLE_STALE_AFTER = float(os.getenv('EXPLORER_SYNC_IDLE_STALE_AFTER', 3600))  # Resync age for all other wallets
+    
+    # Outbound HTTP (price, explorer, KYC and auth APIs)
+    HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+    HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', 20))  # Idle connections kept open for reuse
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30))  # Seconds an idle connection is kept
+    ASYNC_BRIDGE_TIMEOUT = float(os.getenv('ASYNC_BRIDGE_TIMEOUT', 30))  # Seconds a route waits on the shared event loop
+    
+    # Price Fetching
+    PRICE_MAX_IDS_LENGTH = int(os.getenv('PRICE_MAX_IDS_LENGTH', 1500))  # Characters of comma-joined coin ids per CoinGecko call
+    PRICE_MAX_IDS_PER_REQUEST = int(os.getenv('PRICE_MAX_IDS_PER_REQUEST', 250))
+    PRICE_CACHE_FRESH_TTL = float(os.getenv('PRICE_CACHE_FRESH_TTL', 30))  # Seconds a cached price is served as current
+    PRICE_CACHE_STALE_TTL = float(os.getenv('PRICE_CACHE_STALE_TTL', 300))  # Seconds before a cached price is refetched inline
+    PRICE_CACHE_HOT_WINDOW = float(os.getenv('PRICE_CACHE_HOT_WINDOW', 600))  # Seconds a requested price is kept warm
+    PRICE_CACHE_REFRESH_INTERVAL = float(os.getenv('PRICE_CACHE_REFRESH_INTERVAL', 20))  # Seconds between background refreshes
+    PRICE_TICKER_INTERVAL = float(os.getenv('PRICE_TICKER_INTERVAL', 5))  # Seconds between Socket.IO price polls
+    PRICE_TICKER_MIN_CHANGE = float(os.getenv('PRICE_TICKER_MIN_CHANGE', 0.0005))  # Relative move required to push a tick
+    PRICE_TICKER_SYMBOLS = os.getenv('PRICE_TICKER_SYMBOLS', 'bitcoin,ethereum,matic-network,binancecoin,tether,usd-coin')  # Coin ids clients may subscribe to
+    PRICE_TICKER_MAX_SYMBOLS = int(os.getenv('PRICE_TICKER_MAX_SYMBOLS', 20))  # Price subscriptions allowed per session
+    PRICE_HISTORY_DIR = os.getenv('PRICE_HISTORY_DIR', 'price_history')  # OHLC segment files; relative paths are under the instance folder
+    PRICE_HISTORY_RAW_RETENTION = float(os.getenv('PRICE_HISTORY_RAW_RETENTION', 86400))  # Seconds of raw points kept in memory
+    PRICE_HISTORY_FLUSH_INTERVAL = float(os.getenv('PRICE_HISTORY_FLUSH_INTERVAL', 60))  # Seconds between candle writes
+    PRICE_HISTORY_1M_RETENTION = float(os.getenv('PRICE_HISTORY_1M_RETENTION', 7 * 86400))  # Seconds of 1m candles kept
+    PRICE_HISTORY_1H_RETENTION = float(os.getenv('PRICE_HISTORY_1H_RETENTION', 365 * 86400))  # Seconds of 1h candles kept; 1d are kept forever
+    PORTFOLIO_BALANCE_TIMEOUT = float(os.getenv('PORTFOLIO_BALANCE_TIMEOUT', 5))  # Seconds per chain before the stored balance is used
+    PORTFOLIO_TOKEN_TIMEOUT = float(os.getenv('PORTFOLIO_TOKEN_TIMEOUT', 5))  # Seconds per chain before last known token balances are used
+    PORTFOLIO_PRICE_TIMEOUT = float(os.getenv('PORTFOLIO_PRICE_TIMEOUT', 3))  # Seconds before cached prices of any age are used
+    
+    # Nonce Management - set to a redis:// URL to share nonces between workers
+    NONCE_STORAGE_URL = os.getenv('NONCE_STORAGE_URL')
+    NONCE_TTL = int(os.getenv('NONCE_TTL', 3600))  # Idle seconds before a cached nonce is resynced from the node
+    
     # API Keys
     ALCHEMY_API_KEY = os.getenv('ALCHEMY_API_KEY', '')
     INFURA_PROJECT_ID = os.getenv('INFURA_PROJECT_ID', '')
@@ -117,3 +199,14 @@ config = {
 def get_config():
     """Get configuration based on environment"""
     return config.get(os.environ.get('NODE_ENV', 'development'), DevelopmentConfig)
+
+def get_setting(name: str, default=None):
+    """Get a setting from the Flask app config, falling back to the active config class"""
+    try:
+        from flask import current_app
+        if current_app:
+            return current_app.config.get(name, default)
+    except RuntimeError:
+        # Not in an application context
+        pass
+    return getattr(get_config(), name, default)
@@ -84,7 +84,8 @@ class DatabaseMigrator:
                 id SERIAL PRIMARY KEY,
                 user_id INTEGER REFERENCES user(id) ON DELETE CASCADE,
                 wallet_id INTEGER REFERENCES wallet(id) ON DELETE CASCADE,
-                transaction_hash VARCHAR(66) UNIQUE,
+                transaction_hash VARCHAR(66),
+                log_index INTEGER NOT NULL DEFAULT -1,
                 from_address VARCHAR(42) NOT NULL,
                 to_address VARCHAR(42) NOT NULL,
                 amount VARCHAR(50) NOT NULL,
@@ -95,7 +96,8 @@ class DatabaseMigrator:
                 gas_fee VARCHAR(50),
                 block_number INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                confirmed_at TIMESTAMP
+                confirmed_at TIMESTAMP,
+                UNIQUE (transaction_hash, log_index, wallet_id)
             )
             """,
             """
@@ -150,13 +152,14 @@ class DatabaseMigrator:
         
         for row in sqlite_cursor.fetchall():
             postgres_cursor.execute("""
-                INSERT INTO transaction (id, user_id, wallet_id, transaction_hash, from_address, to_address,
+                INSERT INTO transaction (id, user_id, wallet_id, transaction_hash, log_index, from_address, to_address,
                                        amount, currency, network, transaction_type, status, gas_fee,
                                        block_number, created_at, confirmed_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (transaction_hash) DO NOTHING
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (transaction_hash, log_index, wallet_id) DO NOTHING
             """, (
                 row['id'], row['user_id'], row['wallet_id'], row['transaction_hash'],
+                row['log_index'] if 'log_index' in row.keys() else -1,
                 row['from_address'], row['to_address'], row['amount'], row['currency'],
                 row['network'], row['transaction_type'], row['status'], row['gas_fee'],
                 row['block_number'], row['created_at'], row['confirmed_at']
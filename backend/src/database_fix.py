@@ -62,7 +62,8 @@ def fix_database():
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
                 wallet_id INTEGER NOT NULL,
-                transaction_hash VARCHAR(66) UNIQUE,
+                transaction_hash VARCHAR(66),
+                log_index INTEGER NOT NULL DEFAULT -1,
                 from_address VARCHAR(42) NOT NULL,
                 to_address VARCHAR(42) NOT NULL,
                 amount VARCHAR(50) NOT NULL,
@@ -75,7 +76,8 @@ def fix_database():
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 confirmed_at DATETIME,
                 FOREIGN KEY (user_id) REFERENCES user (id),
-                FOREIGN KEY (wallet_id) REFERENCES wallet (id)
+                FOREIGN KEY (wallet_id) REFERENCES wallet (id),
+                UNIQUE (transaction_hash, log_index, wallet_id)
             )
         ''')
         
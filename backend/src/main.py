@@ -77,7 +77,10 @@ with app.app_context():
 # Start background monitoring services
 def start_background_services():
     """Start background monitoring services"""
-    from src.services.websocket import get_transaction_monitor, get_balance_monitor
+    from src.services.websocket import get_transaction_monitor, get_balance_monitor, get_price_ticker, get_websocket_manager
+    from src.services.monitor import get_incoming_scanner
+    from src.services.token_indexer import get_token_indexer
+    from src.services.explorer_sync import get_explorer_sync_scheduler
 
     def run_transaction_monitor():
         with app.app_context():
@@ -95,12 +98,49 @@ def start_background_services():
             if monitor:
                 loop.run_until_complete(monitor.start_monitoring())
 
+    def run_incoming_scanner():
+        with app.app_context():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            scanner = get_incoming_scanner(get_websocket_manager())
+            loop.run_until_complete(scanner.start_scanning())
+
+    def run_token_indexer():
+        with app.app_context():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            indexer = get_token_indexer(get_websocket_manager())
+            loop.run_until_complete(indexer.start_indexing())
+
+    def run_explorer_sync():
+        with app.app_context():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            scheduler = get_explorer_sync_scheduler()
+            loop.run_until_complete(scheduler.start_syncing())
+
+    def run_price_ticker():
+        with app.app_context():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            ticker = get_price_ticker()
+            if ticker:
+                loop.run_until_complete(ticker.start_ticking())
+
     # Start monitors in separate threads
     tx_thread = threading.Thread(target=run_transaction_monitor, daemon=True)
     balance_thread = threading.Thread(target=run_balance_monitor, daemon=True)
+    scanner_thread = threading.Thread(target=run_incoming_scanner, daemon=True)
+    indexer_thread = threading.Thread(target=run_token_indexer, daemon=True)
+    explorer_sync_thread = threading.Thread(target=run_explorer_sync, daemon=True)
+    price_ticker_thread = threading.Thread(target=run_price_ticker, daemon=True)
 
     tx_thread.start()
     balance_thread.start()
+    scanner_thread.start()
+    indexer_thread.start()
+    explorer_sync_thread.start()
+    price_ticker_thread.start()
 
 # Start background services
 start_background_services()
@@ -73,14 +73,15 @@ class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     wallet_id = db.Column(db.Integer, db.ForeignKey('wallet.id'), nullable=False)
-    transaction_hash = db.Column(db.String(66), unique=True)
+    transaction_hash = db.Column(db.String(66))
+    log_index = db.Column(db.Integer, nullable=False, default=-1)  # Transfer log index for token rows, -1 for native transfers
     from_address = db.Column(db.String(42), nullable=False)
     to_address = db.Column(db.String(42), nullable=False)
     amount = db.Column(db.String(50), nullable=False)
     currency = db.Column(db.String(10), nullable=False)
     network = db.Column(db.String(20), nullable=False)
     transaction_type = db.Column(db.String(10), nullable=False)  # 'send' or 'receive'
-    status = db.Column(db.String(20), default='pending')  # 'pending', 'confirmed', 'failed'
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'confirmed', 'failed', 'dropped'
     gas_fee = db.Column(db.String(50))
     gas_used = db.Column(db.Integer)
     gas_price = db.Column(db.String(50))
@@ -91,6 +92,9 @@ class Transaction(db.Model):
     # Relationship
     wallet = db.relationship('Wallet', backref='transactions')
     
+    # One row per wallet per transfer: a transaction can move several tokens to several wallets
+    __table_args__ = (db.UniqueConstraint('transaction_hash', 'log_index', 'wallet_id'),)
+    
     def to_dict(self):
         """Convert transaction to dictionary"""
         return {
@@ -111,6 +115,28 @@ class Transaction(db.Model):
             'confirmed_at': self.confirmed_at.isoformat() if self.confirmed_at else None
         }
 
+class TokenTransferCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    network = db.Column(db.String(20), nullable=False)
+    contract_address = db.Column(db.String(42), nullable=False)  # Lowercase token contract address
+    last_block = db.Column(db.Integer, nullable=False)  # Last block whose Transfer logs were indexed
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('network', 'contract_address'),)
+
+class WalletSyncState(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    wallet_id = db.Column(db.Integer, db.ForeignKey('wallet.id'), nullable=False, unique=True)
+    last_synced_block = db.Column(db.Integer, nullable=True)  # High-water mark of incremental explorer sync
+    backfill_cursor = db.Column(db.Integer, nullable=True)  # Highest block older history is still missing below (inclusive)
+    backfill_complete = db.Column(db.Boolean, default=False)
+    backfill_requested = db.Column(db.Boolean, default=False)  # Owner asked for older history; due every pass until complete
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+    last_requested_at = db.Column(db.DateTime, nullable=True)  # Last time the owner read this wallet's data
+    
+    # Relationship
+    wallet = db.relationship('Wallet', backref=db.backref('sync_state', uselist=False))
+
 class AuthToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -3,6 +3,9 @@ from flask_cors import cross_origin
 from src.models.user import User, Wallet, Transaction, db
 from src.utils.security import require_auth, require_admin
 from src.utils.rate_limiter import admin_rate_limit
+from src.services.blockchain import get_blockchain_service, get_price_service
+from src.services.token_registry import get_token_registry
+from src.utils.http_client import get_http_client
 from datetime import datetime, timedelta
 from sqlalchemy import func
 import csv
@@ -505,3 +508,54 @@ def get_analytics():
         
     except Exception as e:
         return jsonify({'success': False, 'error': f'Failed to get analytics: {str(e)}'}), 500
+
+@admin_bp.route('/admin/rpc/stats', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_admin
+@admin_rate_limit()
+def get_rpc_stats():
+    """Get RPC connection pool, health, chain head, outbound HTTP and price cache statistics"""
+    try:
+        return jsonify({
+            'success': True,
+            'rpc': get_blockchain_service().get_provider_stats(),
+            'chain_heads': get_blockchain_service().chain_head.get_stats(),
+            'http': get_http_client().get_stats(),
+            'price_cache': get_price_service().cache.get_stats()
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Failed to get RPC stats: {str(e)}'}), 500
+
+@admin_bp.route('/admin/tokens', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_admin
+@admin_rate_limit()
+def get_token_registry_info():
+    """Get loaded token contracts and cached metadata"""
+    try:
+        return jsonify({
+            'success': True,
+            'registry': get_token_registry().get_info()
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Failed to get token registry: {str(e)}'}), 500
+
+@admin_bp.route('/admin/tokens/reload', methods=['POST'])
+@cross_origin()
+@require_auth
+@require_admin
+@admin_rate_limit()
+def reload_token_registry():
+    """Reload token contract addresses from the environment"""
+    try:
+        return jsonify({
+            'success': True,
+            'registry': get_token_registry().reload()
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Failed to reload token registry: {str(e)}'}), 500
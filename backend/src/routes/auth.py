@@ -3,7 +3,7 @@ from flask_cors import cross_origin
 from src.models.user import User, db
 from functools import wraps
 import os
-import requests
+from src.utils.http_client import get_http_client
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -16,7 +16,7 @@ def verify_supabase_token(token):
     """Verify Supabase JWT token"""
     try:
         headers = {'Authorization': f'Bearer {token}', 'apikey': SUPABASE_ANON_KEY}
-        response = requests.get(f'{SUPABASE_URL}/auth/v1/user', headers=headers)
+        response = get_http_client().request_sync('supabase', 'GET', f'{SUPABASE_URL}/auth/v1/user', headers=headers)
         if response.status_code == 200:
             return response.json()
         return None
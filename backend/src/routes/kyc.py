@@ -4,8 +4,8 @@ from src.models.user import User, db
 from src.utils.security import require_auth, require_admin, sanitize_input
 from src.utils.rate_limiter import kyc_rate_limit
 from src.services.kyc import get_kyc_service, get_aml_service, KYCVerification, AMLCheck
+from src.utils.async_bridge import run_async
 from datetime import datetime
-import asyncio
 
 kyc_bp = Blueprint('kyc', __name__)
 
@@ -80,10 +80,7 @@ def submit_kyc_verification():
         kyc_service = get_kyc_service()
         
         # Run async verification
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(kyc_service.verify_identity(user.id, document_data))
-        loop.close()
+        result = run_async(kyc_service.verify_identity(user.id, document_data))
         
         if result['success']:
             return jsonify({
@@ -160,10 +157,7 @@ def run_aml_screening():
         # Run AML screening
         aml_service = get_aml_service()
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(aml_service.screen_user(user.id, user_data))
-        loop.close()
+        result = run_async(aml_service.screen_user(user.id, user_data))
         
         if result['success']:
             return jsonify({
@@ -1,7 +1,10 @@
+import time
 from flask import Blueprint, jsonify, request
 from flask_cors import cross_origin
 from src.services.blockchain import get_price_service
-import asyncio
+from src.services.portfolio import get_portfolio_engine
+from src.services.price_history import RESOLUTIONS, get_price_history_store
+from src.utils.async_bridge import run_async
 
 price_bp = Blueprint('price', __name__)
 
@@ -13,7 +16,7 @@ def get_crypto_price(symbol):
         vs_currency = request.args.get('vs_currency', 'usd')
         
         price_service = get_price_service()
-        result = asyncio.run(price_service.get_price(symbol, vs_currency))
+        result = run_async(price_service.get_price(symbol, vs_currency))
         
         if result['success']:
             return jsonify({
@@ -36,6 +39,51 @@ def get_crypto_price(symbol):
             'error': f'Failed to get price: {str(e)}'
         }), 500
 
+@price_bp.route('/price/<symbol>/history', methods=['GET'])
+@cross_origin()
+def get_price_history(symbol):
+    """Get OHLC price candles for a cryptocurrency"""
+    try:
+        vs_currency = request.args.get('vs_currency', 'usd')
+        resolution = request.args.get('resolution', '1h')
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        
+        if resolution not in RESOLUTIONS:
+            return jsonify({
+                'success': False,
+                'error': f"Resolution must be one of: {', '.join(RESOLUTIONS)}"
+            }), 400
+        
+        if start is None:
+            # Default to the last 24 hours of 1m/1h candles and the last year of daily ones
+            start = time.time() - (365 * 86400 if resolution == '1d' else 86400)
+        
+        candles = get_price_history_store().get_history(symbol, vs_currency, resolution, start, end)
+        
+        return jsonify({
+            'success': True,
+            'symbol': symbol,
+            'vs_currency': vs_currency,
+            'resolution': resolution,
+            'candles': [
+                {
+                    'time': int(candle['time']),
+                    'open': float(candle['open']),
+                    'high': float(candle['high']),
+                    'low': float(candle['low']),
+                    'close': float(candle['close'])
+                }
+                for candle in candles
+            ]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to get price history: {str(e)}'
+        }), 500
+
 @price_bp.route('/prices', methods=['POST'])
 @cross_origin()
 def get_multiple_prices():
@@ -54,8 +102,11 @@ def get_multiple_prices():
         price_service = get_price_service()
         prices = {}
         
+        # One upstream call for every symbol
+        results = run_async(price_service.get_prices(symbols, [vs_currency]))
+        
         for symbol in symbols:
-            result = asyncio.run(price_service.get_price(symbol, vs_currency))
+            result = results[symbol][vs_currency]
             if result['success']:
                 prices[symbol] = {
                     'price': result['price'],
@@ -82,55 +133,63 @@ def get_multiple_prices():
 @price_bp.route('/portfolio-value', methods=['POST'])
 @cross_origin()
 def calculate_portfolio_value():
-    """Calculate total portfolio value"""
+    """Calculate total portfolio value in one or more currencies"""
     try:
         data = request.get_json() or {}
         holdings = data.get('holdings', {})  # {symbol: amount}
         vs_currency = data.get('vs_currency', 'usd')
+        vs_currencies = data.get('vs_currencies', [vs_currency])
+        
+        if (not isinstance(vs_currencies, list) or not vs_currencies
+                or not all(isinstance(currency, str) and currency for currency in vs_currencies)):
+            return jsonify({
+                'success': False,
+                'error': 'vs_currencies must be a non-empty list of currency codes'
+            }), 400
+        vs_currency = vs_currencies[0]
         
         if not holdings:
             return jsonify({
                 'success': True,
                 'total_value': 0,
                 'breakdown': {},
-                'vs_currency': vs_currency
+                'vs_currency': vs_currency,
+                'totals': {},
+                'vs_currencies': vs_currencies
             })
         
-        price_service = get_price_service()
-        total_value = 0
-        breakdown = {}
+        # One price batch and one vectorized pass for every holding and currency
+        valuation = run_async(get_portfolio_engine().value(holdings, vs_currencies))
+        vs_currency = valuation['vs_currencies'][0]
         
-        for symbol, amount in holdings.items():
-            try:
-                amount_float = float(amount)
-                result = asyncio.run(price_service.get_price(symbol, vs_currency))
-                
-                if result['success']:
-                    price = result['price']
-                    value = amount_float * price
-                    total_value += value
-                    
-                    breakdown[symbol] = {
-                        'amount': amount_float,
-                        'price': price,
-                        'value': value,
-                        'change_24h': result['change_24h']
-                    }
-                else:
-                    breakdown[symbol] = {
-                        'amount': amount_float,
-                        'error': result['error']
-                    }
-            except ValueError:
+        breakdown = {}
+        for symbol, asset in valuation['assets'].items():
+            if 'error' in asset:
+                breakdown[symbol] = {'error': asset['error']}
+                continue
+            
+            quote = asset['values'][vs_currency]
+            if quote['price'] is None:
                 breakdown[symbol] = {
-                    'error': 'Invalid amount format'
+                    'amount': asset['amount'],
+                    'error': f'Price data not found for {symbol}'
+                }
+            else:
+                breakdown[symbol] = {
+                    'amount': asset['amount'],
+                    'price': quote['price'],
+                    'value': quote['value'],
+                    'change_24h': quote['change_24h']
                 }
         
         return jsonify({
             'success': True,
-            'total_value': total_value,
+            'total_value': valuation['totals'][vs_currency]['value'],
             'breakdown': breakdown,
-            'vs_currency': vs_currency
+            'vs_currency': vs_currency,
+            'totals': valuation['totals'],
+            'assets': valuation['assets'],
+            'vs_currencies': valuation['vs_currencies']
         })
         
     except Exception as e:
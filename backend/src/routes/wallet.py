@@ -5,8 +5,8 @@ from src.utils.security import require_auth, validate_ethereum_address, sanitize
 from src.utils.crypto_utils import WalletEncryption
 from src.utils.rate_limiter import wallet_rate_limit, transaction_rate_limit
 from src.services.blockchain import get_blockchain_service, get_price_service
+from src.utils.async_bridge import run_async
 from datetime import datetime
-import asyncio
 import secrets
 
 wallet_bp = Blueprint('wallet', __name__)
@@ -385,32 +385,17 @@ def get_prices():
         
         prices = {}
         
-        # Get prices asynchronously
-        async def get_all_prices():
-            tasks = []
-            for symbol in symbols:
-                task = price_service.get_price(symbol, vs_currency)
-                tasks.append(task)
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            return results
-        
-        # Run async function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            results = loop.run_until_complete(get_all_prices())
-            
-            for i, result in enumerate(results):
-                if isinstance(result, dict) and result.get('success'):
-                    symbol = symbols[i]
-                    prices[symbol] = {
-                        'price': result['price'],
-                        'change_24h': result.get('change_24h', 0),
-                        'vs_currency': vs_currency
-                    }
-        finally:
-            loop.close()
+        # Get all prices in one upstream call on the shared bridge loop
+        results = run_async(price_service.get_prices(symbols, [vs_currency]))
+        
+        for symbol in symbols:
+            result = results[symbol][vs_currency]
+            if result.get('success'):
+                prices[symbol] = {
+                    'price': result['price'],
+                    'change_24h': result.get('change_24h', 0),
+                    'vs_currency': vs_currency
+                }
         
         return jsonify({
             'success': True,
@@ -5,10 +5,11 @@ from src.utils.security import require_auth, validate_ethereum_address, sanitize
 from src.utils.crypto_utils import WalletEncryption
 from src.utils.rate_limiter import wallet_rate_limit, transaction_rate_limit
 from src.services.blockchain import get_blockchain_service
-from src.services.transaction_monitor import get_transaction_monitor
+from src.services.explorer_sync import mark_wallet_requested
+from src.services.portfolio import get_portfolio_snapshot_service
+from src.utils.async_bridge import run_async
 from datetime import datetime
 import secrets
-import asyncio
 
 wallet_bp = Blueprint('wallet_simple', __name__)
 
@@ -365,6 +366,37 @@ def list_wallets():
             'error': f'Failed to list wallets: {str(e)}'
         }), 500
 
+@wallet_bp.route('/wallet/portfolio', methods=['GET'])
+@cross_origin()
+@require_auth
+def get_portfolio():
+    """Get balances, token balances, prices and valuation for all of the user's wallets at once"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'success': False, 'error': 'User not found'}), 404
+        
+        vs_currencies = request.args.getlist('vs_currencies') or [request.args.get('vs_currency', 'usd')]
+        wallets = Wallet.query.filter_by(user_id=user.id, is_active=True).all()
+        
+        # Every chain, token contract and the price source are queried concurrently
+        snapshot = run_async(get_portfolio_snapshot_service().build([
+            {'id': wallet.id, 'network': wallet.network, 'address': wallet.address, 'balance': wallet.balance}
+            for wallet in wallets
+        ], vs_currencies))
+        
+        # Keep fresh native balances as the fallback for the next request
+        fresh = {entry['id']: entry['balance'] for entry in snapshot['wallets'] if not entry['stale']}
+        for wallet in wallets:
+            if wallet.id in fresh:
+                wallet.balance = fresh[wallet.id]
+        db.session.commit()
+        
+        return jsonify({'success': True, **snapshot})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Failed to get portfolio: {str(e)}'}), 500
+
 @wallet_bp.route('/wallet/refresh-balances', methods=['POST'])
 @cross_origin()
 @require_auth
@@ -406,6 +438,64 @@ def refresh_balances():
             'error': f'Failed to refresh balances: {str(e)}'
         }), 500
 
+@wallet_bp.route('/wallet/token-balances', methods=['GET'])
+@cross_origin()
+@require_auth
+def get_token_balances():
+    """Get ERC20 token balances for all user wallets in one call per network"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'success': False, 'error': 'User not found'}), 404
+
+        network_filter = request.args.get('network')
+        token_filter = [t.strip().upper() for t in request.args.get('tokens', '').split(',') if t.strip()]
+
+        query = Wallet.query.filter_by(user_id=user.id, is_active=True)
+        if network_filter:
+            query = query.filter_by(network=network_filter)
+        wallets = query.all()
+
+        blockchain_svc = get_blockchain_service_instance()
+        contracts = blockchain_svc.get_token_contracts()
+
+        # Every (address, token) pair the user holds, grouped per network
+        pairs_by_network = {}
+        for wallet in wallets:
+            for token_symbol in contracts.get(wallet.network, {}):
+                if token_filter and token_symbol not in token_filter:
+                    continue
+                pairs_by_network.setdefault(wallet.network, []).append((wallet.address, token_symbol))
+
+        results = blockchain_svc.get_token_balances(pairs_by_network)
+
+        token_balances = {}
+        for network, network_results in results.items():
+            token_balances[network] = {}
+            for (address, token_symbol), result in network_results.items():
+                if result['success']:
+                    token_balances[network][token_symbol] = {
+                        'balance': result['balance'],
+                        'address': address,
+                        'mock': result.get('mock', False)
+                    }
+                else:
+                    token_balances[network][token_symbol] = {
+                        'error': result['error'],
+                        'address': address
+                    }
+
+        return jsonify({
+            'success': True,
+            'token_balances': token_balances
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to get token balances: {str(e)}'
+        }), 500
+
 @wallet_bp.route('/wallet/send', methods=['POST'])
 @cross_origin()
 @require_auth
@@ -432,17 +522,24 @@ def estimate_gas():
                 }), 400
 
         network = sanitize_input(data['network'])
+        speed = sanitize_input(data.get('speed', 'standard'))
         
-        # Get gas estimate from blockchain service
+        # Get gas estimate from the in-memory gas oracle snapshot
         blockchain_svc = get_blockchain_service_instance()
-        gas_result = blockchain_svc.estimate_gas_fee(network)
+        gas_result = blockchain_svc.estimate_gas_fee(network, speed=speed)
         
         if gas_result['success']:
             return jsonify({
                 'success': True,
                 'gas_fee': gas_result['gas_fee'],
                 'gas_price': gas_result.get('gas_price'),
-                'gas_limit': gas_result.get('gas_limit')
+                'gas_limit': gas_result.get('gas_limit'),
+                'max_gas_fee': gas_result.get('max_gas_fee'),
+                'speed': gas_result.get('speed'),
+                'eip1559': gas_result.get('eip1559', False),
+                'tiers': gas_result.get('tiers'),
+                'updated_at': gas_result.get('updated_at'),
+                'mock': gas_result.get('mock', False)
             })
         else:
             return jsonify({
@@ -484,15 +581,13 @@ def get_wallet_history(network):
                 'error': f'No active wallet found for {network}'
             }), 404
 
-        # Sync transactions from blockchain if requested
-        if sync_blockchain:
-            try:
-                monitor = get_transaction_monitor()
-                sync_result = asyncio.run(monitor.sync_wallet_transactions(wallet.id))
-                if not sync_result['success']:
-                    print(f"Warning: Failed to sync transactions: {sync_result['error']}")
-            except Exception as e:
-                print(f"Warning: Transaction sync failed: {str(e)}")
+        # History is kept fresh by the background explorer sync; viewing it
+        # (or asking for a sync) moves this wallet to the front of the queue
+        try:
+            mark_wallet_requested(wallet, min_interval=0 if sync_blockchain else 60)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Warning: Failed to record wallet activity: {str(e)}")
 
         # Get transactions for this network
         transactions = Transaction.query.filter_by(
@@ -544,7 +639,11 @@ def get_wallet_history(network):
 @cross_origin()
 @require_auth
 def sync_transactions(network):
-    """Manually sync transactions from blockchain for a network"""
+    """Queue a transaction sync from the blockchain explorer for a network
+
+    With ?backfill=true the wallet stays at the front of the sync queue, taking
+    a backfill step every pass, until its older history is complete.
+    """
     try:
         user = get_current_user()
         if not user:
@@ -563,22 +662,20 @@ def sync_transactions(network):
                 'error': f'No active wallet found for {network}'
             }), 404
 
-        # Sync transactions from blockchain
-        monitor = get_transaction_monitor()
-        sync_result = asyncio.run(monitor.sync_wallet_transactions(wallet.id))
-        
-        if sync_result['success']:
-            return jsonify({
-                'success': True,
-                'synced_transactions': sync_result['synced_transactions'],
-                'total_found': sync_result['total_found'],
-                'message': f"Synced {sync_result['synced_transactions']} new transactions"
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': sync_result['error']
-            }), 500
+        # Queue the wallet for the background explorer sync instead of syncing inline
+        backfill = request.args.get('backfill', 'false').lower() == 'true'
+        mark_wallet_requested(wallet, min_interval=0, backfill=backfill)
+        state = wallet.sync_state
+
+        return jsonify({
+            'success': True,
+            'queued': True,
+            'last_synced_block': state.last_synced_block,
+            'last_synced_at': state.last_synced_at.isoformat() if state.last_synced_at else None,
+            'backfill_complete': bool(state.backfill_complete),
+            'backfill_requested': bool(state.backfill_requested),
+            'message': 'Transaction backfill scheduled' if state.backfill_requested else 'Transaction sync scheduled'
+        }), 202
 
     except Exception as e:
         return jsonify({
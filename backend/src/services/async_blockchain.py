@@ -0,0 +1,621 @@
+"""
+Asynchronous blockchain service
+Async twin of BlockchainService built on AsyncWeb3, with one shared aiohttp
+connection pool per event loop so monitors can run many RPC calls concurrently
+"""
+import asyncio
+import json
+import logging
+import time
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+from src.config import get_setting
+from src.services.batch_rpc import chunk
+from src.services.blockchain import get_blockchain_service
+from src.services.gas_oracle import FEE_TIERS, parse_fee_history, snapshot_fee_fields
+from src.services.token_registry import ERC20_ABI
+
+try:
+    import aiohttp
+    from web3 import AsyncWeb3, Web3
+    from web3.providers.async_rpc import AsyncHTTPProvider
+    ASYNC_WEB3_AVAILABLE = True
+except ImportError:
+    ASYNC_WEB3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+if ASYNC_WEB3_AVAILABLE:
+    class PooledAsyncHTTPProvider(AsyncHTTPProvider):
+        """Async HTTP provider that routes every request to the best endpoint over a shared aiohttp session"""
+
+        def __init__(self, router, session: 'aiohttp.ClientSession', timeout: float, hedge_policy=None):
+            super().__init__(router.urls[0])
+            self.router = router
+            self.session = session
+            self.timeout = aiohttp.ClientTimeout(total=timeout)
+            self.hedge_policy = hedge_policy
+
+        async def _post_to(self, endpoint, count_timeouts: bool = True, **kwargs) -> bytes:
+            """POST to one endpoint and record the outcome with the router"""
+            start_time = time.time()
+            try:
+                async with self.session.post(endpoint.url, timeout=self.timeout, **kwargs) as response:
+                    response.raise_for_status()
+                    raw_response = await response.read()
+            except asyncio.TimeoutError as e:
+                if count_timeouts:
+                    self.router.record_failure(endpoint, e)
+                raise
+            except aiohttp.ClientError as e:
+                self.router.record_failure(endpoint, e)
+                raise
+            self.router.record_success(endpoint, time.time() - start_time)
+            return raw_response
+
+        async def _post(self, count_timeouts: bool = True, **kwargs) -> bytes:
+            """POST to the best endpoint, failing over to the next one on transport errors"""
+            last_error = None
+            for endpoint in self.router.ranked_endpoints():
+                try:
+                    return await self._post_to(endpoint, count_timeouts=count_timeouts, **kwargs)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    last_error = e
+            raise last_error
+
+        async def _post_hedged(self, **kwargs) -> bytes:
+            """POST to the best endpoint and hedge to the runner-up if it is slower than usual"""
+            endpoints = self.router.ranked_endpoints()
+            if len(endpoints) < 2:
+                return await self._post(**kwargs)
+
+            primary, backup = endpoints[0], endpoints[1]
+            hedge_delay = self.router.latency_percentile(primary, self.hedge_policy.percentile, self.hedge_policy.min_samples)
+            if hedge_delay is None:
+                return await self._post(**kwargs)
+
+            tasks = {asyncio.ensure_future(self._post_to(primary, **kwargs)): primary}
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and self.hedge_policy.try_acquire():
+                tasks[asyncio.ensure_future(self._post_to(backup, **kwargs))] = backup
+
+            pending = set(tasks)
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            if tasks[task] is backup:
+                                self.hedge_policy.record_win()
+                            return task.result()
+            finally:
+                # The first answer won; drop the slower request
+                for task in pending:
+                    task.cancel()
+
+            # Both attempts failed; fail over through whatever is still in rotation
+            return await self._post(**kwargs)
+
+        async def make_request(self, method, params):
+            request_data = self.encode_rpc_request(method, params)
+            # A slow eth_getLogs means the block range is too wide, not that the endpoint is down
+            kwargs = {'data': request_data, 'headers': self.get_request_headers(),
+                      'count_timeouts': method != 'eth_getLogs'}
+            if self.hedge_policy and self.hedge_policy.should_hedge(method):
+                raw_response = await self._post_hedged(**kwargs)
+            else:
+                raw_response = await self._post(**kwargs)
+            return self.decode_rpc_response(raw_response)
+
+        async def make_batch_request(self, calls: List[Tuple[str, list]]) -> List[Dict]:
+            """Send several JSON-RPC calls in one HTTP request, responses in call order"""
+            payload = [
+                {'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params}
+                for request_id, (method, params) in enumerate(calls)
+            ]
+            responses = json.loads(await self._post(json=payload))
+
+            if not isinstance(responses, list):
+                # Providers answer with a single error object when they reject the whole batch
+                raise ValueError(f"Batch rejected: {responses.get('error') if isinstance(responses, dict) else responses}")
+
+            by_id = {item.get('id'): item for item in responses}
+            return [by_id.get(request_id, {'error': {'message': 'Missing response'}}) for request_id in range(len(calls))]
+
+
+class AsyncBlockchainService:
+    """Async blockchain operations for one event loop
+
+    Shares configuration, token registry, gas oracle and nonce manager with the
+    synchronous BlockchainService. Demo mode and unconfigured networks are answered
+    by the synchronous service since those paths make no network calls.
+    """
+
+    def __init__(self, blockchain_service, pool_size: int = 20, timeout: float = 10, batch_size: int = 100):
+        self.blockchain_service = blockchain_service
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.session = None
+        self.providers: Dict[str, Dict] = {}  # network -> {'router', 'provider', 'web3'}
+        self.contracts: Dict[tuple, object] = {}  # (network, symbol) -> async contract
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        """Create the shared connection pool on first use inside the running loop"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def get_web3_instance(self, network: str):
+        """Get pooled AsyncWeb3 instance for specific network"""
+        if not ASYNC_WEB3_AVAILABLE:
+            return None
+
+        if network not in self.blockchain_service.networks:
+            raise ValueError(f"Unsupported network: {network}")
+
+        rpc_urls = self.blockchain_service.get_rpc_urls(network)
+        if not rpc_urls:
+            return None
+
+        # Endpoint routing is shared with the synchronous provider registry
+        provider_registry = self.blockchain_service.provider_registry
+        router = provider_registry.get_router(network, rpc_urls)
+
+        entry = self.providers.get(network)
+        if not entry or entry['router'] is not router:
+            provider = PooledAsyncHTTPProvider(router, self._get_session(), self.timeout, provider_registry.hedge_policy)
+            entry = {'router': router, 'provider': provider, 'web3': AsyncWeb3(provider)}
+            self.providers[network] = entry
+            self.contracts = {key: contract for key, contract in self.contracts.items() if key[0] != network}
+        return entry['web3']
+
+    def _get_contract(self, web3, network: str, token_symbol: str):
+        """Get async contract object for a token, built once per network"""
+        key = (network, token_symbol)
+        if key not in self.contracts:
+            address = self.blockchain_service.token_registry.get_address(network, token_symbol)
+            self.contracts[key] = web3.eth.contract(address=address, abi=ERC20_ABI)
+        return self.contracts[key]
+
+    async def _get_decimals(self, web3, network: str, token_symbol: str) -> int:
+        """Get token decimals from the registry cache, fetching them only the first time"""
+        registry = self.blockchain_service.token_registry
+        decimals = registry.get_cached_decimals(network, token_symbol)
+        if decimals is None:
+            decimals = await self._get_contract(web3, network, token_symbol).functions.decimals().call()
+            registry.set_decimals(network, token_symbol, decimals)
+        return decimals
+
+    async def get_token_decimals(self, network: str, token_symbol: str) -> int:
+        """Get decimals for a registered token"""
+        web3 = self.get_web3_instance(network)
+        if not web3:
+            raise ValueError(f"No RPC configured for {network}")
+        return await self._get_decimals(web3, network, token_symbol)
+
+    async def get_balance(self, address: str, network: str) -> Dict:
+        """Get wallet balance for specific network"""
+        try:
+            web3 = self.get_web3_instance(network)
+            if not web3:
+                return self.blockchain_service.get_balance(address, network)
+
+            balance_wei = await web3.eth.get_balance(address)
+
+            return {
+                'success': True,
+                'balance': str(Web3.from_wei(balance_wei, 'ether')),
+                'balance_wei': str(balance_wei),
+                'network': network
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Failed to get balance: {str(e)}"
+            }
+
+    async def get_balances(self, addresses_by_network: Dict[str, List[str]]) -> Dict[str, Dict[str, Dict]]:
+        """Get wallet balances for many addresses with concurrent eth_getBalance batches
+
+        Returns {network: {address: result}} where each result has the same shape as get_balance.
+        Addresses a batch could not resolve fall back to get_balance.
+        """
+        networks = list(addresses_by_network)
+        network_results = await asyncio.gather(*(
+            self._get_network_balances(network, addresses_by_network[network]) for network in networks
+        ))
+        return dict(zip(networks, network_results))
+
+    async def _batch_call(self, web3, calls: List[Tuple[str, list]]) -> List[Dict]:
+        """Run calls as concurrent JSON-RPC batches, responses in call order
+
+        A batch that fails as a whole yields error responses for each of its calls.
+        """
+        batches = chunk(calls, self.batch_size)
+        batch_responses = await asyncio.gather(
+            *(web3.provider.make_batch_request(batch) for batch in batches), return_exceptions=True
+        )
+
+        responses = []
+        for batch, result in zip(batches, batch_responses):
+            if isinstance(result, Exception):
+                logger.warning(f"JSON-RPC batch of {len(batch)} calls failed: {str(result)}")
+                responses.extend({'error': {'message': str(result)}} for _ in batch)
+            else:
+                responses.extend(result)
+        return responses
+
+    async def _get_network_balances(self, network: str, addresses: List[str]) -> Dict[str, Dict]:
+        """Get balances for all addresses on one network"""
+        balances = {}
+        web3 = self.get_web3_instance(network)
+        if web3:
+            responses = await self._batch_call(web3, [('eth_getBalance', [address, 'latest']) for address in addresses])
+            for address, response in zip(addresses, responses):
+                if 'result' in response:
+                    balance_wei = int(response['result'], 16)
+                    balances[address] = {
+                        'success': True,
+                        'balance': str(Web3.from_wei(balance_wei, 'ether')),
+                        'balance_wei': str(balance_wei),
+                        'network': network
+                    }
+
+        missing = [address for address in addresses if address not in balances]
+        fallback_results = await asyncio.gather(*(self.get_balance(address, network) for address in missing))
+        balances.update(zip(missing, fallback_results))
+        return balances
+
+    async def get_token_balance(self, address: str, network: str, token_symbol: str) -> Dict:
+        """Get ERC20 token balance for specific address"""
+        try:
+            web3 = self.get_web3_instance(network)
+            contracts = self.blockchain_service.get_token_contracts()
+            if not web3 or token_symbol not in contracts.get(network, {}):
+                return self.blockchain_service.get_token_balance(address, network, token_symbol)
+
+            contract = self._get_contract(web3, network, token_symbol)
+            decimals = await self._get_decimals(web3, network, token_symbol)
+            balance_wei = await contract.functions.balanceOf(Web3.to_checksum_address(address)).call()
+
+            return {
+                'success': True,
+                'balance': str(balance_wei / (10 ** decimals)),
+                'balance_wei': str(balance_wei),
+                'token': token_symbol,
+                'network': network,
+                'contract_address': contracts[network][token_symbol]
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Failed to get {token_symbol} balance: {str(e)}",
+                'network': network
+            }
+
+    async def _get_gas_snapshot(self, web3, network: str) -> Optional[Dict]:
+        """Get the gas oracle snapshot, refreshing it with async calls when stale"""
+        gas_oracle = self.blockchain_service.gas_oracle
+        snapshot = gas_oracle.get_cached_snapshot(network)
+        if snapshot:
+            return snapshot
+
+        try:
+            fee_history = await web3.eth.fee_history(gas_oracle.block_count, 'latest', list(FEE_TIERS.values()))
+            fees, block_number = parse_fee_history(fee_history)
+        except Exception as e:
+            logger.debug(f"eth_feeHistory unavailable on {network}, using gas_price: {str(e)}")
+            fees, block_number = None, None
+
+        try:
+            gas_price = None if fees else await web3.eth.gas_price
+        except Exception as e:
+            logger.warning(f"Gas price lookup failed for {network}: {str(e)}")
+            return None
+
+        return gas_oracle.store_snapshot(network, fees, block_number, gas_price)
+
+    async def estimate_gas_fee(self, network: str, transaction_type: str = 'transfer', speed: str = 'standard') -> Dict:
+        """Estimate gas fee for transaction from the gas oracle snapshot"""
+        try:
+            web3 = self.get_web3_instance(network)
+            if not web3:
+                return self.blockchain_service.estimate_gas_fee(network, transaction_type, speed)
+
+            snapshot = await self._get_gas_snapshot(web3, network)
+            if not snapshot:
+                return {
+                    'success': False,
+                    'error': 'Gas price unavailable. Cannot estimate gas.',
+                    'network': network
+                }
+
+            return self.blockchain_service.format_gas_estimate(snapshot, transaction_type, speed)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Failed to estimate gas: {str(e)}"
+            }
+
+    async def _sign_and_send(self, web3, network: str, from_address: str, build_transaction, private_key: str):
+        """Reserve a nonce, build, sign and broadcast a transaction
+
+        build_transaction is awaited with the nonce and fee fields. The nonce is
+        resynced from the node if anything fails before the broadcast succeeds.
+        """
+        nonce_manager = self.blockchain_service.nonce_manager
+        snapshot = await self._get_gas_snapshot(web3, network)
+        fee_fields = snapshot_fee_fields(snapshot) if snapshot else {'gasPrice': await web3.eth.gas_price}
+
+        nonce = await nonce_manager.reserve_async(
+            network, from_address, lambda: web3.eth.get_transaction_count(from_address, 'pending')
+        )
+        try:
+            transaction = await build_transaction(nonce, fee_fields)
+            signed_txn = web3.eth.account.sign_transaction(transaction, private_key)
+            return await web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+        except Exception:
+            # The reserved nonce was not used, resync from the pending block tag
+            nonce_manager.resync(network, from_address)
+            raise
+
+    async def send_transaction(self, from_address: str, to_address: str, amount: str,
+                               private_key: str, network: str) -> Dict:
+        """Send cryptocurrency transaction"""
+        try:
+            web3 = self.get_web3_instance(network)
+            if not web3:
+                return self.blockchain_service.send_transaction(from_address, to_address, amount, private_key, network)
+
+            async def build_transaction(nonce, fee_fields):
+                return {
+                    'to': to_address,
+                    'value': Web3.to_wei(float(amount), 'ether'),
+                    'gas': 21000,
+                    'nonce': nonce,
+                    'chainId': self.blockchain_service.networks[network]['chain_id'],
+                    **fee_fields
+                }
+
+            tx_hash = await self._sign_and_send(web3, network, from_address, build_transaction, private_key)
+
+            return {
+                'success': True,
+                'transaction_hash': tx_hash.hex(),
+                'status': 'pending',
+                'network': network
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Failed to send transaction: {str(e)}"
+            }
+
+    async def send_token_transaction(self, from_address: str, to_address: str, amount: str,
+                                     private_key: str, network: str, token_symbol: str) -> Dict:
+        """Send ERC20 token transaction"""
+        try:
+            web3 = self.get_web3_instance(network)
+            contracts = self.blockchain_service.get_token_contracts()
+            if not web3 or token_symbol not in contracts.get(network, {}):
+                return self.blockchain_service.send_token_transaction(
+                    from_address, to_address, amount, private_key, network, token_symbol
+                )
+
+            contract = self._get_contract(web3, network, token_symbol)
+            decimals = await self._get_decimals(web3, network, token_symbol)
+            amount_wei = int(float(amount) * (10 ** decimals))
+
+            async def build_transaction(nonce, fee_fields):
+                return await contract.functions.transfer(to_address, amount_wei).build_transaction({
+                    'chainId': self.blockchain_service.networks[network]['chain_id'],
+                    'gas': 100000,
+                    'nonce': nonce,
+                    **fee_fields
+                })
+
+            tx_hash = await self._sign_and_send(web3, network, from_address, build_transaction, private_key)
+
+            return {
+                'success': True,
+                'transaction_hash': tx_hash.hex(),
+                'status': 'pending',
+                'network': network,
+                'token': token_symbol
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Failed to send {token_symbol} transaction: {str(e)}"
+            }
+
+    async def get_blocks(self, network: str, block_numbers: List[int], full_transactions: bool = True) -> Dict[int, Dict]:
+        """Fetch blocks with concurrent eth_getBlockByNumber batches
+
+        Returns raw JSON-RPC block objects keyed by block number; blocks that
+        could not be fetched are left out.
+        """
+        web3 = self.get_web3_instance(network)
+        if not web3 or not block_numbers:
+            return {}
+
+        responses = await self._batch_call(web3, [
+            ('eth_getBlockByNumber', [hex(block_number), full_transactions]) for block_number in block_numbers
+        ])
+        blocks = {}
+        for block_number, response in zip(block_numbers, responses):
+            if response.get('result'):
+                blocks[block_number] = response['result']
+            else:
+                logger.debug(f"Block {block_number} lookup failed on {network}: {response.get('error')}")
+        return blocks
+
+    async def get_logs(self, network: str, address: str, topics: List, from_block: int, to_block: int) -> List[Dict]:
+        """Fetch raw logs of one contract over an inclusive block range
+
+        Raises on JSON-RPC errors so callers can react to provider range limits.
+        """
+        web3 = self.get_web3_instance(network)
+        if not web3:
+            raise ValueError(f"No RPC configured for {network}")
+
+        response = await web3.provider.make_request('eth_getLogs', [{
+            'address': address,
+            'topics': topics,
+            'fromBlock': hex(from_block),
+            'toBlock': hex(to_block)
+        }])
+        if 'error' in response:
+            raise ValueError(f"eth_getLogs failed: {response['error']}")
+        return response['result']
+
+    async def get_block_number(self, network: str) -> Optional[int]:
+        """Get the latest block number from the shared chain-head tracker, fetching it only when stale"""
+        chain_head = self.blockchain_service.chain_head
+        block_number = chain_head.get_cached_block_number(network)
+        if block_number is not None:
+            return block_number
+
+        web3 = self.get_web3_instance(network)
+        if not web3:
+            return None
+        try:
+            block_number = await web3.eth.block_number
+        except Exception as e:
+            logger.warning(f"Chain head lookup failed for {network}: {str(e)}")
+            return None
+
+        chain_head.observe(network, block_number)
+        return block_number
+
+    def _receipt_status(self, network: str, status: int, block_number: int, gas_used: int,
+                        current_block: Optional[int]) -> Dict:
+        """Build a transaction status result from receipt fields and the chain head"""
+        self.blockchain_service.chain_head.observe(network, block_number)
+        return {
+            'success': True,
+            'status': 'confirmed' if status == 1 else 'failed',
+            'confirmations': max(0, (current_block or block_number) - block_number),
+            'block_number': block_number,
+            'gas_used': gas_used,
+            'network': network
+        }
+
+    async def get_transaction_status(self, tx_hash: str, network: str) -> Dict:
+        """Get transaction status"""
+        try:
+            web3 = self.get_web3_instance(network)
+            if not web3:
+                return self.blockchain_service.get_transaction_status(tx_hash, network)
+
+            try:
+                receipt = await web3.eth.get_transaction_receipt(tx_hash)
+            except Exception:
+                # Transaction not found or pending
+                return {
+                    'success': True,
+                    'status': 'pending',
+                    'confirmations': 0,
+                    'network': network
+                }
+
+            current_block = await self.get_block_number(network)
+            return self._receipt_status(network, receipt.status, receipt.blockNumber, receipt.gasUsed, current_block)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Failed to get transaction status: {str(e)}"
+            }
+
+    async def get_transaction_receipts(self, hashes_by_network: Dict[str, List[str]]) -> Dict[str, Dict[str, Optional[Dict]]]:
+        """Fetch receipts with concurrent eth_getTransactionReceipt batches
+
+        Returns {network: {tx_hash: receipt}} where receipt has integer status,
+        block_number and gas_used, or is None while the transaction is pending.
+        Hashes whose lookup failed and networks without an RPC are left out.
+        """
+        async def fetch_network(network: str, hashes: List[str]) -> Dict[str, Optional[Dict]]:
+            web3 = self.get_web3_instance(network)
+            if not web3:
+                return {}
+
+            responses = await self._batch_call(web3, [('eth_getTransactionReceipt', [tx_hash]) for tx_hash in hashes])
+            receipts = {}
+            for tx_hash, response in zip(hashes, responses):
+                if 'result' not in response:
+                    logger.debug(f"Receipt lookup failed for {tx_hash} on {network}: {response.get('error')}")
+                    continue
+                receipt = response['result']
+                receipts[tx_hash] = {
+                    'status': int(receipt['status'], 16),
+                    'block_number': int(receipt['blockNumber'], 16),
+                    'gas_used': int(receipt['gasUsed'], 16)
+                } if receipt else None
+            return receipts
+
+        networks = list(hashes_by_network)
+        results = await asyncio.gather(*(fetch_network(network, hashes_by_network[network]) for network in networks))
+        return dict(zip(networks, results))
+
+    async def get_transaction_statuses(self, transactions: List[Tuple[str, str]]) -> List[Dict]:
+        """Get statuses for many (tx_hash, network) pairs, in input order
+
+        Receipts are fetched in JSON-RPC batches per network and confirmations are
+        counted against the shared chain head. Anything a batch could not answer
+        falls back to get_transaction_status.
+        """
+        hashes_by_network = {}
+        for tx_hash, network in transactions:
+            hashes_by_network.setdefault(network, []).append(tx_hash)
+
+        receipts = await self.get_transaction_receipts(hashes_by_network)
+        networks = [network for network, network_receipts in receipts.items() if network_receipts]
+        heads = dict(zip(networks, await asyncio.gather(*(self.get_block_number(network) for network in networks))))
+
+        results = [None] * len(transactions)
+        fallbacks = []
+        for index, (tx_hash, network) in enumerate(transactions):
+            network_receipts = receipts.get(network, {})
+            if tx_hash not in network_receipts:
+                fallbacks.append(index)
+            elif network_receipts[tx_hash] is None:
+                results[index] = {'success': True, 'status': 'pending', 'confirmations': 0, 'network': network}
+            else:
+                receipt = network_receipts[tx_hash]
+                results[index] = self._receipt_status(
+                    network, receipt['status'], receipt['block_number'], receipt['gas_used'], heads.get(network)
+                )
+
+        fallback_results = await asyncio.gather(*(self.get_transaction_status(*transactions[index]) for index in fallbacks))
+        for index, result in zip(fallbacks, fallback_results):
+            results[index] = result
+        return results
+
+    async def close(self):
+        """Close the shared connection pool"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.providers.clear()
+        self.contracts.clear()
+
+
+# One async service per event loop, since aiohttp sessions are bound to their loop
+async_blockchain_services = weakref.WeakKeyDictionary()
+
+def get_async_blockchain_service():
+    """Get or create the async blockchain service for the running event loop"""
+    loop = asyncio.get_running_loop()
+    service = async_blockchain_services.get(loop)
+    if service is None:
+        service = AsyncBlockchainService(
+            get_blockchain_service(),
+            pool_size=int(get_setting('RPC_POOL_SIZE', 20)),
+            timeout=float(get_setting('RPC_REQUEST_TIMEOUT', 10)),
+            batch_size=int(get_setting('RPC_BATCH_SIZE', 100))
+        )
+        async_blockchain_services[loop] = service
+    return service
@@ -0,0 +1,10 @@
+"""
+Batched JSON-RPC helpers
+Splits call lists into JSON-RPC batch requests of a bounded size
+"""
+from typing import List
+
+
+def chunk(items: List, size: int) -> List[List]:
+    """Split a list into chunks of at most size items"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
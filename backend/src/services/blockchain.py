@@ -1,10 +1,21 @@
 import secrets
-import httpx
 import asyncio
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from flask import current_app
 import json
 import os
+import time
+from datetime import datetime
+from src.services.rpc_pool import get_provider_registry, parse_rpc_urls
+from src.services.multicall import TokenBalanceAggregator
+from src.services.token_registry import ERC20_ABI, get_token_registry
+from src.services.gas_oracle import get_gas_oracle
+from src.services.nonce_manager import get_nonce_manager
+from src.services.chain_head import get_chain_head_tracker
+from src.services.price_cache import PriceCache
+from src.services.price_history import get_price_history_store
+from src.config import get_setting
+from src.utils.http_client import get_http_client
 
 # Try to import web3, but provide fallback if not available
 try:
@@ -92,69 +103,24 @@ class BlockchainService:
                 self.demo_mode = os.getenv('DEMO_MODE', 'false').lower() == 'true'
         except RuntimeError:
             self.demo_mode = os.getenv('DEMO_MODE', 'false').lower() == 'true'
+        self.provider_registry = get_provider_registry()
+        self.token_registry = get_token_registry()
+        self.token_aggregator = TokenBalanceAggregator(self, int(get_setting('MULTICALL_BATCH_SIZE', 500)))
+        self.gas_oracle = get_gas_oracle(self)
+        self.nonce_manager = get_nonce_manager()
+        self.chain_head = get_chain_head_tracker(self)
         # Load config if app context is available
         self._load_config()
     
     # ERC20 Token Contract Addresses
     def get_token_contracts(self):
         """Get token contract addresses for supported networks"""
-        try:
-            # Load from environment or use defaults
-            contracts = {
-                'ethereum': {
-                    'USDT': os.getenv('ETH_USDT_CONTRACT', '0xdAC17F958D2ee523a2206206994597C13D831ec7'),
-                    'USDC': os.getenv('ETH_USDC_CONTRACT', '0xA0b86a33E6441E6C7D3E4C7C5C6C7C5C6C7C5C6C')
-                },
-                'polygon': {
-                    'USDT': os.getenv('POLYGON_USDT_CONTRACT', '0xc2132D05D31c914a87C6611C10748AEb04B58e8F'),
-                    'USDC': os.getenv('POLYGON_USDC_CONTRACT', '0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174')
-                },
-                'bsc': {
-                    'USDT': os.getenv('BSC_USDT_CONTRACT', '0x55d398326f99059fF775485246999027B3197955'),
-                    'USDC': os.getenv('BSC_USDC_CONTRACT', '0x8AC76a51cc950d9822D68b83fE1Ad97B32Cd580d')
-                }
-            }
-            return contracts
-        except Exception as e:
-            print(f"Error loading token contracts: {e}")
-            return {}
+        return self.token_registry.get_contracts()
     
     # ERC20 ABI (minimal for balance and transfer)
     def get_erc20_abi(self):
         """Get minimal ERC20 ABI for token operations"""
-        return [
-            {
-                "constant": True,
-                "inputs": [{"name": "_owner", "type": "address"}],
-                "name": "balanceOf",
-                "outputs": [{"name": "balance", "type": "uint256"}],
-                "type": "function"
-            },
-            {
-                "constant": False,
-                "inputs": [
-                    {"name": "_to", "type": "address"},
-                    {"name": "_value", "type": "uint256"}
-                ],
-                "name": "transfer",
-                "outputs": [{"name": "", "type": "bool"}],
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "decimals",
-                "outputs": [{"name": "", "type": "uint8"}],
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "symbol",
-                "outputs": [{"name": "", "type": "string"}],
-                "type": "function"
-            }
-        ]
+        return ERC20_ABI
     
     def get_token_balance(self, address: str, network: str, token_symbol: str) -> Dict:
         """Get ERC20 token balance for specific address"""
@@ -180,13 +146,13 @@ class BlockchainService:
                         'network': network
                     }
             
-            # Get token contract
+            # Get token contract and cached decimals from the registry
             contract_address = contracts[network][token_symbol]
-            contract = web3.eth.contract(address=contract_address, abi=self.get_erc20_abi())
+            contract = self.token_registry.get_contract(web3, network, token_symbol)
+            decimals = self.token_registry.get_decimals(web3, network, token_symbol)
             
             # Get balance
             balance_wei = contract.functions.balanceOf(address).call()
-            decimals = contract.functions.decimals().call()
             
             # Convert to human readable format
             balance = balance_wei / (10 ** decimals)
@@ -206,6 +172,10 @@ class BlockchainService:
                 'network': network
             }
     
+    def get_token_balances(self, pairs_by_network: Dict[str, List[Tuple[str, str]]]) -> Dict[str, Dict[Tuple[str, str], Dict]]:
+        """Get ERC20 balances for many (address, token_symbol) pairs, one Multicall3 call per network"""
+        return self.token_aggregator.get_token_balances(pairs_by_network)
+    
     def send_token_transaction(self, from_address: str, to_address: str, amount: str,
                               private_key: str, network: str, token_symbol: str) -> Dict:
         """Send ERC20 token transaction"""
@@ -236,28 +206,33 @@ class BlockchainService:
                     'error': f'Token {token_symbol} not supported on {network} or RPC not configured'
                 }
             
-            # Get token contract
-            contract_address = contracts[network][token_symbol]
-            contract = web3.eth.contract(address=contract_address, abi=self.get_erc20_abi())
+            # Get token contract and cached decimals from the registry
+            contract = self.token_registry.get_contract(web3, network, token_symbol)
+            decimals = self.token_registry.get_decimals(web3, network, token_symbol)
             
-            # Get decimals and convert amount
-            decimals = contract.functions.decimals().call()
+            # Convert amount
             amount_wei = int(float(amount) * (10 ** decimals))
             
             # Build transaction
             account = Account.from_key(private_key)
-            nonce = web3.eth.get_transaction_count(from_address)
+            fee_fields = self.gas_oracle.get_fee_fields(network) or {'gasPrice': web3.eth.gas_price}
+            nonce = self._reserve_nonce(web3, network, from_address)
             
-            transaction = contract.functions.transfer(to_address, amount_wei).build_transaction({
-                'chainId': self.networks[network]['chain_id'],
-                'gas': 100000,
-                'gasPrice': web3.eth.gas_price,
-                'nonce': nonce,
-            })
-            
-            # Sign and send transaction
-            signed_txn = web3.eth.account.sign_transaction(transaction, private_key)
-            tx_hash = web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            try:
+                transaction = contract.functions.transfer(to_address, amount_wei).build_transaction({
+                    'chainId': self.networks[network]['chain_id'],
+                    'gas': 100000,
+                    'nonce': nonce,
+                    **fee_fields
+                })
+                
+                # Sign and send transaction
+                signed_txn = web3.eth.account.sign_transaction(transaction, private_key)
+                tx_hash = web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            except Exception:
+                # The reserved nonce was not used, resync from the pending block tag
+                self.nonce_manager.resync(network, from_address)
+                raise
             
             return {
                 'success': True,
@@ -297,29 +272,28 @@ class BlockchainService:
             pass
     
     def get_web3_instance(self, network: str):
-        """Get Web3 instance for specific network"""
+        """Get pooled Web3 instance for specific network"""
         if not WEB3_AVAILABLE:
             return None
 
         if network not in self.networks:
             raise ValueError(f"Unsupported network: {network}")
 
-        rpc_url = self.networks[network]['rpc_url']
-        if not rpc_url:
+        rpc_urls = self.get_rpc_urls(network)
+        if not rpc_urls:
             # Return None if no RPC URL configured - will use mock data
             return None
 
-        try:
-            web3 = Web3(Web3.HTTPProvider(rpc_url))
-            # Test connection
-            if web3.is_connected():
-                return web3
-            else:
-                print(f"⚠️  Failed to connect to {network} RPC - using mock data")
-                return None
-        except Exception as e:
-            print(f"⚠️  Error connecting to {network}: {e} - using mock data")
-            return None
+        # Providers are long-lived, routed across endpoints and health-checked in the background
+        return self.provider_registry.get_web3(network, rpc_urls)
+
+    def get_rpc_urls(self, network: str) -> List[str]:
+        """Get the configured RPC endpoints for a network"""
+        return parse_rpc_urls(self.networks[network]['rpc_url'])
+
+    def get_provider_stats(self) -> Dict:
+        """Get RPC connection pool and endpoint routing statistics"""
+        return self.provider_registry.get_stats()
     
     def generate_wallet(self, network: str = 'ethereum') -> Dict:
         """Generate a new wallet for specified network"""
@@ -401,8 +375,8 @@ class BlockchainService:
                 'error': f"Failed to get balance: {str(e)}"
             }
     
-    def estimate_gas_fee(self, network: str, transaction_type: str = 'transfer') -> Dict:
-        """Estimate gas fee for transaction"""
+    def estimate_gas_fee(self, network: str, transaction_type: str = 'transfer', speed: str = 'standard') -> Dict:
+        """Estimate gas fee for transaction from the gas oracle snapshot"""
         try:
             web3 = self.get_web3_instance(network)
             
@@ -423,30 +397,59 @@ class BlockchainService:
                         'network': network
                     }
             
-            # Get current gas price
-            gas_price = web3.eth.gas_price
-            
-            # Estimate gas limit (21000 for simple transfer)
-            gas_limit = 21000
-            if transaction_type == 'contract':
-                gas_limit = 50000
-            
-            # Calculate total fee
-            total_fee_wei = gas_price * gas_limit
-            total_fee_eth = web3.from_wei(total_fee_wei, 'ether')
+            # Get current fees from the background oracle (refetched only when stale)
+            snapshot = self.gas_oracle.get_snapshot(network)
+            if not snapshot:
+                return {
+                    'success': False,
+                    'error': 'Gas price unavailable. Cannot estimate gas.',
+                    'network': network
+                }
             
-            return {
-                'success': True,
-                'gas_fee': str(total_fee_eth),
-                'gas_price': str(gas_price),
-                'gas_limit': str(gas_limit)
-            }
+            return self.format_gas_estimate(snapshot, transaction_type, speed)
         except Exception as e:
             return {
                 'success': False,
                 'error': f"Failed to estimate gas: {str(e)}"
             }
     
+    def format_gas_estimate(self, snapshot: Dict, transaction_type: str = 'transfer', speed: str = 'standard') -> Dict:
+        """Build a gas fee estimate response from a gas oracle snapshot"""
+        if speed not in snapshot['tiers']:
+            speed = 'standard'
+        fees = snapshot['tiers'][speed]
+        gas_price = fees['effective_gas_price']
+
+        # Estimate gas limit (21000 for simple transfer)
+        gas_limit = 21000
+        if transaction_type == 'contract':
+            gas_limit = 50000
+
+        # Calculate total fee
+        total_fee_wei = gas_price * gas_limit
+        total_fee_eth = Web3.from_wei(total_fee_wei, 'ether')
+
+        return {
+            'success': True,
+            'gas_fee': str(total_fee_eth),
+            'max_gas_fee': str(Web3.from_wei(fees['max_fee_per_gas'] * gas_limit, 'ether')),
+            'gas_price': str(gas_price),
+            'gas_limit': str(gas_limit),
+            'speed': speed,
+            'eip1559': snapshot['eip1559'],
+            'base_fee': str(snapshot['base_fee']) if snapshot['base_fee'] is not None else None,
+            'tiers': {
+                tier: {
+                    'gas_price': str(tier_fees['effective_gas_price']),
+                    'max_fee_per_gas': str(tier_fees['max_fee_per_gas']),
+                    'max_priority_fee_per_gas': str(tier_fees['max_priority_fee_per_gas']) if tier_fees['max_priority_fee_per_gas'] is not None else None,
+                    'gas_fee': str(Web3.from_wei(tier_fees['effective_gas_price'] * gas_limit, 'ether'))
+                }
+                for tier, tier_fees in snapshot['tiers'].items()
+            },
+            'updated_at': datetime.utcfromtimestamp(snapshot['updated_at']).isoformat()
+        }
+    
     def send_transaction(self, from_address: str, to_address: str, amount: str,
                         private_key: str, network: str) -> Dict:
         """Send cryptocurrency transaction"""
@@ -474,27 +477,34 @@ class BlockchainService:
                 # Create account from private key
                 account = Account.from_key(private_key)
 
-                # Get nonce
-                nonce = web3.eth.get_transaction_count(from_address)
-
                 # Convert amount to Wei
                 amount_wei = web3.to_wei(float(amount), 'ether')
 
-                # Build transaction
+                # Build transaction with fees from the shared gas oracle snapshot
+                fee_fields = self.gas_oracle.get_fee_fields(network) or {'gasPrice': web3.eth.gas_price}
+
+                # Get nonce from the local nonce manager
+                nonce = self._reserve_nonce(web3, network, from_address)
+
                 transaction = {
                     'to': to_address,
                     'value': amount_wei,
                     'gas': 21000,
-                    'gasPrice': web3.eth.gas_price,
                     'nonce': nonce,
-                    'chainId': self.networks[network]['chain_id']
+                    'chainId': self.networks[network]['chain_id'],
+                    **fee_fields
                 }
 
-                # Sign transaction
-                signed_txn = web3.eth.account.sign_transaction(transaction, private_key)
+                try:
+                    # Sign transaction
+                    signed_txn = web3.eth.account.sign_transaction(transaction, private_key)
 
-                # Send transaction
-                tx_hash = web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+                    # Send transaction
+                    tx_hash = web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+                except Exception:
+                    # The reserved nonce was not used, resync from the pending block tag
+                    self.nonce_manager.resync(network, from_address)
+                    raise
 
                 return {
                     'success': True,
@@ -524,6 +534,12 @@ class BlockchainService:
                 'error': f"Failed to send transaction: {str(e)}"
             }
     
+    def _reserve_nonce(self, web3, network: str, address: str) -> int:
+        """Reserve the next nonce locally, fetching it from the pending block tag only when unknown"""
+        return self.nonce_manager.reserve(
+            network, address, lambda: web3.eth.get_transaction_count(address, 'pending')
+        )
+    
     def get_transaction_status(self, tx_hash: str, network: str) -> Dict:
         """Get transaction status"""
         try:
@@ -549,8 +565,11 @@ class BlockchainService:
             # Get transaction receipt
             try:
                 receipt = web3.eth.get_transaction_receipt(tx_hash)
-                current_block = web3.eth.block_number
-                confirmations = current_block - receipt.blockNumber
+                
+                # Confirmations are counted against the shared chain head, not a per-call lookup
+                current_block = self.chain_head.get_block_number(network) or receipt.blockNumber
+                confirmations = max(0, current_block - receipt.blockNumber)
+                self.chain_head.observe(network, receipt.blockNumber)
                 
                 status = 'confirmed' if receipt.status == 1 else 'failed'
                 
@@ -604,6 +623,15 @@ class PriceService:
     def __init__(self):
         self.base_url = "https://api.coingecko.com/api/v3"
         self.api_key = os.getenv('COINGECKO_API_KEY')
+        self.max_ids_length = int(get_setting('PRICE_MAX_IDS_LENGTH', 1500))  # Characters of comma-joined ids per request
+        self.max_ids_per_request = int(get_setting('PRICE_MAX_IDS_PER_REQUEST', 250))
+        self.cache = PriceCache(
+            self.fetch_prices,
+            fresh_ttl=float(get_setting('PRICE_CACHE_FRESH_TTL', 30)),
+            stale_ttl=float(get_setting('PRICE_CACHE_STALE_TTL', 300)),
+            hot_window=float(get_setting('PRICE_CACHE_HOT_WINDOW', 600)),
+            refresh_interval=float(get_setting('PRICE_CACHE_REFRESH_INTERVAL', 20))
+        )
         # Demo mode flag
         try:
             if current_app:
@@ -615,70 +643,150 @@ class PriceService:
     
     async def get_price(self, symbol: str, vs_currency: str = 'usd') -> Dict:
         """Get current price for cryptocurrency"""
+        results = await self.get_prices([symbol], [vs_currency])
+        return results[symbol][vs_currency]
+    
+    def _mock_price(self, symbol: str, vs_currency: str) -> Dict:
+        """Get a mock price for demo mode or when no API key is configured"""
+        mock_prices = {
+            'bitcoin': {'usd': 43250.12, 'change_24h': -2.1},
+            'ethereum': {'usd': 2456.78, 'change_24h': 5.2},
+            'matic-network': {'usd': 1.12, 'change_24h': 8.4},
+            'binancecoin': {'usd': 345.67, 'change_24h': 3.7},
+            'tether': {'usd': 1.00, 'change_24h': 0.1},
+            'usd-coin': {'usd': 1.00, 'change_24h': 0.0}
+        }
+        
+        price_data = mock_prices.get(symbol.lower(), {'usd': 1.0, 'change_24h': 0.0})
+        
+        return {
+            'success': True,
+            'symbol': symbol,
+            'price': price_data[vs_currency],
+            'change_24h': price_data['change_24h'],
+            'vs_currency': vs_currency,
+            'mock': True
+        }
+    
+    async def get_prices(self, symbols: List[str], vs_currencies: List[str] = ('usd',)) -> Dict[str, Dict[str, Dict]]:
+        """Get current prices for many coins, from the cache where possible
+        
+        Returns {symbol: {vs_currency: result}} where each result has the shape
+        returned by get_price, plus 'stale': True when served past the fresh TTL.
+        Only pairs missing from the cache are fetched upstream, in one batch,
+        and pairs already being fetched for another caller are waited on.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        vs_currencies = list(dict.fromkeys(vs_currencies))
+        results = {symbol: {} for symbol in symbols}
+        
         try:
             if self.demo_mode or not self.api_key:
                 # Return mock prices when in demo mode or no API key
-                mock_prices = {
-                    'bitcoin': {'usd': 43250.12, 'change_24h': -2.1},
-                    'ethereum': {'usd': 2456.78, 'change_24h': 5.2},
-                    'matic-network': {'usd': 1.12, 'change_24h': 8.4},
-                    'binancecoin': {'usd': 345.67, 'change_24h': 3.7},
-                    'tether': {'usd': 1.00, 'change_24h': 0.1},
-                    'usd-coin': {'usd': 1.00, 'change_24h': 0.0}
-                }
-                
-                price_data = mock_prices.get(symbol.lower(), {'usd': 1.0, 'change_24h': 0.0})
-                
-                return {
-                    'success': True,
-                    'symbol': symbol,
-                    'price': price_data[vs_currency],
-                    'change_24h': price_data['change_24h'],
-                    'vs_currency': vs_currency,
-                    'mock': True
-                }
+                for symbol in symbols:
+                    for vs_currency in vs_currencies:
+                        try:
+                            results[symbol][vs_currency] = self._mock_price(symbol, vs_currency)
+                        except KeyError:
+                            results[symbol][vs_currency] = {'success': False, 'error': f'Failed to get price: {vs_currency!r}'}
+                return results
             
-            # Real API call
-            url = f"{self.base_url}/simple/price"
-            params = {
-                'ids': symbol,
-                'vs_currencies': vs_currency,
-                'include_24hr_change': 'true'
-            }
+            # CoinGecko ids are lowercase; several symbols may name the same id
+            symbols_by_id = {}
+            for symbol in symbols:
+                symbols_by_id.setdefault(symbol.lower(), []).append(symbol)
             
-            if self.api_key:
-                params['x_cg_demo_api_key'] = self.api_key
+            keys = [(coin_id, vs_currency) for coin_id in symbols_by_id for vs_currency in vs_currencies]
+            cached = self.cache.get_many(keys)
+            missing = [key for key in keys if key not in cached]
+            # Pairs another request is already fetching are joined rather than fetched again
+            fetched = await self.cache.fetch(missing) if missing else {}
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if symbol in data:
-                        price_info = data[symbol]
-                        return {
-                            'success': True,
-                            'symbol': symbol,
-                            'price': price_info[vs_currency],
-                            'change_24h': price_info.get(f'{vs_currency}_24h_change', 0),
-                            'vs_currency': vs_currency
-                        }
-                    else:
-                        return {
-                            'success': False,
-                            'error': f'Price data not found for {symbol}'
-                        }
-                else:
-                    return {
-                        'success': False,
-                        'error': f'API request failed with status {response.status_code}'
-                    }
+            for coin_id, coin_symbols in symbols_by_id.items():
+                for vs_currency in vs_currencies:
+                    result = cached.get((coin_id, vs_currency)) or fetched[(coin_id, vs_currency)]
+                    for symbol in coin_symbols:
+                        results[symbol][vs_currency] = {**result, 'symbol': symbol} if result['success'] else result
+            return results
         except Exception as e:
+            error = {'success': False, 'error': f'Failed to get price: {str(e)}'}
+            return {symbol: {vs_currency: dict(error) for vs_currency in vs_currencies} for symbol in symbols}
+    
+    async def fetch_prices(self, ids: List[str], vs_currencies: List[str]) -> Dict[str, Dict[str, Dict]]:
+        """Fetch prices upstream, bypassing the cache, in as few /simple/price calls as the URL limit allows
+        
+        Returns {coin_id: {vs_currency: result}}.
+        """
+        chunks = chunk_price_ids(ids, self.max_ids_length, self.max_ids_per_request)
+        responses = await asyncio.gather(
+            *(self._fetch_simple_prices(chunk, vs_currencies) for chunk in chunks), return_exceptions=True
+        )
+        
+        results = {
+            coin_id: {vs_currency: self._price_result(coin_id, coin_id, vs_currency, response) for vs_currency in vs_currencies}
+            for chunk, response in zip(chunks, responses)
+            for coin_id in chunk
+        }
+        
+        # Every upstream price also feeds the chart history
+        history = get_price_history_store()
+        fetched_at = time.time()
+        for coin_id, by_currency in results.items():
+            for vs_currency, result in by_currency.items():
+                if result['success']:
+                    history.record(coin_id, vs_currency, result['price'], fetched_at)
+        return results
+    
+    async def _fetch_simple_prices(self, ids: List[str], vs_currencies: List[str]) -> Dict:
+        """Fetch one /simple/price response for a chunk of coin ids"""
+        params = {
+            'ids': ','.join(ids),
+            'vs_currencies': ','.join(vs_currencies),
+            'include_24hr_change': 'true'
+        }
+        
+        if self.api_key:
+            params['x_cg_demo_api_key'] = self.api_key
+        
+        response = await get_http_client().request('coingecko', 'GET', f"{self.base_url}/simple/price", params=params)
+        if response.status_code != 200:
+            raise ValueError(f'API request failed with status {response.status_code}')
+        return response.json()
+    
+    def _price_result(self, symbol: str, coin_id: str, vs_currency: str, response) -> Dict:
+        """Map one (coin, currency) pair of a /simple/price response back to a get_price result"""
+        if isinstance(response, Exception):
+            return {'success': False, 'error': str(response)}
+        
+        price_info = response.get(coin_id)
+        if not price_info or vs_currency not in price_info:
             return {
                 'success': False,
-                'error': f'Failed to get price: {str(e)}'
+                'error': f'Price data not found for {symbol}'
             }
+        
+        return {
+            'success': True,
+            'symbol': symbol,
+            'price': price_info[vs_currency],
+            'change_24h': price_info.get(f'{vs_currency}_24h_change', 0),
+            'vs_currency': vs_currency
+        }
+
+def chunk_price_ids(ids: List[str], max_length: int, max_count: int) -> List[List[str]]:
+    """Split coin ids into chunks whose comma-joined length and size stay within the provider's limits"""
+    chunks = []
+    current, length = [], 0
+    for coin_id in ids:
+        added = len(coin_id) + (1 if current else 0)
+        if current and (length + added > max_length or len(current) >= max_count):
+            chunks.append(current)
+            current, length, added = [], 0, len(coin_id)
+        current.append(coin_id)
+        length += added
+    if current:
+        chunks.append(current)
+    return chunks
 
 # Global service instances
 blockchain_service = None
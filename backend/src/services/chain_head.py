@@ -0,0 +1,151 @@
+"""
+Shared chain-head tracker
+Polls the latest block number per network in the background so confirmation
+counts are read from memory, and notifies listeners on every new block
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+class ChainHeadTracker:
+    """Per-network latest block numbers refreshed by a background poller"""
+
+    def __init__(self, blockchain_service, poll_interval: float = 4, max_staleness: float = 30):
+        self.blockchain_service = blockchain_service
+        self.poll_interval = poll_interval
+        self.max_staleness = max_staleness
+        self.heads: Dict[str, Dict] = {}  # network -> {'block_number', 'updated_at'}
+        self.tracked_networks = set()  # Networks someone has asked about
+        self.listeners: List[Callable[[str, int], None]] = []
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def add_listener(self, callback: Callable[[str, int], None]):
+        """Call callback(network, block_number) whenever a network's head advances"""
+        with self.lock:
+            self.listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str, int], None]):
+        """Stop notifying a listener"""
+        with self.lock:
+            if callback in self.listeners:
+                self.listeners.remove(callback)
+
+    def track(self, network: str):
+        """Keep a network's head fresh from now on"""
+        with self.lock:
+            self.tracked_networks.add(network)
+        self._ensure_thread()
+
+    def get_cached_block_number(self, network: str) -> Optional[int]:
+        """Get the latest block number if it is fresh enough to serve, without any RPC call"""
+        self.track(network)
+        head = self.heads.get(network)
+        if head and time.time() - head['updated_at'] <= self.max_staleness:
+            return head['block_number']
+        return None
+
+    def get_block_number(self, network: str) -> Optional[int]:
+        """Get the latest block number, fetching it inline only if it is missing or stale"""
+        block_number = self.get_cached_block_number(network)
+        if block_number is None:
+            block_number = self.refresh(network)
+        return block_number
+
+    def refresh(self, network: str) -> Optional[int]:
+        """Fetch the latest block number for a network"""
+        web3 = self.blockchain_service.get_web3_instance(network)
+        if not web3:
+            return None
+
+        try:
+            block_number = web3.eth.block_number
+        except Exception as e:
+            logger.warning(f"Chain head refresh failed for {network}: {str(e)}")
+            return None
+
+        self.observe(network, block_number)
+        return block_number
+
+    def observe(self, network: str, block_number: int):
+        """Record a block number seen anywhere (poller, receipts, async calls)
+
+        The head only moves forward, so a lagging endpoint can't rewind it.
+        Listeners are notified once per advance.
+        """
+        with self.lock:
+            head = self.heads.get(network)
+            advanced = head is None or block_number > head['block_number']
+            if advanced:
+                self.heads[network] = {'block_number': block_number, 'updated_at': time.time()}
+            elif block_number == head['block_number']:
+                head['updated_at'] = time.time()
+            listeners = list(self.listeners) if advanced else []
+
+        for callback in listeners:
+            try:
+                callback(network, block_number)
+            except Exception as e:
+                logger.error(f"Chain head listener failed for {network}: {str(e)}")
+
+    def _ensure_thread(self):
+        """Start the background poller once"""
+        with self.lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._poll_loop, daemon=True)
+            self._thread.start()
+
+    def _poll_loop(self):
+        """Keep the head of every tracked network fresh"""
+        while not self._stop_event.wait(self.poll_interval):
+            with self.lock:
+                networks = list(self.tracked_networks)
+            for network in networks:
+                self.refresh(network)
+
+    def stop(self):
+        """Stop the background poller"""
+        self._stop_event.set()
+
+    def get_stats(self) -> Dict:
+        """Get the current head of every tracked network"""
+        now = time.time()
+        with self.lock:
+            return {
+                'poll_interval': self.poll_interval,
+                'listeners': len(self.listeners),
+                'networks': {
+                    network: {
+                        'block_number': head['block_number'],
+                        'age': round(now - head['updated_at'], 1)
+                    }
+                    for network, head in self.heads.items()
+                }
+            }
+
+
+# Global tracker instance
+chain_head_tracker = None
+
+def get_chain_head_tracker(blockchain_service=None):
+    """Get or create chain-head tracker instance"""
+    global chain_head_tracker
+    if chain_head_tracker is None:
+        if blockchain_service is None:
+            from src.services.blockchain import get_blockchain_service
+            blockchain_service = get_blockchain_service()
+        chain_head_tracker = ChainHeadTracker(
+            blockchain_service,
+            poll_interval=float(get_setting('CHAIN_HEAD_POLL_INTERVAL', 4)),
+            max_staleness=float(get_setting('CHAIN_HEAD_MAX_STALENESS', 30))
+        )
+    return chain_head_tracker
@@ -0,0 +1,245 @@
+"""
+Background explorer sync
+Syncs wallet history from the block explorer for many wallets at once, bounded
+by a semaphore and by a token bucket sized to the explorer API key's quota,
+syncing recently active wallets first
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import or_
+
+from src.config import get_setting
+from src.models.user import Wallet, WalletSyncState, db
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryTokenBucket:
+    """In-process token bucket for single-worker deployments"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take tokens if available; returns 0, or the seconds to wait before retrying"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+
+class RedisTokenBucket:
+    """Redis-backed token bucket shared by every worker using the same API key"""
+
+    # Refill and take atomically on Redis' clock so workers never disagree on the balance
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local requested = tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    local wait = 0
+    if tokens >= requested then
+        tokens = tokens - requested
+    else
+        wait = (requested - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+    return tostring(wait)
+    """
+
+    def __init__(self, redis_client, key: str, rate: float, capacity: float):
+        self.redis = redis_client
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self.script = redis_client.register_script(self.SCRIPT)
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take tokens if available; returns 0, or the seconds to wait before retrying"""
+        return float(self.script(keys=[self.key], args=[self.rate, self.capacity, tokens]))
+
+
+async def acquire_token(bucket, tokens: float = 1):
+    """Wait until the bucket grants tokens"""
+    while True:
+        wait = bucket.try_acquire(tokens)
+        if wait <= 0:
+            return
+        await asyncio.sleep(wait)
+
+
+class ExplorerSyncScheduler:
+    """Periodic background sync of explorer history across all wallets"""
+
+    def __init__(self, transaction_monitor, concurrency: int = 4, interval: float = 60, batch_size: int = 100,
+                 active_window: float = 3600, active_stale_after: float = 60, idle_stale_after: float = 3600):
+        self.transaction_monitor = transaction_monitor
+        self.concurrency = max(1, concurrency)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.active_window = active_window  # Wallets read within this window count as active
+        self.active_stale_after = active_stale_after
+        self.idle_stale_after = idle_stale_after
+        self.syncing = False
+        self.stats = {'passes': 0, 'synced_wallets': 0, 'failed_wallets': 0, 'new_transactions': 0}
+
+    async def start_syncing(self):
+        """Start syncing wallets in the background"""
+        self.syncing = True
+        logger.info("Explorer sync started")
+
+        while self.syncing:
+            try:
+                await self.sync_once()
+                await asyncio.sleep(self.interval)
+
+            except Exception as e:
+                logger.error(f"Explorer sync error: {str(e)}")
+                await asyncio.sleep(60)  # Wait longer on error
+
+    def stop_syncing(self):
+        """Stop syncing"""
+        self.syncing = False
+        logger.info("Explorer sync stopped")
+
+    def due_wallet_ids(self, now: Optional[datetime] = None) -> List[int]:
+        """Get wallets whose history is stale or was requested since the last sync, recently active users first"""
+        now = now or datetime.utcnow()
+        active_since = now - timedelta(seconds=self.active_window)
+        rows = db.session.query(Wallet.id).outerjoin(WalletSyncState, WalletSyncState.wallet_id == Wallet.id).filter(
+            Wallet.is_active.is_(True),
+            or_(
+                WalletSyncState.last_synced_at.is_(None),
+                WalletSyncState.last_synced_at < now - timedelta(seconds=self.idle_stale_after),
+                # A request made after the last sync is queued regardless of staleness
+                (WalletSyncState.last_requested_at >= active_since)
+                & (WalletSyncState.last_requested_at > WalletSyncState.last_synced_at),
+                WalletSyncState.backfill_requested.is_(True) & WalletSyncState.backfill_complete.isnot(True),
+                (WalletSyncState.last_requested_at >= active_since)
+                & (WalletSyncState.last_synced_at < now - timedelta(seconds=self.active_stale_after))
+            )
+        ).order_by(
+            WalletSyncState.backfill_requested.desc().nulls_last(),
+            WalletSyncState.last_requested_at.desc().nulls_last(),
+            WalletSyncState.last_synced_at.asc().nulls_first()
+        ).limit(self.batch_size).all()
+        return [wallet_id for (wallet_id,) in rows]
+
+    async def sync_once(self):
+        """Sync every due wallet, a bounded number at a time"""
+        if not self.transaction_monitor.etherscan_api_key:
+            return
+
+        app = current_app._get_current_object()
+        with app.app_context():
+            wallet_ids = self.due_wallet_ids()
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def sync_wallet(wallet_id: int):
+            async with semaphore:
+                # A fresh app context per task keeps each sync on its own session
+                with app.app_context():
+                    result = await self.transaction_monitor.sync_wallet_transactions(wallet_id)
+                    # Older history is filled in one backfill step per pass, within the same quota
+                    if result['success'] and not result['backfill_complete']:
+                        backfill = await self.transaction_monitor.sync_wallet_transactions(wallet_id, backfill=True)
+                        if backfill['success']:
+                            result['synced_transactions'] += backfill['synced_transactions']
+                    return result
+
+        results = await asyncio.gather(*(sync_wallet(wallet_id) for wallet_id in wallet_ids), return_exceptions=True)
+        self.stats['passes'] += 1
+        for wallet_id, result in zip(wallet_ids, results):
+            if isinstance(result, Exception) or not result['success']:
+                self.stats['failed_wallets'] += 1
+                logger.warning(f"Explorer sync failed for wallet {wallet_id}: {result if isinstance(result, Exception) else result['error']}")
+            else:
+                self.stats['synced_wallets'] += 1
+                self.stats['new_transactions'] += result['synced_transactions']
+
+    def get_stats(self) -> Dict:
+        """Get sync counters"""
+        return {'concurrency': self.concurrency, 'interval': self.interval, **self.stats}
+
+
+def mark_wallet_requested(wallet: Wallet, min_interval: float = 60, backfill: bool = False):
+    """Record that a user looked at a wallet so the background sync favours it
+
+    Written at most once per min_interval per wallet to keep reads cheap. With
+    backfill the wallet also stays at the front of the queue until its older
+    history is complete.
+    """
+    now = datetime.utcnow()
+    state = wallet.sync_state
+    if state is None:
+        state = WalletSyncState(wallet_id=wallet.id)
+        db.session.add(state)
+    elif (not backfill and state.last_requested_at
+          and (now - state.last_requested_at).total_seconds() < min_interval):
+        return
+    state.last_requested_at = now
+    if backfill and not state.backfill_complete:
+        state.backfill_requested = True
+    db.session.commit()
+
+
+# Global explorer quota and scheduler instances
+explorer_quota = None
+explorer_sync_scheduler = None
+
+def get_explorer_quota():
+    """Get the explorer API token bucket, shared through Redis when EXPLORER_QUOTA_STORAGE_URL is configured"""
+    global explorer_quota
+    if explorer_quota is None:
+        rate = float(get_setting('EXPLORER_RATE_LIMIT', 4))
+        capacity = float(get_setting('EXPLORER_RATE_BURST', 4))
+        storage_url = get_setting('EXPLORER_QUOTA_STORAGE_URL')
+        if storage_url and storage_url.startswith(('redis://', 'rediss://')):
+            try:
+                import redis
+                redis_client = redis.from_url(storage_url)
+                redis_client.ping()
+                # One Etherscan v2 key serves every chain, so all networks share one bucket
+                explorer_quota = RedisTokenBucket(redis_client, 'explorer:quota', rate, capacity)
+            except Exception as e:
+                logger.warning(f"Redis explorer quota unavailable, using an in-process bucket: {e}")
+
+        if explorer_quota is None:
+            explorer_quota = InMemoryTokenBucket(rate, capacity)
+    return explorer_quota
+
+def get_explorer_sync_scheduler():
+    """Get or create explorer sync scheduler instance"""
+    global explorer_sync_scheduler
+    if explorer_sync_scheduler is None:
+        from src.services.transaction_monitor import get_transaction_monitor
+        explorer_sync_scheduler = ExplorerSyncScheduler(
+            get_transaction_monitor(),
+            concurrency=int(get_setting('EXPLORER_SYNC_CONCURRENCY', 4)),
+            interval=float(get_setting('EXPLORER_SYNC_INTERVAL', 60)),
+            batch_size=int(get_setting('EXPLORER_SYNC_BATCH_SIZE', 100)),
+            active_stale_after=float(get_setting('EXPLORER_SYNC_ACTIVE_STALE_AFTER', 60)),
+            idle_stale_after=float(get_setting('EXPLORER_SYNC_IDLE_STALE_AFTER', 3600))
+        )
+    return explorer_sync_scheduler
@@ -0,0 +1,206 @@
+"""
+Background gas price oracle
+Refreshes EIP-1559 fee tiers per network from eth_feeHistory reward percentiles
+so estimates and sends are served from memory
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Reward percentiles requested from eth_feeHistory, one per tier
+FEE_TIERS = {
+    'slow': 10,
+    'standard': 50,
+    'fast': 90
+}
+
+
+def compute_fee_tiers(fee_history: Dict) -> Optional[Dict]:
+    """Compute slow/standard/fast EIP-1559 fees from an eth_feeHistory result
+
+    The priority fee for each tier is the median across blocks of that tier's
+    reward percentile, ignoring empty blocks. Max fee leaves room for the base
+    fee to double before the transaction becomes unmineable.
+    Returns None when the chain reports no base fee (pre-London chains).
+    """
+    base_fees = np.asarray(fee_history.get('baseFeePerGas') or [], dtype=np.float64)
+    rewards = np.asarray(fee_history.get('reward') or [], dtype=np.float64)
+    gas_used_ratio = np.asarray(fee_history.get('gasUsedRatio') or [], dtype=np.float64)
+
+    if base_fees.size == 0 or not base_fees[-1]:
+        return None
+
+    # The last base fee is the one for the next (pending) block
+    next_base_fee = base_fees[-1]
+
+    if rewards.ndim == 2 and rewards.shape[0]:
+        active_blocks = rewards[gas_used_ratio[:rewards.shape[0]] > 0] if gas_used_ratio.size else rewards
+        if active_blocks.shape[0] == 0:
+            active_blocks = rewards
+        priority_fees = np.median(active_blocks, axis=0)
+    else:
+        priority_fees = np.zeros(len(FEE_TIERS))
+
+    max_fees = 2 * next_base_fee + priority_fees
+
+    return {
+        'base_fee': int(next_base_fee),
+        'tiers': {
+            tier: {
+                'max_priority_fee_per_gas': int(priority_fees[i]),
+                'max_fee_per_gas': int(max_fees[i]),
+                'effective_gas_price': int(next_base_fee + priority_fees[i])
+            }
+            for i, tier in enumerate(FEE_TIERS)
+        }
+    }
+
+
+def parse_fee_history(fee_history: Dict) -> Tuple[Optional[Dict], int]:
+    """Compute fee tiers from an eth_feeHistory result along with the newest block it covers"""
+    block_number = fee_history['oldestBlock'] + len(fee_history['gasUsedRatio']) - 1
+    return compute_fee_tiers(fee_history), block_number
+
+
+def snapshot_fee_fields(snapshot: Dict, tier: str = 'standard') -> Dict:
+    """Get transaction fee fields (EIP-1559 or legacy) for a tier of a snapshot"""
+    fees = snapshot['tiers'].get(tier, snapshot['tiers']['standard'])
+    if snapshot['eip1559']:
+        return {
+            'type': 2,
+            'maxFeePerGas': fees['max_fee_per_gas'],
+            'maxPriorityFeePerGas': fees['max_priority_fee_per_gas']
+        }
+    return {'gasPrice': fees['effective_gas_price']}
+
+
+class GasOracle:
+    """Per-network gas fee snapshots refreshed by a background thread"""
+
+    def __init__(self, blockchain_service, refresh_interval: int = 15, max_staleness: int = 60, block_count: int = 20):
+        self.blockchain_service = blockchain_service
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.block_count = block_count
+        self.snapshots: Dict[str, Dict] = {}
+        self.tracked_networks = set()  # Networks someone has asked about
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def get_cached_snapshot(self, network: str) -> Optional[Dict]:
+        """Get the current fee snapshot if it is fresh enough to serve, without any RPC call"""
+        with self.lock:
+            self.tracked_networks.add(network)
+            snapshot = self.snapshots.get(network)
+        self._ensure_thread()
+
+        if snapshot and time.time() - snapshot['updated_at'] <= self.max_staleness:
+            return snapshot
+        return None
+
+    def get_snapshot(self, network: str) -> Optional[Dict]:
+        """Get the current fee snapshot, refreshing inline only if it is missing or stale"""
+        return self.get_cached_snapshot(network) or self.refresh(network)
+
+    def refresh(self, network: str) -> Optional[Dict]:
+        """Fetch fee history for a network and store a new snapshot"""
+        web3 = self.blockchain_service.get_web3_instance(network)
+        if not web3:
+            return None
+
+        try:
+            fee_history = web3.eth.fee_history(self.block_count, 'latest', list(FEE_TIERS.values()))
+            fees, block_number = parse_fee_history(fee_history)
+        except Exception as e:
+            logger.debug(f"eth_feeHistory unavailable on {network}, using gas_price: {str(e)}")
+            fees, block_number = None, None
+
+        try:
+            gas_price = None if fees else web3.eth.gas_price
+        except Exception as e:
+            logger.warning(f"Gas oracle refresh failed for {network}: {str(e)}")
+            return None
+
+        return self.store_snapshot(network, fees, block_number, gas_price)
+
+    def store_snapshot(self, network: str, fees: Optional[Dict], block_number: Optional[int],
+                       gas_price: Optional[int] = None) -> Dict:
+        """Store a snapshot from computed EIP-1559 fees, or from a legacy gas price"""
+        if fees:
+            snapshot = {'network': network, 'eip1559': True, 'block_number': block_number, **fees}
+        else:
+            # Legacy chains: a single gas price serves every tier
+            snapshot = {
+                'network': network,
+                'eip1559': False,
+                'block_number': block_number,
+                'base_fee': None,
+                'tiers': {
+                    tier: {
+                        'max_priority_fee_per_gas': None,
+                        'max_fee_per_gas': gas_price,
+                        'effective_gas_price': gas_price
+                    }
+                    for tier in FEE_TIERS
+                }
+            }
+
+        snapshot['updated_at'] = time.time()
+        with self.lock:
+            self.snapshots[network] = snapshot
+        return snapshot
+
+    def get_fee_fields(self, network: str, tier: str = 'standard') -> Optional[Dict]:
+        """Get transaction fee fields (EIP-1559 or legacy) from the current snapshot"""
+        snapshot = self.get_snapshot(network)
+        if not snapshot:
+            return None
+        return snapshot_fee_fields(snapshot, tier)
+
+    def _ensure_thread(self):
+        """Start the background refresher once"""
+        with self.lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+            self._thread.start()
+
+    def _refresh_loop(self):
+        """Keep snapshots for every tracked network fresh"""
+        while not self._stop_event.wait(self.refresh_interval):
+            with self.lock:
+                networks = list(self.tracked_networks)
+            for network in networks:
+                self.refresh(network)
+
+    def stop(self):
+        """Stop the background refresher"""
+        self._stop_event.set()
+
+
+# Global oracle instance
+gas_oracle = None
+
+def get_gas_oracle(blockchain_service=None):
+    """Get or create gas oracle instance"""
+    global gas_oracle
+    if gas_oracle is None:
+        if blockchain_service is None:
+            from src.services.blockchain import get_blockchain_service
+            blockchain_service = get_blockchain_service()
+        gas_oracle = GasOracle(
+            blockchain_service,
+            refresh_interval=int(get_setting('GAS_ORACLE_REFRESH_INTERVAL', 15)),
+            max_staleness=int(get_setting('GAS_ORACLE_MAX_STALENESS', 60)),
+            block_count=int(get_setting('GAS_ORACLE_BLOCK_COUNT', 20))
+        )
+    return gas_oracle
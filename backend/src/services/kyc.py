@@ -1,12 +1,12 @@
 import os
 import json
-import httpx
 import logging
 from typing import Dict, Optional, List
 from datetime import datetime, timedelta
 from flask import current_app
 from src.models.user import User, db
 from src.utils.security import SecurityAudit
+from src.utils.http_client import get_http_client
 from enum import Enum
 
 logger = logging.getLogger(__name__)
@@ -215,36 +215,34 @@ class KYCService:
     async def _external_kyc_check(self, user_id: int, document_data: Dict) -> Dict:
         """Perform KYC check using external service"""
         try:
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    'Authorization': f'Bearer {self.api_key}',
-                    'Content-Type': 'application/json'
-                }
-                
-                payload = {
-                    'user_reference': str(user_id),
-                    'document_type': document_data.get('document_type'),
-                    'document_data': document_data
+            headers = {
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json'
+            }
+            
+            payload = {
+                'user_reference': str(user_id),
+                'document_type': document_data.get('document_type'),
+                'document_data': document_data
+            }
+            
+            response = await get_http_client().request(
+                'kyc', 'POST', f"{self.base_url}/verify",
+                headers=headers,
+                json=payload
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                return {
+                    'success': True,
+                    'approved': result.get('status') == 'approved',
+                    'level': result.get('verification_level', 1),
+                    'reason': result.get('rejection_reason'),
+                    'reference': result.get('reference_id')
                 }
-                
-                response = await client.post(
-                    f"{self.base_url}/verify",
-                    headers=headers,
-                    json=payload,
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return {
-                        'success': True,
-                        'approved': result.get('status') == 'approved',
-                        'level': result.get('verification_level', 1),
-                        'reason': result.get('rejection_reason'),
-                        'reference': result.get('reference_id')
-                    }
-                else:
-                    return {'success': False, 'error': 'External service error'}
+            else:
+                return {'success': False, 'error': 'External service error'}
                     
         except Exception as e:
             logger.error(f"External KYC check error: {str(e)}")
@@ -365,38 +363,36 @@ class AMLService:
     async def _external_aml_screen(self, user_data: Dict) -> Dict:
         """Perform AML screening using external service"""
         try:
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    'Authorization': f'Bearer {self.api_key}',
-                    'Content-Type': 'application/json'
-                }
-                
-                payload = {
-                    'name': f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip(),
-                    'date_of_birth': user_data.get('date_of_birth'),
-                    'nationality': user_data.get('nationality'),
-                    'country': user_data.get('country')
+            headers = {
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json'
+            }
+            
+            payload = {
+                'name': f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip(),
+                'date_of_birth': user_data.get('date_of_birth'),
+                'nationality': user_data.get('nationality'),
+                'country': user_data.get('country')
+            }
+            
+            response = await get_http_client().request(
+                'kyc', 'POST', f"{self.base_url}/screen",
+                headers=headers,
+                json=payload
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                return {
+                    'clear': result.get('status') == 'clear',
+                    'risk_score': result.get('risk_score', 0.0),
+                    'sanctions_hit': result.get('sanctions_match', False),
+                    'pep_hit': result.get('pep_match', False),
+                    'adverse_media_hit': result.get('adverse_media_match', False),
+                    'details': result
                 }
-                
-                response = await client.post(
-                    f"{self.base_url}/screen",
-                    headers=headers,
-                    json=payload,
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return {
-                        'clear': result.get('status') == 'clear',
-                        'risk_score': result.get('risk_score', 0.0),
-                        'sanctions_hit': result.get('sanctions_match', False),
-                        'pep_hit': result.get('pep_match', False),
-                        'adverse_media_hit': result.get('adverse_media_match', False),
-                        'details': result
-                    }
-                else:
-                    return {'clear': True, 'risk_score': 0.0}
+            else:
+                return {'clear': True, 'risk_score': 0.0}
                     
         except Exception as e:
             logger.error(f"External AML screening error: {str(e)}")
@@ -1,4 +1,269 @@
+"""
+Incoming transaction scan
+Walks new blocks per network with full transactions and records native
+transfers to custodial wallets, matching recipients against an in-memory
+address index behind a Bloom filter
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 
-except Exception as e:
-    logger.error(f"Error scanning for incoming transactions: {str(e)}")
-    db.session.rollback()  # ← CORRECT INDENTATION
+from flask import current_app
+from sqlalchemy import func
+
+from src.config import get_setting
+from src.models.user import Transaction, Wallet, db
+from src.services.async_blockchain import get_async_blockchain_service
+from src.services.blockchain import get_blockchain_service
+from src.utils.bloom_filter import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+
+class WalletAddressIndex:
+    """In-memory index of active custodial wallet addresses per network"""
+
+    def __init__(self, error_rate: float = 0.01):
+        self.error_rate = error_rate
+        self.wallets: Dict[str, Dict[str, Tuple[int, int]]] = {}  # network -> address -> (wallet_id, user_id)
+        self.filters: Dict[str, BloomFilter] = {}
+        self.fingerprint = None
+
+    def load(self, rows: Iterable[Tuple[int, int, str, str]], fingerprint=None):
+        """Rebuild the index from (wallet_id, user_id, network, address) rows"""
+        wallets = {}
+        for wallet_id, user_id, network, address in rows:
+            wallets.setdefault(network, {})[address.lower()] = (wallet_id, user_id)
+
+        filters = {}
+        for network, addresses in wallets.items():
+            # Sized with headroom so wallets added before the next rebuild keep the error rate
+            bloom = BloomFilter(max(1000, 2 * len(addresses)), self.error_rate)
+            bloom.update(addresses)
+            filters[network] = bloom
+
+        self.wallets = wallets
+        self.filters = filters
+        self.fingerprint = fingerprint
+
+    def refresh(self):
+        """Reload from the database when the set of active wallets has changed"""
+        fingerprint = tuple(Wallet.query.with_entities(func.count(Wallet.id), func.max(Wallet.id)).filter(
+            Wallet.is_active.is_(True)
+        ).one())
+        if fingerprint == self.fingerprint:
+            return
+
+        rows = Wallet.query.with_entities(Wallet.id, Wallet.user_id, Wallet.network, Wallet.address).filter(
+            Wallet.is_active.is_(True)
+        ).all()
+        self.load(rows, fingerprint)
+        logger.info(f"Wallet address index rebuilt: {len(rows)} addresses")
+
+    def networks(self) -> List[str]:
+        return list(self.wallets)
+
+    def match(self, network: str, address: Optional[str]) -> Optional[Tuple[int, int]]:
+        """Get (wallet_id, user_id) for a custodial address, or None"""
+        if not address:
+            return None
+        address = address.lower()
+        bloom = self.filters.get(network)
+        if bloom is None or address not in bloom:
+            return None
+        return self.wallets[network].get(address)
+
+
+class IncomingTransactionScanner:
+    """Per-network block walker that records incoming native transfers as they confirm"""
+
+    def __init__(self, websocket_manager=None, poll_interval: float = 5, confirmations: int = 3, max_blocks: int = 50):
+        self.websocket_manager = websocket_manager
+        self.blockchain_service = get_blockchain_service()
+        self.poll_interval = poll_interval
+        self.confirmations = confirmations
+        self.max_blocks = max_blocks
+        self.index = WalletAddressIndex()
+        self.cursors: Dict[str, int] = {}  # network -> last scanned block
+        self.scanning = False
+        self.stats = {'blocks_scanned': 0, 'transactions_seen': 0, 'matches': 0, 'recorded': 0}
+
+    async def start_scanning(self):
+        """Start scanning new blocks"""
+        self.scanning = True
+        logger.info("Incoming transaction scanning started")
+
+        while self.scanning:
+            try:
+                await self.scan_once()
+                await asyncio.sleep(self.poll_interval)
+
+            except Exception as e:
+                logger.error(f"Incoming transaction scanning error: {str(e)}")
+                await asyncio.sleep(60)  # Wait longer on error
+
+    def stop_scanning(self):
+        """Stop scanning"""
+        self.scanning = False
+        logger.info("Incoming transaction scanning stopped")
+
+    async def scan_once(self):
+        """Scan every network that has custodial wallets and a configured RPC"""
+        with current_app.app_context():
+            self.index.refresh()
+
+        networks = [network for network in self.index.networks() if self.blockchain_service.get_rpc_urls(network)]
+        results = await asyncio.gather(*(self.scan_network(network) for network in networks), return_exceptions=True)
+        for network, result in zip(networks, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error scanning {network} blocks: {str(result)}")
+
+    async def scan_network(self, network: str):
+        """Scan confirmed blocks since the last pass on one network"""
+        async_service = get_async_blockchain_service()
+        head = await async_service.get_block_number(network)
+        if head is None:
+            return
+
+        safe_head = head - self.confirmations
+        if network not in self.cursors:
+            # Start from the chain tip; history is covered by explorer sync
+            self.cursors[network] = safe_head
+            return
+
+        start = self.cursors[network] + 1
+        end = min(safe_head, start + self.max_blocks - 1)
+        if end < start:
+            return
+
+        blocks = await async_service.get_blocks(network, list(range(start, end + 1)))
+
+        matches = []
+        scanned_to = start - 1
+        for block_number in range(start, end + 1):
+            block = blocks.get(block_number)
+            if block is None:
+                # Stop at the first gap so no block is ever skipped
+                break
+            matches.extend(self.match_block(network, block))
+            scanned_to = block_number
+
+        if matches:
+            await self._record(network, matches)
+        self.stats['blocks_scanned'] += scanned_to - start + 1
+        self.cursors[network] = scanned_to
+
+    def match_block(self, network: str, block: Dict) -> List[Dict]:
+        """Find value transfers to custodial wallets in a block with full transactions"""
+        matches = []
+        transactions = block.get('transactions', [])
+        self.stats['transactions_seen'] += len(transactions)
+        for tx in transactions:
+            if not tx.get('to') or int(tx.get('value', '0x0'), 16) == 0:
+                continue
+            wallet = self.index.match(network, tx['to'])
+            if wallet is None:
+                continue
+            matches.append({
+                'hash': tx['hash'],
+                'from_address': tx['from'],
+                'to_address': tx['to'],
+                'value': int(tx['value'], 16),
+                'gas_price': int(tx.get('gasPrice', '0x0'), 16),
+                'block_number': int(block['number'], 16),
+                'timestamp': int(block['timestamp'], 16),
+                'wallet_id': wallet[0],
+                'user_id': wallet[1]
+            })
+        self.stats['matches'] += len(matches)
+        return matches
+
+    async def _record(self, network: str, matches: List[Dict]):
+        """Insert receive transactions for matched transfers not already recorded"""
+        async_service = get_async_blockchain_service()
+        hashes = [match['hash'] for match in matches]
+        receipts = (await async_service.get_transaction_receipts({network: hashes})).get(network, {})
+        missing = [tx_hash for tx_hash in hashes if not receipts.get(tx_hash)]
+        if missing:
+            # Raising keeps the cursor in place so the blocks are retried next pass
+            raise RuntimeError(f"Receipts unavailable for {len(missing)} incoming transactions")
+
+        symbol = self.blockchain_service.networks[network]['symbol']
+        notifications = []
+        with current_app.app_context():
+            try:
+                # Native transfers are one row per hash and wallet; token rows of the same hash don't count
+                existing = set(db.session.query(Transaction.transaction_hash, Transaction.wallet_id).filter(
+                    Transaction.transaction_hash.in_(hashes),
+                    Transaction.log_index < 0
+                ))
+
+                new_txs = []
+                for match in matches:
+                    if (match['hash'], match['wallet_id']) in existing:
+                        continue
+                    existing.add((match['hash'], match['wallet_id']))
+                    receipt = receipts[match['hash']]
+                    status = 'confirmed' if receipt['status'] == 1 else 'failed'
+                    timestamp = datetime.utcfromtimestamp(match['timestamp'])
+                    new_txs.append(Transaction(
+                        user_id=match['user_id'],
+                        wallet_id=match['wallet_id'],
+                        transaction_hash=match['hash'],
+                        from_address=match['from_address'],
+                        to_address=match['to_address'],
+                        amount=str(match['value'] / 10**18),
+                        currency=symbol,
+                        network=network,
+                        transaction_type='receive',
+                        status=status,
+                        gas_fee=str(receipt['gas_used'] * match['gas_price'] / 10**18),
+                        gas_used=receipt['gas_used'],
+                        gas_price=str(match['gas_price']),
+                        block_number=match['block_number'],
+                        created_at=timestamp,
+                        confirmed_at=timestamp if status == 'confirmed' else None
+                    ))
+
+                if not new_txs:
+                    return
+
+                db.session.add_all(new_txs)
+                db.session.flush()
+                notifications = [(tx.user_id, tx.to_dict()) for tx in new_txs]
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        self.stats['recorded'] += len(notifications)
+        logger.info(f"Recorded {len(notifications)} incoming transactions on {network}")
+
+        if self.websocket_manager:
+            for user_id, tx_data in notifications:
+                self.websocket_manager.broadcast_new_transaction(str(user_id), tx_data)
+
+    def get_stats(self) -> Dict:
+        """Get scan cursors and counters"""
+        return {
+            'cursors': dict(self.cursors),
+            'indexed_addresses': {network: len(addresses) for network, addresses in self.index.wallets.items()},
+            **self.stats
+        }
+
+
+# Global scanner instance
+incoming_scanner = None
+
+def get_incoming_scanner(websocket_manager=None):
+    """Get or create incoming transaction scanner instance"""
+    global incoming_scanner
+    if incoming_scanner is None:
+        incoming_scanner = IncomingTransactionScanner(
+            websocket_manager,
+            poll_interval=float(get_setting('BLOCK_SCANNER_INTERVAL', 5)),
+            confirmations=int(get_setting('BLOCK_SCANNER_CONFIRMATIONS', 3)),
+            max_blocks=int(get_setting('BLOCK_SCANNER_MAX_BLOCKS', 50))
+        )
+    return incoming_scanner
@@ -0,0 +1,135 @@
+"""
+Multicall3 token balance aggregation
+Packs many ERC20 balanceOf reads into a single aggregate3 eth_call per network
+"""
+import logging
+from typing import Dict, List, Tuple
+
+from src.services.batch_rpc import chunk
+
+try:
+    from web3 import Web3
+    WEB3_AVAILABLE = True
+except ImportError:
+    WEB3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Multicall3 is deployed at the same address on every supported chain
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"name": "target", "type": "address"},
+                    {"name": "allowFailure", "type": "bool"},
+                    {"name": "callData", "type": "bytes"}
+                ],
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"name": "success", "type": "bool"},
+                    {"name": "returnData", "type": "bytes"}
+                ],
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+
+
+class TokenBalanceAggregator:
+    """Resolve (address, token) balance sets with one Multicall3 call per network"""
+
+    def __init__(self, blockchain_service, max_calls_per_request: int = 500):
+        self.blockchain_service = blockchain_service
+        self.max_calls_per_request = max_calls_per_request
+
+    def get_token_balances(self, pairs_by_network: Dict[str, List[Tuple[str, str]]]) -> Dict[str, Dict[Tuple[str, str], Dict]]:
+        """Get token balances for (address, token_symbol) pairs per network
+
+        Returns {network: {(address, token_symbol): result}} where each result has
+        the same shape as BlockchainService.get_token_balance.
+        """
+        contracts = self.blockchain_service.get_token_contracts()
+        results = {}
+
+        for network, pairs in pairs_by_network.items():
+            web3 = self.blockchain_service.get_web3_instance(network)
+            supported = [pair for pair in pairs if pair[1] in contracts.get(network, {})]
+
+            network_results = {}
+            if web3 and supported:
+                try:
+                    network_results = self._aggregate(web3, network, supported, contracts[network])
+                except Exception as e:
+                    logger.warning(f"Multicall token balance lookup failed on {network}: {str(e)}")
+
+            # Anything multicall couldn't answer (or demo mode) goes through the single-call path
+            for address, token_symbol in pairs:
+                if (address, token_symbol) not in network_results:
+                    network_results[(address, token_symbol)] = self.blockchain_service.get_token_balance(
+                        address, network, token_symbol
+                    )
+            results[network] = network_results
+
+        return results
+
+    def _aggregate(self, web3, network: str, pairs: List[Tuple[str, str]], token_addresses: Dict[str, str]) -> Dict:
+        """Run balanceOf for every pair via aggregate3, plus decimals for tokens not yet in the registry"""
+        registry = self.blockchain_service.token_registry
+        multicall = web3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+
+        token_contracts = {
+            symbol: registry.get_contract(web3, network, symbol)
+            for symbol in {token_symbol for _, token_symbol in pairs}
+        }
+        decimals = {symbol: registry.get_cached_decimals(network, symbol) for symbol in token_contracts}
+        missing_decimals = [symbol for symbol, value in decimals.items() if value is None]
+
+        # Call list: decimals for unknown tokens first, then balanceOf per pair
+        calls = []
+        for symbol in missing_decimals:
+            contract = token_contracts[symbol]
+            calls.append((contract.address, True, contract.encodeABI(fn_name='decimals')))
+        for address, token_symbol in pairs:
+            contract = token_contracts[token_symbol]
+            calls.append((
+                contract.address,
+                True,
+                contract.encodeABI(fn_name='balanceOf', args=[Web3.to_checksum_address(address)])
+            ))
+
+        outputs = []
+        for call_chunk in chunk(calls, self.max_calls_per_request):
+            outputs.extend(multicall.functions.aggregate3(call_chunk).call())
+
+        for symbol, (success, return_data) in zip(missing_decimals, outputs):
+            if success and return_data:
+                decimals[symbol] = web3.codec.decode(['uint8'], return_data)[0]
+                registry.set_decimals(network, symbol, decimals[symbol])
+
+        results = {}
+        for (address, token_symbol), (success, return_data) in zip(pairs, outputs[len(missing_decimals):]):
+            if not success or not return_data or decimals[token_symbol] is None:
+                continue
+            balance_wei = web3.codec.decode(['uint256'], return_data)[0]
+            results[(address, token_symbol)] = {
+                'success': True,
+                'balance': str(balance_wei / (10 ** decimals[token_symbol])),
+                'balance_wei': str(balance_wei),
+                'token': token_symbol,
+                'network': network,
+                'contract_address': token_addresses[token_symbol]
+            }
+        return results
@@ -0,0 +1,158 @@
+"""
+Local nonce management for outgoing transactions
+Reserves nonces per (network, address) without an RPC round trip per send
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+from src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryNonceManager:
+    """In-process nonce manager for single-worker deployments"""
+
+    def __init__(self, key_ttl: float = 3600):
+        self.key_ttl = key_ttl  # Idle nonces expire so sends made elsewhere or dropped txs can't leave a gap for long
+        self.next_nonces = {}
+        self.expires_at = {}
+        self.locks = defaultdict(threading.Lock)
+        self.lock = threading.Lock()
+
+    def _key(self, network: str, address: str) -> str:
+        return f"{network}:{address.lower()}"
+
+    def _get_lock(self, key: str) -> threading.Lock:
+        with self.lock:
+            return self.locks[key]
+
+    def _take(self, key: str, seed=None):
+        """Hand out the next nonce and refresh its expiry, None if it is unset or expired and no seed was given
+
+        Must be called with the key's lock held.
+        """
+        now = time.time()
+        if key in self.next_nonces and now >= self.expires_at[key]:
+            del self.next_nonces[key]
+        if key not in self.next_nonces:
+            if seed is None:
+                return None
+            self.next_nonces[key] = seed
+        nonce = self.next_nonces[key]
+        self.next_nonces[key] = nonce + 1
+        self.expires_at[key] = now + self.key_ttl
+        return nonce
+
+    def reserve(self, network: str, address: str, fetch_pending_nonce: Callable[[], int]) -> int:
+        """Reserve the next nonce, syncing from the pending block tag on first use or after expiry"""
+        key = self._key(network, address)
+        with self._get_lock(key):
+            nonce = self._take(key)
+            if nonce is None:
+                nonce = self._take(key, fetch_pending_nonce())
+            return nonce
+
+    async def reserve_async(self, network: str, address: str, fetch_pending_nonce: Callable[[], Awaitable[int]]) -> int:
+        """Reserve the next nonce, awaiting the pending block tag lookup outside the lock"""
+        key = self._key(network, address)
+        with self._get_lock(key):
+            nonce = self._take(key)
+        if nonce is None:
+            pending_nonce = await fetch_pending_nonce()
+            with self._get_lock(key):
+                # Only the first concurrent lookup seeds; the others continue from it
+                nonce = self._take(key)
+                if nonce is None:
+                    nonce = self._take(key, pending_nonce)
+        return nonce
+
+    def resync(self, network: str, address: str):
+        """Forget the local nonce so the next reservation refetches it from the node"""
+        key = self._key(network, address)
+        with self._get_lock(key):
+            self.next_nonces.pop(key, None)
+            self.expires_at.pop(key, None)
+        logger.info(f"Nonce for {address} on {network} will be resynced")
+
+
+# Seeds the key with SET NX when a seed is given, then INCRs, in one atomic step.
+# Returns nil when the key is missing and no seed was passed, so the caller only
+# asks the node for the pending nonce when it actually needs one.
+RESERVE_SCRIPT = """
+if ARGV[2] ~= '' then
+    redis.call('SET', KEYS[1], ARGV[2], 'NX')
+elseif redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local nonce = redis.call('INCR', KEYS[1]) - 1
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return nonce
+"""
+
+
+class RedisNonceManager:
+    """Redis-backed nonce manager shared by multiple workers"""
+
+    def __init__(self, redis_client, key_ttl: int = 3600):
+        self.redis = redis_client
+        self.key_ttl = key_ttl  # Idle keys expire so long-unused wallets resync from the node
+        self.reserve_script = redis_client.register_script(RESERVE_SCRIPT)
+
+    def _key(self, network: str, address: str) -> str:
+        return f"nonce:{network}:{address.lower()}"
+
+    def _reserve(self, key: str, seed=None):
+        """Run the reserve script, returning None if the key is unset and no seed was given"""
+        nonce = self.reserve_script(keys=[key], args=[self.key_ttl, '' if seed is None else int(seed)])
+        return None if nonce is None else int(nonce)
+
+    def reserve(self, network: str, address: str, fetch_pending_nonce: Callable[[], int]) -> int:
+        """Reserve the next nonce atomically, seeding from the node if unset"""
+        key = self._key(network, address)
+        nonce = self._reserve(key)
+        if nonce is None:
+            # Only the first worker to seed wins; the others increment its value
+            nonce = self._reserve(key, fetch_pending_nonce())
+        return nonce
+
+    async def reserve_async(self, network: str, address: str, fetch_pending_nonce: Callable[[], Awaitable[int]]) -> int:
+        """Reserve the next nonce atomically, running the Redis calls off the event loop"""
+        key = self._key(network, address)
+        loop = asyncio.get_running_loop()
+        nonce = await loop.run_in_executor(None, self._reserve, key)
+        if nonce is None:
+            pending_nonce = await fetch_pending_nonce()
+            nonce = await loop.run_in_executor(None, self._reserve, key, pending_nonce)
+        return nonce
+
+    def resync(self, network: str, address: str):
+        """Drop the shared nonce so the next reservation refetches it from the node"""
+        self.redis.delete(self._key(network, address))
+        logger.info(f"Nonce for {address} on {network} will be resynced")
+
+
+# Global nonce manager instance
+nonce_manager = None
+
+def get_nonce_manager():
+    """Get the nonce manager, shared through Redis when NONCE_STORAGE_URL is configured"""
+    global nonce_manager
+    if nonce_manager is None:
+        storage_url = get_setting('NONCE_STORAGE_URL')
+        if storage_url and storage_url.startswith(('redis://', 'rediss://')):
+            try:
+                import redis
+                redis_client = redis.from_url(storage_url)
+                redis_client.ping()
+                nonce_manager = RedisNonceManager(redis_client, key_ttl=int(get_setting('NONCE_TTL', 3600)))
+            except Exception as e:
+                logger.warning(f"Redis nonce storage unavailable, using in-process nonces: {e}")
+
+        if nonce_manager is None:
+            nonce_manager = InMemoryNonceManager(key_ttl=int(get_setting('NONCE_TTL', 3600)))
+    return nonce_manager
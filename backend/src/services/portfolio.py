@@ -0,0 +1,337 @@
+"""
+Portfolio valuation
+Values every holding against every requested fiat currency in one vectorized
+pass over an (assets x currencies) price matrix
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+# CoinGecko ids of the assets the wallets hold; other symbols are looked up as-is
+PRICE_IDS = {
+    'ETH': 'ethereum',
+    'MATIC': 'matic-network',
+    'BNB': 'binancecoin',
+    'USDT': 'tether',
+    'USDC': 'usd-coin'
+}
+
+
+def price_id(asset: str) -> str:
+    return PRICE_IDS.get(asset.upper(), asset.lower())
+
+
+def build_price_matrix(assets: List[str], vs_currencies: List[str],
+                       price_results: Dict[str, Dict[str, Dict]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Arrange get_prices results into (assets x currencies) price, 24h change and staleness matrices
+
+    Missing prices are NaN so they drop out of every total.
+    """
+    prices = np.full((len(assets), len(vs_currencies)), np.nan)
+    changes = np.zeros((len(assets), len(vs_currencies)))
+    stale = np.zeros((len(assets), len(vs_currencies)), dtype=bool)
+    for i, asset in enumerate(assets):
+        by_currency = price_results.get(price_id(asset), {})
+        for j, vs_currency in enumerate(vs_currencies):
+            result = by_currency.get(vs_currency)
+            if result and result.get('success'):
+                prices[i, j] = result['price']
+                changes[i, j] = result.get('change_24h') or 0.0
+                stale[i, j] = bool(result.get('stale'))
+    return prices, changes, stale
+
+
+def value_holdings(assets: List[str], amounts: np.ndarray, vs_currencies: List[str], prices: np.ndarray,
+                   changes: np.ndarray, stale: Optional[np.ndarray] = None) -> Dict:
+    """Compute totals, per-asset values and 24h P&L for every currency at once
+
+    amounts has one entry per asset; prices and changes (percent) are
+    (assets x currencies) matrices.
+    """
+    values = amounts[:, None] * prices
+    # Price 24h ago from the reported percent change
+    previous_values = values / (1 + changes / 100)
+    pnl = values - previous_values
+
+    totals = np.nansum(values, axis=0)
+    total_pnl = np.nansum(pnl, axis=0)
+    previous_totals = totals - total_pnl
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.where(totals > 0, values / totals, np.nan)
+        total_changes = np.where(previous_totals > 0, total_pnl / previous_totals * 100, 0.0)
+
+    priced = ~np.isnan(prices)
+    stale = stale if stale is not None else np.zeros_like(priced)
+
+    def number(value):
+        return None if np.isnan(value) else float(value)
+
+    return {
+        'vs_currencies': list(vs_currencies),
+        'totals': {
+            vs_currency: {
+                'value': float(totals[j]),
+                'pnl_24h': float(total_pnl[j]),
+                'change_24h': float(total_changes[j]),
+                'complete': bool(priced[:, j].all()),
+                'stale': bool(stale[:, j].any())
+            }
+            for j, vs_currency in enumerate(vs_currencies)
+        },
+        'assets': {
+            asset: {
+                'amount': float(amounts[i]),
+                'values': {
+                    vs_currency: {
+                        'price': number(prices[i, j]),
+                        'value': number(values[i, j]),
+                        'share': number(shares[i, j]),
+                        'pnl_24h': number(pnl[i, j]),
+                        'change_24h': float(changes[i, j]) if priced[i, j] else None,
+                        'stale': bool(stale[i, j])
+                    }
+                    for j, vs_currency in enumerate(vs_currencies)
+                }
+            }
+            for i, asset in enumerate(assets)
+        }
+    }
+
+
+class PortfolioValuationEngine:
+    """Values holdings with one price batch and one vectorized pass"""
+
+    def __init__(self, price_service):
+        self.price_service = price_service
+        self.stats = {'valuations': 0}
+
+    async def value(self, holdings: Dict[str, object], vs_currencies: Iterable[str] = ('usd',),
+                    price_results: Optional[Dict] = None) -> Dict:
+        """Value {asset: amount} holdings in every currency
+
+        price_results, keyed by price id, skips the price fetch.
+        """
+        vs_currencies = list(dict.fromkeys(vs_currency.lower() for vs_currency in vs_currencies))
+        assets, amounts, invalid = self._parse_holdings(holdings)
+
+        if price_results is None:
+            price_results = await self.price_service.get_prices(
+                list(dict.fromkeys(price_id(asset) for asset in assets)), vs_currencies
+            ) if assets else {}
+        prices, changes, stale = build_price_matrix(assets, vs_currencies, price_results)
+
+        valuation = value_holdings(assets, amounts, vs_currencies, prices, changes, stale)
+        for asset in invalid:
+            valuation['assets'][asset] = {'error': 'Invalid amount format'}
+        self.stats['valuations'] += 1
+        return valuation
+
+    async def value_user(self, native_balances: Dict[str, object], token_balances: Dict[str, Dict[str, object]],
+                         native_symbols: Dict[str, str], vs_currencies: Iterable[str] = ('usd',),
+                         price_results: Optional[Dict] = None) -> Dict:
+        """Value a user's wallets: native balances per network plus {network: {token: balance}}
+
+        The same asset held on several networks (ETH on mainnet and L2s, USDT
+        on every chain) is valued once from its summed amount.
+        """
+        holdings = {}
+        for network, balance in native_balances.items():
+            self._add_holding(holdings, native_symbols[network], balance)
+        for network, balances in token_balances.items():
+            for token, balance in balances.items():
+                self._add_holding(holdings, token, balance)
+        return await self.value(holdings, vs_currencies, price_results=price_results)
+
+    @staticmethod
+    def _add_holding(holdings: Dict[str, object], asset: str, amount):
+        try:
+            holdings[asset] = float(holdings.get(asset, 0)) + float(amount)
+        except (TypeError, ValueError):
+            holdings.setdefault(asset, amount)
+
+    @staticmethod
+    def _parse_holdings(holdings: Dict[str, object]) -> Tuple[List[str], np.ndarray, List[str]]:
+        assets, amounts, invalid = [], [], []
+        for asset, amount in holdings.items():
+            try:
+                amounts.append(float(amount))
+                assets.append(asset)
+            except (TypeError, ValueError):
+                invalid.append(asset)
+        return assets, np.asarray(amounts, dtype=np.float64), invalid
+
+    def get_stats(self) -> Dict:
+        """Get valuation counters"""
+        return dict(self.stats)
+
+
+class PortfolioSnapshotService:
+    """Fetches a user's native balances, token balances and prices from every source at once
+
+    Each source has its own timeout; one that fails or times out falls back to
+    its last known value, marked stale, so the response time is that of the
+    slowest source rather than the sum of all of them.
+    """
+
+    def __init__(self, blockchain_service, engine: PortfolioValuationEngine, balance_timeout: float = 5,
+                 token_timeout: float = 5, price_timeout: float = 3):
+        self.blockchain_service = blockchain_service
+        self.engine = engine
+        self.balance_timeout = balance_timeout
+        self.token_timeout = token_timeout
+        self.price_timeout = price_timeout
+        self.last_token_balances: Dict[Tuple[str, str, str], str] = {}  # (network, address, token) -> balance
+
+    async def _timed(self, name: str, coro, timeout: float, sources: Dict) -> Optional[object]:
+        """Await one source, recording its status and latency; None if it failed or timed out"""
+        start_time = time.time()
+        try:
+            result = await asyncio.wait_for(coro, timeout)
+            sources[name] = {'status': 'ok', 'latency': round(time.time() - start_time, 3)}
+            return result
+        except asyncio.TimeoutError:
+            sources[name] = {'status': 'timeout', 'latency': round(time.time() - start_time, 3)}
+        except Exception as e:
+            sources[name] = {'status': 'error', 'latency': round(time.time() - start_time, 3), 'error': str(e)}
+        logger.warning(f"Portfolio source {name} unavailable: {sources[name]}")
+        return None
+
+    async def _fetch_native(self, network: str, addresses: List[str]) -> Dict[str, Dict]:
+        from src.services.async_blockchain import get_async_blockchain_service
+        return (await get_async_blockchain_service().get_balances({network: addresses}))[network]
+
+    async def _fetch_tokens(self, network: str, pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        # Multicall runs on the sync provider; the executor thread finishes on its own if we stop waiting
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, self.blockchain_service.get_token_balances, {network: pairs})
+        return results.get(network, {})
+
+    async def build(self, wallets: List[Dict], vs_currencies: Iterable[str] = ('usd',)) -> Dict:
+        """Build a portfolio snapshot for wallets given as {'id', 'network', 'address', 'balance'} dicts
+
+        Wallet entries come back with the balance that was used and 'stale'
+        set when it is a fallback; 'sources' reports each source's outcome.
+        """
+        vs_currencies = list(dict.fromkeys(vs_currency.lower() for vs_currency in vs_currencies))
+        contracts = self.blockchain_service.get_token_contracts()
+        native_symbols = {network: spec['symbol'] for network, spec in self.blockchain_service.networks.items()}
+
+        addresses_by_network: Dict[str, List[str]] = {}
+        pairs_by_network: Dict[str, List[Tuple[str, str]]] = {}
+        for wallet in wallets:
+            addresses_by_network.setdefault(wallet['network'], []).append(wallet['address'])
+            for token in contracts.get(wallet['network'], {}):
+                pairs_by_network.setdefault(wallet['network'], []).append((wallet['address'], token))
+
+        assets = [native_symbols[network] for network in addresses_by_network]
+        assets += [token for pairs in pairs_by_network.values() for _, token in pairs]
+        ids = list(dict.fromkeys(price_id(asset) for asset in assets))
+
+        sources: Dict[str, Dict] = {}
+        native_networks = list(addresses_by_network)
+        token_networks = list(pairs_by_network)
+        results = await asyncio.gather(
+            *(self._timed(f"balances:{network}", self._fetch_native(network, addresses_by_network[network]),
+                          self.balance_timeout, sources) for network in native_networks),
+            *(self._timed(f"tokens:{network}", self._fetch_tokens(network, pairs_by_network[network]),
+                          self.token_timeout, sources) for network in token_networks),
+            self._timed('prices', self.engine.price_service.get_prices(ids, vs_currencies), self.price_timeout, sources)
+            if ids else asyncio.sleep(0, {})
+        )
+        native_results = dict(zip(native_networks, results[:len(native_networks)]))
+        token_results = dict(zip(token_networks, results[len(native_networks):-1]))
+        price_results = self._fill_last_known_prices(results[-1] or {}, ids, vs_currencies)
+
+        stale = False
+        native_balances: Dict[str, float] = {}
+        token_balances: Dict[str, Dict[str, float]] = {}
+        snapshot_wallets = []
+        for wallet in wallets:
+            network, address = wallet['network'], wallet['address']
+            result = (native_results.get(network) or {}).get(address)
+            if result and result.get('success'):
+                balance, balance_stale = result['balance'], False
+            else:
+                # Stored balance from the last successful read
+                balance, balance_stale = wallet['balance'], True
+            native_balances[network] = native_balances.get(network, 0) + float(balance or 0)
+
+            tokens = {}
+            network_tokens = token_results.get(network) or {}
+            for token in contracts.get(network, {}):
+                token_key = (network, address.lower(), token)
+                token_result = network_tokens.get((address, token))
+                if token_result and token_result.get('success'):
+                    self.last_token_balances[token_key] = token_result['balance']
+                    tokens[token] = {'balance': token_result['balance'], 'stale': False}
+                elif token_key in self.last_token_balances:
+                    tokens[token] = {'balance': self.last_token_balances[token_key], 'stale': True}
+                else:
+                    tokens[token] = {'balance': None, 'stale': True}
+                if tokens[token]['balance'] is not None:
+                    token_balances.setdefault(network, {})
+                    token_balances[network][token] = token_balances[network].get(token, 0) + float(tokens[token]['balance'])
+
+            stale = stale or balance_stale or any(token['stale'] for token in tokens.values())
+            snapshot_wallets.append({**wallet, 'balance': balance, 'stale': balance_stale, 'tokens': tokens})
+
+        valuation = await self.engine.value_user(
+            native_balances, token_balances, native_symbols, vs_currencies, price_results
+        )
+        stale = stale or any(total['stale'] or not total['complete'] for total in valuation['totals'].values())
+
+        return {
+            'wallets': snapshot_wallets,
+            'valuation': valuation,
+            'sources': sources,
+            'stale': stale
+        }
+
+    def _fill_last_known_prices(self, price_results: Dict[str, Dict[str, Dict]], ids: List[str],
+                                vs_currencies: List[str]) -> Dict[str, Dict[str, Dict]]:
+        """Fill prices the source couldn't provide with cached prices of any age"""
+        missing = [
+            (coin_id, vs_currency) for coin_id in ids for vs_currency in vs_currencies
+            if not price_results.get(coin_id, {}).get(vs_currency, {}).get('success')
+        ]
+        if not missing:
+            return price_results
+
+        filled = {coin_id: dict(by_currency) for coin_id, by_currency in price_results.items()}
+        for (coin_id, vs_currency), result in self.engine.price_service.cache.get_last_known(missing).items():
+            filled.setdefault(coin_id, {})[vs_currency] = result
+        return filled
+
+
+# Global engine and snapshot service instances
+portfolio_engine = None
+portfolio_snapshot_service = None
+
+def get_portfolio_engine():
+    """Get or create portfolio valuation engine instance"""
+    global portfolio_engine
+    if portfolio_engine is None:
+        from src.services.blockchain import get_price_service
+        portfolio_engine = PortfolioValuationEngine(get_price_service())
+    return portfolio_engine
+
+def get_portfolio_snapshot_service():
+    """Get or create portfolio snapshot service instance"""
+    global portfolio_snapshot_service
+    if portfolio_snapshot_service is None:
+        from src.services.blockchain import get_blockchain_service
+        portfolio_snapshot_service = PortfolioSnapshotService(
+            get_blockchain_service(),
+            get_portfolio_engine(),
+            balance_timeout=float(get_setting('PORTFOLIO_BALANCE_TIMEOUT', 5)),
+            token_timeout=float(get_setting('PORTFOLIO_TOKEN_TIMEOUT', 5)),
+            price_timeout=float(get_setting('PORTFOLIO_PRICE_TIMEOUT', 3))
+        )
+    return portfolio_snapshot_service
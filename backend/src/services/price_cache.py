@@ -0,0 +1,187 @@
+"""
+Price cache
+Keeps prices per (coin id, vs currency) in memory: fresh entries are served
+as-is, stale ones are served while a single background refresher re-fetches
+every recently requested pair in one batched upstream call. Concurrent misses
+for the same pair share one upstream fetch
+"""
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PriceKey = Tuple[str, str]  # (coin id, vs currency)
+
+
+class PriceCache:
+    """Stale-while-revalidate price cache with one background refresher for hot pairs"""
+
+    def __init__(self, fetcher: Callable[[List[str], List[str]], Awaitable[Dict]], fresh_ttl: float = 30,
+                 stale_ttl: float = 300, hot_window: float = 600, refresh_interval: float = 20):
+        self.fetcher = fetcher  # async (ids, vs_currencies) -> {coin_id: {vs_currency: result}}
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl  # Past this an entry is refetched inline
+        self.hot_window = hot_window  # Pairs requested within this window are kept warm
+        self.refresh_interval = refresh_interval
+        self.entries: Dict[PriceKey, Dict] = {}  # key -> {'result', 'updated_at'}
+        self.requested_at: Dict[PriceKey, float] = {}
+        # Fetches in progress; futures are thread-safe since callers run on different event loops
+        self.in_flight: Dict[PriceKey, concurrent.futures.Future] = {}
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0, 'refresh_errors': 0}
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def get_many(self, keys: Iterable[PriceKey]) -> Dict[PriceKey, Dict]:
+        """Get cached results for the keys that have one, marking every key as requested
+
+        Entries older than fresh_ttl are returned with 'stale': True; missing
+        and expired keys are left out for the caller to fetch.
+        """
+        now = time.time()
+        found = {}
+        with self.lock:
+            for key in keys:
+                self.requested_at[key] = now
+                entry = self.entries.get(key)
+                age = now - entry['updated_at'] if entry else None
+                if entry is None or age > self.stale_ttl:
+                    self.stats['misses'] += 1
+                elif age > self.fresh_ttl:
+                    self.stats['stale_hits'] += 1
+                    found[key] = {**entry['result'], 'stale': True}
+                else:
+                    self.stats['hits'] += 1
+                    found[key] = entry['result']
+        self._ensure_thread()
+        return found
+
+    def get_last_known(self, keys: Iterable[PriceKey]) -> Dict[PriceKey, Dict]:
+        """Get cached results of any age, marked stale, for when the upstream is unavailable"""
+        with self.lock:
+            return {key: {**self.entries[key]['result'], 'stale': True} for key in keys if key in self.entries}
+
+    def store(self, results: Dict[str, Dict[str, Dict]]):
+        """Store the successful results of a fetch"""
+        now = time.time()
+        with self.lock:
+            for coin_id, by_currency in results.items():
+                for vs_currency, result in by_currency.items():
+                    if result.get('success'):
+                        self.entries[(coin_id, vs_currency)] = {'result': result, 'updated_at': now}
+
+    async def fetch(self, keys: Iterable[PriceKey]) -> Dict[PriceKey, Dict]:
+        """Fetch keys upstream and store the results, joining fetches already in flight
+
+        Keys nobody is fetching yet go out in one batched call; the rest wait
+        for the call that is already fetching them.
+        """
+        keys = list(dict.fromkeys(keys))
+        futures, own = {}, []
+        with self.lock:
+            for key in keys:
+                future = self.in_flight.get(key)
+                if future is None:
+                    future = self.in_flight[key] = concurrent.futures.Future()
+                    own.append(key)
+                else:
+                    self.stats['coalesced'] += 1
+                futures[key] = future
+
+        if own:
+            try:
+                results = await self.fetcher(
+                    list(dict.fromkeys(coin_id for coin_id, _ in own)),
+                    list(dict.fromkeys(vs_currency for _, vs_currency in own))
+                )
+                self.store(results)
+            except BaseException as e:
+                # A cancelled fetch must not cancel the callers that joined it
+                self._settle(own, error=e if isinstance(e, Exception) else RuntimeError('Price fetch cancelled'))
+                raise
+            self._settle(own, results=results)
+
+        return {key: await asyncio.wrap_future(future) for key, future in futures.items()}
+
+    def _settle(self, keys: List[PriceKey], results: Dict = None, error: BaseException = None):
+        """Hand the outcome of a fetch to everyone waiting on its keys"""
+        with self.lock:
+            futures = [(key, self.in_flight.pop(key)) for key in keys]
+        for (coin_id, vs_currency), future in futures:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results.get(coin_id, {}).get(vs_currency)
+                                  or {'success': False, 'error': 'Price not returned'})
+
+    def hot_keys(self) -> List[PriceKey]:
+        """Get recently requested keys, forgetting the ones nobody asked for within the hot window"""
+        now = time.time()
+        with self.lock:
+            for key, requested_at in list(self.requested_at.items()):
+                if now - requested_at > self.hot_window:
+                    del self.requested_at[key]
+            for key, entry in list(self.entries.items()):
+                if key not in self.requested_at and now - entry['updated_at'] > self.stale_ttl:
+                    del self.entries[key]
+            return list(self.requested_at)
+
+    async def refresh_hot(self):
+        """Re-fetch every hot key in one batched call"""
+        keys = self.hot_keys()
+        if not keys:
+            return
+
+        ids = list(dict.fromkeys(coin_id for coin_id, _ in keys))
+        vs_currencies = list(dict.fromkeys(vs_currency for _, vs_currency in keys))
+        results = await self.fetcher(ids, vs_currencies)
+        self.store(results)
+        self.stats['refreshes'] += 1
+
+        with self.lock:
+            for coin_id, vs_currency in keys:
+                result = results.get(coin_id, {}).get(vs_currency)
+                # Unknown coins stop being refreshed until someone asks again
+                if result is not None and not result.get('success') and (coin_id, vs_currency) not in self.entries:
+                    self.requested_at.pop((coin_id, vs_currency), None)
+
+    def _ensure_thread(self):
+        """Start the background refresher once"""
+        with self.lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._refresh_loop, name='price-refresher', daemon=True)
+            self._thread.start()
+
+    def _refresh_loop(self):
+        """Keep hot keys fresh from one long-lived event loop"""
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stop_event.wait(self.refresh_interval):
+                try:
+                    loop.run_until_complete(self.refresh_hot())
+                except Exception as e:
+                    self.stats['refresh_errors'] += 1
+                    logger.warning(f"Price refresh failed: {str(e)}")
+        finally:
+            loop.close()
+
+    def stop(self):
+        """Stop the background refresher"""
+        self._stop_event.set()
+
+    def get_stats(self) -> Dict:
+        """Get cache size and hit counters"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hot_keys': len(self.requested_at),
+                'fresh_ttl': self.fresh_ttl,
+                'stale_ttl': self.stale_ttl,
+                **self.stats
+            }
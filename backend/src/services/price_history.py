@@ -0,0 +1,329 @@
+"""
+Price history store
+Records every price PriceService fetches into per-(coin, vs currency) numpy
+columns; a background flusher downsamples them into 1m/1h/1d OHLC candles and
+persists candles as .npy segment files that range queries read through memory maps
+"""
+import contextlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No cross-process locking; only safe with a single worker
+
+from src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+CANDLE_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('count', '<i4')
+])
+
+# Bucket width and segment file span per resolution, in seconds
+RESOLUTIONS = {
+    '1m': {'bucket': 60, 'segment': 86400},
+    '1h': {'bucket': 3600, 'segment': 30 * 86400},
+    '1d': {'bucket': 86400, 'segment': 365 * 86400}
+}
+
+SERIES_NAME = re.compile(r'^[a-z0-9][a-z0-9-]*$')
+
+
+def compute_ohlc(timestamps: np.ndarray, prices: np.ndarray, bucket: int) -> np.ndarray:
+    """Aggregate time-sorted price points into OHLC candles of bucket seconds"""
+    candles = np.zeros(0, dtype=CANDLE_DTYPE)
+    if timestamps.size == 0:
+        return candles
+
+    bucket_times = (timestamps.astype(np.int64) // bucket) * bucket
+    starts = np.flatnonzero(np.r_[True, bucket_times[1:] != bucket_times[:-1]])
+    ends = np.r_[starts[1:], bucket_times.size] - 1
+
+    candles = np.zeros(starts.size, dtype=CANDLE_DTYPE)
+    candles['time'] = bucket_times[starts]
+    candles['open'] = prices[starts]
+    candles['high'] = np.maximum.reduceat(prices, starts)
+    candles['low'] = np.minimum.reduceat(prices, starts)
+    candles['close'] = prices[ends]
+    candles['count'] = np.diff(np.r_[starts, bucket_times.size])
+    return candles
+
+
+def merge_candles(existing: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Merge two candle arrays, combining candles that share a bucket (existing ones came first)"""
+    if existing.size == 0:
+        return new
+    if new.size == 0:
+        return existing
+
+    combined = np.concatenate([existing, new])
+    combined = combined[np.argsort(combined['time'], kind='stable')]
+    starts = np.flatnonzero(np.r_[True, combined['time'][1:] != combined['time'][:-1]])
+    ends = np.r_[starts[1:], combined.size] - 1
+
+    merged = np.zeros(starts.size, dtype=CANDLE_DTYPE)
+    merged['time'] = combined['time'][starts]
+    merged['open'] = combined['open'][starts]
+    merged['high'] = np.maximum.reduceat(combined['high'], starts)
+    merged['low'] = np.minimum.reduceat(combined['low'], starts)
+    merged['close'] = combined['close'][ends]
+    merged['count'] = np.add.reduceat(combined['count'], starts)
+    return merged
+
+
+class PriceSeries:
+    """Growable timestamp and price columns for one (coin, vs currency) pair"""
+
+    def __init__(self, capacity: int = 256):
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.prices = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+
+    def append(self, timestamp: float, price: float):
+        if self.size == self.timestamps.size:
+            self.timestamps = np.resize(self.timestamps, 2 * self.size)
+            self.prices = np.resize(self.prices, 2 * self.size)
+        self.timestamps[self.size] = timestamp
+        self.prices[self.size] = price
+        self.size += 1
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.timestamps[:self.size], self.prices[:self.size]
+
+    def drop_before(self, timestamp: float):
+        """Drop points older than timestamp"""
+        keep_from = int(np.searchsorted(self.timestamps[:self.size], timestamp, side='left'))
+        if keep_from:
+            remaining = self.size - keep_from
+            self.timestamps[:remaining] = self.timestamps[keep_from:self.size]
+            self.prices[:remaining] = self.prices[keep_from:self.size]
+            self.size = remaining
+
+
+class PriceHistoryStore:
+    """Raw price points in memory, OHLC candles on disk in per-resolution segment files"""
+
+    def __init__(self, directory: str, raw_retention: float = 86400, flush_interval: float = 60,
+                 retention: Optional[Dict[str, float]] = None):
+        self.directory = directory
+        self.raw_retention = raw_retention
+        self.flush_interval = flush_interval
+        # Seconds of candles kept per resolution; None keeps them forever
+        self.retention = retention or {'1m': 7 * 86400, '1h': 365 * 86400, '1d': None}
+        self.series: Dict[Tuple[str, str], PriceSeries] = {}
+        self.flushed_until: Dict[Tuple[str, str], float] = {}  # Raw points before this are in the segment files
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # One flush writes the segment files at a time
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def record(self, coin_id: str, vs_currency: str, price: float, timestamp: Optional[float] = None):
+        """Append a price point"""
+        key = (coin_id.lower(), vs_currency.lower())
+        if not (SERIES_NAME.match(key[0]) and SERIES_NAME.match(key[1])):
+            return
+        timestamp = timestamp if timestamp is not None else time.time()
+
+        with self.lock:
+            series = self.series.setdefault(key, PriceSeries())
+            # Points arrive from one refresher, but an inline fetch can race it by a few milliseconds
+            if series.size and timestamp < series.timestamps[series.size - 1]:
+                timestamp = series.timestamps[series.size - 1]
+            series.append(timestamp, float(price))
+
+        self._ensure_thread()
+
+    def flush(self, now: Optional[float] = None):
+        """Write candles for completed minutes to the segment files and apply retention"""
+        now = now if now is not None else time.time()
+        # Only whole minutes are flushed, so a flushed 1m candle never changes again
+        cutoff = (int(now) // 60) * 60
+
+        with self.flush_lock:
+            with self.lock:
+                pending = []
+                for key, series in self.series.items():
+                    timestamps, prices = series.view()
+                    start = int(np.searchsorted(timestamps, self.flushed_until.get(key, 0), side='left'))
+                    end = int(np.searchsorted(timestamps, cutoff, side='left'))
+                    if end > start:
+                        pending.append((key, timestamps[start:end].copy(), prices[start:end].copy()))
+                keys = list(self.series)
+
+            # Disk I/O happens outside the lock so record() never waits on it
+            for key, timestamps, prices in pending:
+                for resolution, spec in RESOLUTIONS.items():
+                    self._write_candles(key, resolution, compute_ohlc(timestamps, prices, spec['bucket']))
+            self._apply_retention(keys, now)
+
+            # Raw points stay queryable from memory until their candles are on disk
+            with self.lock:
+                for key, _, _ in pending:
+                    self.flushed_until[key] = cutoff
+                for series in self.series.values():
+                    series.drop_before(min(now - self.raw_retention, cutoff))
+
+    def _ensure_thread(self):
+        """Start the background flusher once"""
+        if not math.isfinite(self.flush_interval):
+            return  # Flushed explicitly only
+        with self.lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._flush_loop, name='price-history-flusher', daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        """Flush completed minutes every flush_interval"""
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Price history flush failed: {str(e)}")
+
+    def stop(self):
+        """Stop the background flusher"""
+        self._stop_event.set()
+
+    def _series_dir(self, key: Tuple[str, str], resolution: str) -> str:
+        return os.path.join(self.directory, f"{key[0]}_{key[1]}", resolution)
+
+    def _segment_path(self, key: Tuple[str, str], resolution: str, segment_start: int) -> str:
+        return os.path.join(self._series_dir(key, resolution), f"{segment_start}.npy")
+
+    @contextlib.contextmanager
+    def _series_lock(self, key: Tuple[str, str], resolution: str):
+        """Hold an exclusive file lock on one series' segment files
+
+        Every worker process flushes into the same directory, so merges are
+        serialized across processes rather than only within this one.
+        """
+        directory = self._series_dir(key, resolution)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield  # Closing the file releases the lock
+
+    def _write_candles(self, key: Tuple[str, str], resolution: str, candles: np.ndarray):
+        """Merge candles into the segment files they belong to"""
+        span = RESOLUTIONS[resolution]['segment']
+        segment_starts = (candles['time'] // span) * span
+        with self._series_lock(key, resolution):
+            for segment_start in np.unique(segment_starts):
+                path = self._segment_path(key, resolution, int(segment_start))
+                existing = np.load(path) if os.path.exists(path) else np.zeros(0, dtype=CANDLE_DTYPE)
+                merged = merge_candles(existing, candles[segment_starts == segment_start])
+                # Replace atomically so readers holding a memory map keep a consistent file
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, merged)
+                os.replace(tmp_path, path)
+
+    def _segment_starts(self, key: Tuple[str, str], resolution: str) -> List[int]:
+        directory = self._series_dir(key, resolution)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith('.npy'))
+
+    def _apply_retention(self, keys: List[Tuple[str, str]], now: float):
+        """Delete segment files entirely past their resolution's retention"""
+        for key in keys:
+            for resolution, spec in RESOLUTIONS.items():
+                retention = self.retention.get(resolution)
+                if retention is None:
+                    continue
+                expired = [
+                    segment_start for segment_start in self._segment_starts(key, resolution)
+                    if segment_start + spec['segment'] <= now - retention
+                ]
+                if not expired:
+                    continue
+                with self._series_lock(key, resolution):
+                    for segment_start in expired:
+                        path = self._segment_path(key, resolution, segment_start)
+                        if os.path.exists(path):  # Another worker may have removed it first
+                            os.remove(path)
+
+    def get_history(self, coin_id: str, vs_currency: str = 'usd', resolution: str = '1h',
+                    start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        """Get candles with start <= time < end from the segment files plus not yet flushed points"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unsupported resolution: {resolution}")
+        key = (coin_id.lower(), vs_currency.lower())
+        if not (SERIES_NAME.match(key[0]) and SERIES_NAME.match(key[1])):
+            return np.zeros(0, dtype=CANDLE_DTYPE)
+
+        span = RESOLUTIONS[resolution]['segment']
+        bucket = RESOLUTIONS[resolution]['bucket']
+        # Whole buckets only: the candle covering start is included from its beginning
+        start = (int(start) // bucket) * bucket if start is not None else 0
+        end = end if end is not None else time.time() + span
+
+        parts = []
+        for segment_start in self._segment_starts(key, resolution):
+            if segment_start + span <= start or segment_start >= end:
+                continue
+            try:
+                candles = np.load(self._segment_path(key, resolution, segment_start), mmap_mode='r')
+            except (OSError, ValueError):
+                continue  # Removed by retention since it was listed
+            lo, hi = np.searchsorted(candles['time'], [start, end], side='left')
+            parts.append(np.array(candles[lo:hi]))
+
+        with self.lock:
+            series = self.series.get(key)
+            if series is not None:
+                timestamps, prices = series.view()
+                lo = int(np.searchsorted(timestamps, max(start, self.flushed_until.get(key, 0)), side='left'))
+                hi = int(np.searchsorted(timestamps, end, side='left'))
+                recent = compute_ohlc(timestamps[lo:hi], prices[lo:hi], bucket)
+            else:
+                recent = np.zeros(0, dtype=CANDLE_DTYPE)
+
+        stored = np.concatenate(parts) if parts else np.zeros(0, dtype=CANDLE_DTYPE)
+        candles = merge_candles(stored, recent)
+        return candles[candles['time'] < end]
+
+
+def resolve_history_dir(directory: str) -> str:
+    """Anchor a relative history directory to the app instance folder instead of the working directory"""
+    if os.path.isabs(directory):
+        return directory
+    try:
+        from flask import current_app
+        instance_path = current_app.instance_path
+    except RuntimeError:
+        # Outside an app context: the instance folder Flask uses for src.main
+        instance_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'instance')
+    return os.path.join(instance_path, directory)
+
+
+# Global store instance
+price_history_store = None
+
+def get_price_history_store():
+    """Get or create price history store instance"""
+    global price_history_store
+    if price_history_store is None:
+        price_history_store = PriceHistoryStore(
+            resolve_history_dir(get_setting('PRICE_HISTORY_DIR', 'price_history')),
+            raw_retention=float(get_setting('PRICE_HISTORY_RAW_RETENTION', 86400)),
+            flush_interval=float(get_setting('PRICE_HISTORY_FLUSH_INTERVAL', 60)),
+            retention={
+                '1m': float(get_setting('PRICE_HISTORY_1M_RETENTION', 7 * 86400)),
+                '1h': float(get_setting('PRICE_HISTORY_1H_RETENTION', 365 * 86400)),
+                '1d': None
+            }
+        )
+    return price_history_store
@@ -0,0 +1,519 @@
+"""
+Pooled Web3 provider registry
+Keeps one long-lived provider per network on top of a keep-alive HTTP session,
+routes calls across the network's RPC endpoints by latency and error rate,
+and checks RPC health in the background instead of on every call
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.config import get_setting
+
+try:
+    from web3 import Web3
+    from web3.providers.rpc import HTTPProvider
+    WEB3_AVAILABLE = True
+except ImportError:
+    WEB3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def create_pooled_session(pool_size: int) -> requests.Session:
+    """Create a requests session that keeps up to pool_size connections alive"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def parse_rpc_urls(value) -> List[str]:
+    """Split an RPC URL setting (comma-separated string or list) into endpoint URLs"""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [url for url in value if url]
+    return [url.strip() for url in value.split(',') if url.strip()]
+
+
+def display_url(url: str) -> str:
+    """Strip paths and query strings, which often carry API keys, from an RPC URL"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}" if parsed.netloc else url
+
+
+class RPCEndpoint:
+    """Latency and error tracking for one RPC endpoint"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency_ewma = None  # Seconds, moving average of successful calls
+        self.latencies = deque(maxlen=200)  # Recent successful call latencies, for hedge delays
+        self.error_rate = 0.0  # Moving average of failures (0..1)
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.backoff_until = 0.0
+        self.last_error = None
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.backoff_until
+
+    def score(self) -> float:
+        """Lower is better: moving latency average inflated by the recent error rate
+
+        Endpoints without a latency sample score by error rate alone so untried
+        endpoints get measured first.
+        """
+        latency = self.latency_ewma if self.latency_ewma is not None else 0.0
+        return latency * (1 + 10 * self.error_rate) + self.error_rate
+
+
+class EndpointRouter:
+    """Pick the best endpoint of a network and take failing ones out of rotation"""
+
+    def __init__(self, urls: List[str], alpha: float = 0.2, base_backoff: float = 5, max_backoff: float = 300):
+        self.endpoints = [RPCEndpoint(url) for url in urls]
+        self.alpha = alpha
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+
+    @property
+    def urls(self) -> List[str]:
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def ranked_endpoints(self) -> List[RPCEndpoint]:
+        """Available endpoints best first
+
+        When every endpoint is backing off, the one that recovers soonest is
+        returned alone so a brief outage doesn't fail calls for the full backoff.
+        """
+        now = time.time()
+        with self.lock:
+            available = sorted((e for e in self.endpoints if e.is_available(now)), key=lambda e: e.score())
+            if available:
+                return available
+            return [min(self.endpoints, key=lambda e: e.backoff_until)]
+
+    def has_available(self) -> bool:
+        """Check whether any endpoint is currently in rotation"""
+        now = time.time()
+        return any(endpoint.is_available(now) for endpoint in self.endpoints)
+
+    def latency_percentile(self, endpoint: RPCEndpoint, percentile: float, min_samples: int = 20) -> Optional[float]:
+        """Get a percentile of an endpoint's recent latency, None until enough samples exist"""
+        with self.lock:
+            samples = list(endpoint.latencies)
+        if len(samples) < min_samples:
+            return None
+        return float(np.percentile(samples, percentile))
+
+    def record_success(self, endpoint: RPCEndpoint, latency: float):
+        """Fold a successful call into the endpoint's averages and return it to rotation"""
+        with self.lock:
+            endpoint.requests += 1
+            endpoint.latencies.append(latency)
+            if endpoint.latency_ewma is None:
+                endpoint.latency_ewma = latency
+            else:
+                endpoint.latency_ewma = self.alpha * latency + (1 - self.alpha) * endpoint.latency_ewma
+            endpoint.error_rate = (1 - self.alpha) * endpoint.error_rate
+            recovered = endpoint.consecutive_failures > 0
+            endpoint.consecutive_failures = 0
+            endpoint.backoff_until = 0.0
+
+        if recovered:
+            logger.info(f"RPC endpoint {display_url(endpoint.url)} back in rotation")
+
+    def record_failure(self, endpoint: RPCEndpoint, error: Exception):
+        """Record a failed call and back the endpoint off exponentially"""
+        with self.lock:
+            endpoint.requests += 1
+            endpoint.errors += 1
+            endpoint.error_rate = self.alpha + (1 - self.alpha) * endpoint.error_rate
+            endpoint.consecutive_failures += 1
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (endpoint.consecutive_failures - 1))
+            endpoint.backoff_until = time.time() + backoff
+            endpoint.last_error = str(error)
+
+        logger.warning(
+            f"RPC endpoint {display_url(endpoint.url)} failed {endpoint.consecutive_failures} time(s), "
+            f"out of rotation for {backoff:.0f}s: {str(error)}"
+        )
+
+    def get_stats(self) -> List[Dict]:
+        """Get per-endpoint routing statistics"""
+        now = time.time()
+        with self.lock:
+            return [
+                {
+                    'endpoint': display_url(endpoint.url),
+                    'available': endpoint.is_available(now),
+                    'score': round(endpoint.score(), 4),
+                    'latency_ewma': round(endpoint.latency_ewma, 4) if endpoint.latency_ewma is not None else None,
+                    'error_rate': round(endpoint.error_rate, 4),
+                    'requests': endpoint.requests,
+                    'errors': endpoint.errors,
+                    'consecutive_failures': endpoint.consecutive_failures,
+                    'backoff_remaining': round(max(0.0, endpoint.backoff_until - now), 1),
+                    'last_error': endpoint.last_error
+                }
+                for endpoint in self.endpoints
+            ]
+
+
+# Read-only methods that are safe to send to two endpoints at once
+HEDGEABLE_METHODS = frozenset({
+    'eth_blockNumber',
+    'eth_call',
+    'eth_chainId',
+    'eth_feeHistory',
+    'eth_gasPrice',
+    'eth_getBalance',
+    'eth_getBlockByNumber',
+    'eth_getCode',
+    'eth_getLogs',
+    'eth_getTransactionByHash',
+    'eth_getTransactionReceipt'
+})
+
+
+class HedgePolicy:
+    """Opt-in request hedging for idempotent reads
+
+    When the primary endpoint hasn't answered within the given percentile of its
+    recent latency, the call is also sent to the next best endpoint and the first
+    answer wins. Every call earns max_ratio of a hedge token, so hedges can never
+    exceed that share of traffic (plus a small burst).
+    """
+
+    def __init__(self, enabled: bool = False, percentile: float = 95, max_ratio: float = 0.1,
+                 min_samples: int = 20, burst: float = 10):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.burst = burst
+        self.tokens = burst
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='rpc-hedge') if enabled else None
+        self.stats = {'hedgeable_calls': 0, 'hedges_sent': 0, 'hedges_won': 0, 'budget_exhausted': 0}
+
+    def should_hedge(self, method: str) -> bool:
+        """Check whether a call is eligible for hedging and earn budget for it"""
+        if not self.enabled or method not in HEDGEABLE_METHODS:
+            return False
+        with self.lock:
+            self.stats['hedgeable_calls'] += 1
+            self.tokens = min(self.burst, self.tokens + self.max_ratio)
+        return True
+
+    def try_acquire(self) -> bool:
+        """Spend one hedge token if the budget allows it"""
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.stats['hedges_sent'] += 1
+                return True
+            self.stats['budget_exhausted'] += 1
+            return False
+
+    def record_win(self):
+        """Count a hedge that answered before the primary"""
+        with self.lock:
+            self.stats['hedges_won'] += 1
+
+    def get_stats(self) -> Dict:
+        """Get hedging configuration and counters"""
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'percentile': self.percentile,
+                'max_ratio': self.max_ratio,
+                'tokens': round(self.tokens, 2),
+                **self.stats
+            }
+
+
+if WEB3_AVAILABLE:
+    class PooledHTTPProvider(HTTPProvider):
+        """HTTP provider that routes every request to the best endpoint over a shared keep-alive session"""
+
+        def __init__(self, router: EndpointRouter, session: requests.Session, timeout: float,
+                     hedge_policy: Optional[HedgePolicy] = None):
+            super().__init__(router.urls[0], request_kwargs={'timeout': timeout})
+            self.router = router
+            self.session = session
+            self.hedge_policy = hedge_policy
+
+        def _post_to(self, endpoint: RPCEndpoint, **kwargs) -> requests.Response:
+            """POST to one endpoint and record the outcome with the router"""
+            start_time = time.time()
+            try:
+                response = self.session.post(endpoint.url, **kwargs)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                self.router.record_failure(endpoint, e)
+                raise
+            self.router.record_success(endpoint, time.time() - start_time)
+            return response
+
+        def _post(self, **kwargs) -> requests.Response:
+            """POST to the best endpoint, failing over to the next one on transport errors"""
+            last_error = None
+            for endpoint in self.router.ranked_endpoints():
+                try:
+                    return self._post_to(endpoint, **kwargs)
+                except requests.RequestException as e:
+                    last_error = e
+            raise last_error
+
+        def _post_hedged(self, **kwargs) -> requests.Response:
+            """POST to the best endpoint and hedge to the runner-up if it is slower than usual"""
+            endpoints = self.router.ranked_endpoints()
+            if len(endpoints) < 2:
+                return self._post(**kwargs)
+
+            primary, backup = endpoints[0], endpoints[1]
+            hedge_delay = self.router.latency_percentile(primary, self.hedge_policy.percentile, self.hedge_policy.min_samples)
+            if hedge_delay is None:
+                return self._post(**kwargs)
+
+            executor = self.hedge_policy.executor
+            futures = {executor.submit(self._post_to, primary, **kwargs): primary}
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done and self.hedge_policy.try_acquire():
+                futures[executor.submit(self._post_to, backup, **kwargs)] = backup
+
+            # First successful answer wins; the loser still reports its latency to the router
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if futures[future] is backup:
+                            self.hedge_policy.record_win()
+                        return future.result()
+
+            # Both attempts failed; fail over through whatever is still in rotation
+            return self._post(**kwargs)
+
+        def make_request(self, method, params):
+            request_data = self.encode_rpc_request(method, params)
+            if self.hedge_policy and self.hedge_policy.should_hedge(method):
+                response = self._post_hedged(data=request_data, **self.get_request_kwargs())
+            else:
+                response = self._post(data=request_data, **self.get_request_kwargs())
+            return self.decode_rpc_response(response.content)
+
+
+class ProviderRegistry:
+    """Per-network registry of pooled, long-lived Web3 instances routed across RPC endpoints"""
+
+    def __init__(self, pool_size: int = 20, timeout: float = 10, health_check_interval: int = 30,
+                 base_backoff: float = 5, max_backoff: float = 300, hedge_policy: Optional[HedgePolicy] = None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.hedge_policy = hedge_policy or HedgePolicy()
+        self.providers: Dict[str, Dict] = {}  # network -> provider entry
+        self.lock = threading.Lock()
+        self._health_thread = None
+        self._stop_event = threading.Event()
+
+    def get_web3(self, network: str, rpc_urls):
+        """Get the pooled Web3 instance for a network, or None if no RPC URL is configured
+
+        Endpoint backoff only reorders endpoints: while every endpoint is backing
+        off, calls still go to the one that recovers soonest.
+        """
+        if not WEB3_AVAILABLE or not parse_rpc_urls(rpc_urls):
+            return None
+
+        entry = self._get_or_create_entry(network, rpc_urls)
+
+        # First use pays one connectivity check, after that the background thread owns it
+        if entry['last_check'] is None:
+            self._check_entry(network, entry)
+            self._ensure_health_thread()
+
+        return entry['web3']
+
+    def get_router(self, network: str, rpc_urls) -> EndpointRouter:
+        """Get the endpoint router for a network, shared with async providers"""
+        return self._get_or_create_entry(network, rpc_urls)['router']
+
+    def get_health(self, network: str) -> Optional[bool]:
+        """Get the outcome of the network's last health check, None if it has not been checked
+
+        Failures of ordinary calls only affect routing, not health.
+        """
+        entry = self.providers.get(network)
+        if not entry or entry['last_check'] is None:
+            return None
+        return entry['healthy']
+
+    def _get_or_create_entry(self, network: str, rpc_urls) -> Dict:
+        """Return the provider entry for a network, rebuilding it if the RPC URLs changed"""
+        urls = parse_rpc_urls(rpc_urls)
+        with self.lock:
+            entry = self.providers.get(network)
+            if entry and entry['router'].urls == urls:
+                return entry
+
+            if entry:
+                entry['session'].close()
+
+            router = EndpointRouter(urls, base_backoff=self.base_backoff, max_backoff=self.max_backoff)
+            session = create_pooled_session(self.pool_size)
+            provider = PooledHTTPProvider(router, session, self.timeout, self.hedge_policy)
+            entry = {
+                'router': router,
+                'session': session,
+                'provider': provider,
+                'web3': Web3(provider),
+                'healthy': None,
+                'last_check': None,
+                'last_latency': None,
+                'last_error': None,
+                'created_at': datetime.utcnow()
+            }
+            self.providers[network] = entry
+            return entry
+
+    def _check_endpoint(self, entry: Dict, endpoint: RPCEndpoint):
+        """Probe one endpoint with eth_blockNumber and record the outcome"""
+        start_time = time.time()
+        try:
+            response = entry['session'].post(
+                endpoint.url,
+                json={'jsonrpc': '2.0', 'id': 1, 'method': 'eth_blockNumber', 'params': []},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            if 'result' not in response.json():
+                raise ValueError(f"Unexpected response: {response.text[:200]}")
+        except Exception as e:
+            entry['router'].record_failure(endpoint, e)
+            return
+        entry['router'].record_success(endpoint, time.time() - start_time)
+
+    def _check_entry(self, network: str, entry: Dict):
+        """Run one connectivity check against every endpoint of a network"""
+        start_time = time.time()
+        router = entry['router']
+        for endpoint in router.endpoints:
+            self._check_endpoint(entry, endpoint)
+
+        healthy = router.has_available()
+        entry['last_error'] = None if healthy else router.endpoints[-1].last_error
+
+        if entry['healthy'] is not False and not healthy:
+            logger.warning(f"{network} RPC marked unhealthy: {entry['last_error']}")
+        elif entry['healthy'] is False and healthy:
+            logger.info(f"{network} RPC recovered")
+
+        entry['healthy'] = healthy
+        entry['last_latency'] = time.time() - start_time
+        entry['last_check'] = datetime.utcnow()
+
+    def _ensure_health_thread(self):
+        """Start the background health checker once"""
+        with self.lock:
+            if self._health_thread and self._health_thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+            self._health_thread.start()
+
+    def _health_loop(self):
+        """Periodically re-check every registered provider"""
+        while not self._stop_event.wait(self.health_check_interval):
+            with self.lock:
+                entries = list(self.providers.items())
+            for network, entry in entries:
+                self._check_entry(network, entry)
+
+    def stop(self):
+        """Stop health checks and close pooled sessions"""
+        self._stop_event.set()
+        with self.lock:
+            for entry in self.providers.values():
+                entry['session'].close()
+            self.providers.clear()
+
+    def get_stats(self) -> Dict:
+        """Get pool, routing and health statistics per network"""
+        with self.lock:
+            entries = list(self.providers.items())
+
+        networks = {}
+        for network, entry in entries:
+            pools = []
+            for adapter in set(entry['session'].adapters.values()):
+                for pool_key in adapter.poolmanager.pools.keys():
+                    pool = adapter.poolmanager.pools[pool_key]
+                    pools.append({
+                        'host': pool.host,
+                        'connections_opened': pool.num_connections,
+                        'requests': pool.num_requests,
+                        'idle_connections': pool.pool.qsize() if pool.pool else 0
+                    })
+
+            endpoints = entry['router'].get_stats()
+            networks[network] = {
+                'healthy': entry['healthy'],
+                'last_check': entry['last_check'].isoformat() if entry['last_check'] else None,
+                'last_check_latency': round(entry['last_latency'], 3) if entry['last_latency'] is not None else None,
+                'last_error': entry['last_error'],
+                'rpc_requests': sum(endpoint['requests'] for endpoint in endpoints),
+                'rpc_errors': sum(endpoint['errors'] for endpoint in endpoints),
+                'endpoints': endpoints,
+                'pools': pools,
+                'created_at': entry['created_at'].isoformat()
+            }
+
+        return {
+            'pool_size': self.pool_size,
+            'timeout': self.timeout,
+            'health_check_interval': self.health_check_interval,
+            'health_checker_running': bool(self._health_thread and self._health_thread.is_alive()),
+            'hedging': self.hedge_policy.get_stats(),
+            'networks': networks
+        }
+
+
+# Global registry instance
+provider_registry = None
+
+def get_provider_registry():
+    """Get or create provider registry instance"""
+    global provider_registry
+    if provider_registry is None:
+        provider_registry = ProviderRegistry(
+            pool_size=int(get_setting('RPC_POOL_SIZE', 20)),
+            timeout=float(get_setting('RPC_REQUEST_TIMEOUT', 10)),
+            health_check_interval=int(get_setting('RPC_HEALTH_CHECK_INTERVAL', 30)),
+            base_backoff=float(get_setting('RPC_ENDPOINT_BACKOFF', 5)),
+            max_backoff=float(get_setting('RPC_ENDPOINT_MAX_BACKOFF', 300)),
+            hedge_policy=HedgePolicy(
+                enabled=str(get_setting('RPC_HEDGING_ENABLED', False)).lower() == 'true',
+                percentile=float(get_setting('RPC_HEDGE_PERCENTILE', 95)),
+                max_ratio=float(get_setting('RPC_HEDGE_MAX_RATIO', 0.1))
+            )
+        )
+    return provider_registry
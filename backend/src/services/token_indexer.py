@@ -0,0 +1,294 @@
+"""
+ERC20 Transfer indexer
+Pulls Transfer logs of the registered token contracts with eth_getLogs in
+block-range chunks sized to what each provider accepts, records transfers
+touching custodial wallets and checkpoints progress per (network, contract)
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Tuple
+
+from flask import current_app
+
+from src.config import get_setting
+from src.models.user import TokenTransferCheckpoint, Transaction, db
+from src.services.async_blockchain import get_async_blockchain_service
+from src.services.blockchain import get_blockchain_service
+from src.services.monitor import WalletAddressIndex
+
+logger = logging.getLogger(__name__)
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+# Fragments of the errors providers return when a log query covers too much
+RANGE_LIMIT_ERRORS = (
+    'more than', 'too many', 'limit exceeded', 'block range', 'range too large', 'response size',
+    'response is too big', 'query timeout', 'timed out', '-32005'
+)
+
+
+def is_range_limit_error(error: Exception) -> bool:
+    """Check whether a failed log query should be retried over a smaller range"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    message = str(error).lower()
+    return any(fragment in message for fragment in RANGE_LIMIT_ERRORS)
+
+
+class BlockRangeChunker:
+    """Log query range that halves when the provider refuses it and grows after a run of successes"""
+
+    def __init__(self, initial_size: int = 2000, min_size: int = 1, max_size: int = 10000,
+                 growth: float = 2.0, grow_after: int = 5):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(self.max_size, max(self.min_size, initial_size))
+        self.growth = growth
+        self.grow_after = grow_after  # Successes required before growing, so a refused size isn't retried at once
+        self.successes = 0
+
+    def shrink(self) -> bool:
+        """Halve the range; False if it is already at the minimum"""
+        self.successes = 0
+        if self.size <= self.min_size:
+            return False
+        self.size = max(self.min_size, self.size // 2)
+        return True
+
+    def record_success(self):
+        self.successes += 1
+        if self.successes >= self.grow_after:
+            self.successes = 0
+            self.size = min(self.max_size, max(self.size + 1, int(self.size * self.growth)))
+
+
+class TokenTransferIndexer:
+    """Records ERC20 transfers to and from custodial wallets from contract logs"""
+
+    def __init__(self, websocket_manager=None, poll_interval: float = 15, confirmations: int = 3,
+                 initial_range: int = 2000, max_range: int = 10000, max_blocks: int = 100000):
+        self.websocket_manager = websocket_manager
+        self.blockchain_service = get_blockchain_service()
+        self.poll_interval = poll_interval
+        self.confirmations = confirmations
+        self.initial_range = initial_range
+        self.max_range = max_range
+        self.max_blocks = max_blocks  # Per contract per pass, so a long outage catches up gradually
+        self.index = WalletAddressIndex()
+        self.chunkers: Dict[Tuple[str, str], BlockRangeChunker] = {}
+        self.indexing = False
+        self.stats = {'log_queries': 0, 'range_retries': 0, 'logs_seen': 0, 'recorded': 0}
+
+    async def start_indexing(self):
+        """Start indexing token transfers"""
+        self.indexing = True
+        logger.info("Token transfer indexing started")
+
+        while self.indexing:
+            try:
+                await self.index_once()
+                await asyncio.sleep(self.poll_interval)
+
+            except Exception as e:
+                logger.error(f"Token transfer indexing error: {str(e)}")
+                await asyncio.sleep(60)  # Wait longer on error
+
+    def stop_indexing(self):
+        """Stop indexing"""
+        self.indexing = False
+        logger.info("Token transfer indexing stopped")
+
+    async def index_once(self):
+        """Index every token contract on networks that have custodial wallets"""
+        with current_app.app_context():
+            self.index.refresh()
+
+        contracts = self.blockchain_service.get_token_contracts()
+        jobs = [
+            (network, symbol, address)
+            for network in self.index.networks() if self.blockchain_service.get_rpc_urls(network)
+            for symbol, address in contracts.get(network, {}).items()
+        ]
+        results = await asyncio.gather(*(self.index_contract(*job) for job in jobs), return_exceptions=True)
+        for (network, symbol, _), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error indexing {symbol} transfers on {network}: {str(result)}")
+
+    async def index_contract(self, network: str, symbol: str, contract: str):
+        """Index one contract from its checkpoint up to the confirmed head"""
+        head = await get_async_blockchain_service().get_block_number(network)
+        if head is None:
+            return
+        safe_head = head - self.confirmations
+
+        with current_app.app_context():
+            checkpoint = TokenTransferCheckpoint.query.filter_by(
+                network=network, contract_address=contract.lower()
+            ).first()
+            last_block = checkpoint.last_block if checkpoint else None
+
+        if last_block is None:
+            # Start from the chain tip; history is covered by explorer sync
+            await self._record(network, symbol, contract, [], safe_head)
+            return
+
+        end = min(safe_head, last_block + self.max_blocks)
+        async for chunk_end, logs in self.iter_logs(network, contract, last_block + 1, end):
+            await self._record(network, symbol, contract, self.match_logs(network, logs), chunk_end)
+
+    async def iter_logs(self, network: str, contract: str, from_block: int, to_block: int) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        """Yield (chunk_end, logs) across a block range in order, adapting the chunk size"""
+        async_service = get_async_blockchain_service()
+        chunker = self.chunkers.setdefault(
+            (network, contract.lower()), BlockRangeChunker(self.initial_range, max_size=self.max_range)
+        )
+
+        while from_block <= to_block:
+            chunk_end = min(to_block, from_block + chunker.size - 1)
+            self.stats['log_queries'] += 1
+            try:
+                logs = await async_service.get_logs(network, contract, [TRANSFER_TOPIC], from_block, chunk_end)
+            except Exception as e:
+                if is_range_limit_error(e) and chunker.shrink():
+                    self.stats['range_retries'] += 1
+                    logger.debug(f"Log range for {contract} on {network} reduced to {chunker.size} blocks: {str(e)}")
+                    continue
+                raise
+
+            chunker.record_success()
+            yield chunk_end, logs
+            from_block = chunk_end + 1
+
+    def match_logs(self, network: str, logs: List[Dict]) -> List[Dict]:
+        """Find Transfer logs whose recipient or sender is a custodial wallet"""
+        matches = []
+        self.stats['logs_seen'] += len(logs)
+        for log in logs:
+            topics = log.get('topics', [])
+            # ERC721 Transfer shares the signature but indexes the token id as a fourth topic
+            if log.get('removed') or len(topics) != 3:
+                continue
+
+            from_address = '0x' + topics[1][-40:]
+            to_address = '0x' + topics[2][-40:]
+            # Both legs are kept when a transfer moves tokens between two custodial wallets
+            for address, transaction_type in ((to_address, 'receive'), (from_address, 'send')):
+                wallet = self.index.match(network, address)
+                if wallet is None:
+                    continue
+                matches.append({
+                    'hash': log['transactionHash'],
+                    'log_index': int(log['logIndex'], 16),
+                    'from_address': from_address,
+                    'to_address': to_address,
+                    'value': int(log['data'], 16) if log.get('data') not in (None, '0x') else 0,
+                    'block_number': int(log['blockNumber'], 16),
+                    'transaction_type': transaction_type,
+                    'wallet_id': wallet[0],
+                    'user_id': wallet[1]
+                })
+        return matches
+
+    async def _record(self, network: str, symbol: str, contract: str, matches: List[Dict], last_block: int):
+        """Insert matched transfers and advance the checkpoint in one commit"""
+        timestamps = {}
+        decimals = None
+        if matches:
+            async_service = get_async_blockchain_service()
+            decimals = await async_service.get_token_decimals(network, symbol)
+            blocks = await async_service.get_blocks(
+                network, sorted({match['block_number'] for match in matches}), full_transactions=False
+            )
+            timestamps = {number: datetime.utcfromtimestamp(int(block['timestamp'], 16)) for number, block in blocks.items()}
+
+        notifications = []
+        with current_app.app_context():
+            try:
+                hashes = [match['hash'] for match in matches]
+                rows = db.session.query(
+                    Transaction.transaction_hash, Transaction.log_index, Transaction.wallet_id,
+                    Transaction.transaction_type, Transaction.currency
+                ).filter(Transaction.transaction_hash.in_(hashes)).all() if hashes else []
+                existing = {(tx_hash, log_index, wallet_id) for tx_hash, log_index, wallet_id, _, _ in rows}
+                # Sends of this token are already recorded by the send path, without a log index
+                sent = {
+                    (tx_hash, wallet_id) for tx_hash, log_index, wallet_id, transaction_type, currency in rows
+                    if log_index < 0 and transaction_type == 'send' and currency == symbol
+                }
+
+                new_txs = []
+                for match in matches:
+                    # Keyed per Transfer log and wallet, so batch payouts and internal transfers keep every leg
+                    key = (match['hash'], match['log_index'], match['wallet_id'])
+                    if key in existing or (match['transaction_type'] == 'send' and (match['hash'], match['wallet_id']) in sent):
+                        continue
+                    existing.add(key)
+                    timestamp = timestamps.get(match['block_number'], datetime.utcnow())
+                    new_txs.append(Transaction(
+                        user_id=match['user_id'],
+                        wallet_id=match['wallet_id'],
+                        transaction_hash=match['hash'],
+                        log_index=match['log_index'],
+                        from_address=match['from_address'],
+                        to_address=match['to_address'],
+                        amount=str(match['value'] / 10**decimals),
+                        currency=symbol,
+                        network=network,
+                        transaction_type=match['transaction_type'],
+                        status='confirmed',  # Reverted transactions emit no logs
+                        block_number=match['block_number'],
+                        created_at=timestamp,
+                        confirmed_at=timestamp
+                    ))
+
+                checkpoint = TokenTransferCheckpoint.query.filter_by(
+                    network=network, contract_address=contract.lower()
+                ).first()
+                if checkpoint is None:
+                    checkpoint = TokenTransferCheckpoint(network=network, contract_address=contract.lower(), last_block=last_block)
+                    db.session.add(checkpoint)
+                else:
+                    checkpoint.last_block = last_block
+
+                db.session.add_all(new_txs)
+                db.session.flush()
+                notifications = [(tx.user_id, tx.to_dict()) for tx in new_txs]
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        if notifications:
+            self.stats['recorded'] += len(notifications)
+            logger.info(f"Recorded {len(notifications)} {symbol} transfers on {network}")
+
+        if self.websocket_manager:
+            for user_id, tx_data in notifications:
+                self.websocket_manager.broadcast_new_transaction(str(user_id), tx_data)
+
+    def get_stats(self) -> Dict:
+        """Get current log ranges and counters"""
+        return {
+            'ranges': {f"{network}:{contract}": chunker.size for (network, contract), chunker in self.chunkers.items()},
+            **self.stats
+        }
+
+
+# Global indexer instance
+token_indexer = None
+
+def get_token_indexer(websocket_manager=None):
+    """Get or create token transfer indexer instance"""
+    global token_indexer
+    if token_indexer is None:
+        token_indexer = TokenTransferIndexer(
+            websocket_manager,
+            poll_interval=float(get_setting('TOKEN_INDEXER_INTERVAL', 15)),
+            confirmations=int(get_setting('BLOCK_SCANNER_CONFIRMATIONS', 3)),
+            initial_range=int(get_setting('TOKEN_INDEXER_INITIAL_RANGE', 2000)),
+            max_range=int(get_setting('TOKEN_INDEXER_MAX_RANGE', 10000)),
+            max_blocks=int(get_setting('TOKEN_INDEXER_MAX_BLOCKS', 100000))
+        )
+    return token_indexer
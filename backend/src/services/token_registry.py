@@ -0,0 +1,194 @@
+"""
+ERC20 token registry
+Loads token contracts once, keeps prebuilt contract objects and caches
+immutable on-chain metadata (decimals, symbol) forever
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+try:
+    from web3 import Web3
+    WEB3_AVAILABLE = True
+except ImportError:
+    WEB3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# ERC20 ABI (minimal for balance and transfer)
+ERC20_ABI = [
+    {
+        "constant": True,
+        "inputs": [{"name": "_owner", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "constant": False,
+        "inputs": [
+            {"name": "_to", "type": "address"},
+            {"name": "_value", "type": "uint256"}
+        ],
+        "name": "transfer",
+        "outputs": [{"name": "", "type": "bool"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "decimals",
+        "outputs": [{"name": "", "type": "uint8"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "symbol",
+        "outputs": [{"name": "", "type": "string"}],
+        "type": "function"
+    }
+]
+
+# Token contract addresses per network: (env var, default address)
+TOKEN_CONTRACT_SOURCES = {
+    'ethereum': {
+        'USDT': ('ETH_USDT_CONTRACT', '0xdAC17F958D2ee523a2206206994597C13D831ec7'),
+        'USDC': ('ETH_USDC_CONTRACT', '0xA0b86a33E6441E6C7D3E4C7C5C6C7C5C6C7C5C6C')
+    },
+    'polygon': {
+        'USDT': ('POLYGON_USDT_CONTRACT', '0xc2132D05D31c914a87C6611C10748AEb04B58e8F'),
+        'USDC': ('POLYGON_USDC_CONTRACT', '0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174')
+    },
+    'bsc': {
+        'USDT': ('BSC_USDT_CONTRACT', '0x55d398326f99059fF775485246999027B3197955'),
+        'USDC': ('BSC_USDC_CONTRACT', '0x8AC76a51cc950d9822D68b83fE1Ad97B32Cd580d')
+    }
+}
+
+
+class TokenRegistry:
+    """Startup-loaded registry of ERC20 contracts and their metadata"""
+
+    def __init__(self):
+        self.contracts: Dict[str, Dict[str, str]] = {}  # network -> symbol -> checksummed address
+        self.contract_objects: Dict[tuple, object] = {}  # (network, symbol) -> (web3, contract)
+        self.metadata: Dict[tuple, Dict] = {}  # (network, address) -> {'decimals', 'symbol'}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load token contract addresses from the environment, skipping malformed ones"""
+        contracts = {}
+        for network, tokens in TOKEN_CONTRACT_SOURCES.items():
+            contracts[network] = {}
+            for symbol, (env_var, default_address) in tokens.items():
+                address = os.getenv(env_var, default_address)
+                if WEB3_AVAILABLE:
+                    try:
+                        address = Web3.to_checksum_address(address)
+                    except (TypeError, ValueError) as e:
+                        logger.error(f"Skipping {symbol} on {network}: invalid {env_var} {address!r}: {str(e)}")
+                        continue
+                contracts[network][symbol] = address
+
+        with self.lock:
+            self.contracts = contracts
+            # Contract objects are bound to addresses that may have changed
+            self.contract_objects = {}
+            self.loaded_at = datetime.utcnow()
+
+        logger.info(f"Token registry loaded: {sum(len(t) for t in contracts.values())} contracts")
+
+    def reload(self) -> Dict:
+        """Reload contract addresses; cached metadata is kept since it is keyed by address"""
+        self.load()
+        return self.get_info()
+
+    def get_contracts(self) -> Dict[str, Dict[str, str]]:
+        """Get token contract addresses for supported networks"""
+        return self.contracts
+
+    def get_address(self, network: str, symbol: str) -> Optional[str]:
+        """Get checksummed contract address for a token"""
+        return self.contracts.get(network, {}).get(symbol)
+
+    def get_contract(self, web3, network: str, symbol: str):
+        """Get prebuilt contract object for a token, bound to the given Web3 instance"""
+        key = (network, symbol)
+        cached = self.contract_objects.get(key)
+        if cached and cached[0] is web3:
+            return cached[1]
+
+        address = self.get_address(network, symbol)
+        if not address:
+            return None
+
+        contract = web3.eth.contract(address=address, abi=ERC20_ABI)
+        with self.lock:
+            self.contract_objects[key] = (web3, contract)
+        return contract
+
+    def get_cached_decimals(self, network: str, symbol: str) -> Optional[int]:
+        """Get decimals if already known, without any RPC call"""
+        address = self.get_address(network, symbol)
+        return self.metadata.get((network, address), {}).get('decimals')
+
+    def set_decimals(self, network: str, symbol: str, decimals: int):
+        """Record decimals learned elsewhere (e.g. from a multicall)"""
+        address = self.get_address(network, symbol)
+        with self.lock:
+            self.metadata.setdefault((network, address), {})['decimals'] = decimals
+
+    def get_decimals(self, web3, network: str, symbol: str) -> int:
+        """Get token decimals, fetching them over RPC only the first time"""
+        decimals = self.get_cached_decimals(network, symbol)
+        if decimals is None:
+            decimals = self.get_contract(web3, network, symbol).functions.decimals().call()
+            self.set_decimals(network, symbol, decimals)
+        return decimals
+
+    def get_metadata(self, web3, network: str, symbol: str) -> Dict:
+        """Get decimals and on-chain symbol for a token, cached forever"""
+        address = self.get_address(network, symbol)
+        decimals = self.get_decimals(web3, network, symbol)
+
+        metadata = self.metadata[(network, address)]
+        if 'symbol' not in metadata:
+            onchain_symbol = self.get_contract(web3, network, symbol).functions.symbol().call()
+            with self.lock:
+                metadata['symbol'] = onchain_symbol
+
+        return {'address': address, 'decimals': decimals, 'symbol': metadata['symbol']}
+
+    def get_info(self) -> Dict:
+        """Get registry contents for admin inspection"""
+        tokens = {}
+        for network, network_contracts in self.contracts.items():
+            tokens[network] = {
+                symbol: {
+                    'address': address,
+                    **self.metadata.get((network, address), {})
+                }
+                for symbol, address in network_contracts.items()
+            }
+
+        return {
+            'tokens': tokens,
+            'contract_objects': len(self.contract_objects),
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None
+        }
+
+
+# Global registry instance
+token_registry = None
+
+def get_token_registry():
+    """Get or create token registry instance"""
+    global token_registry
+    if token_registry is None:
+        token_registry = TokenRegistry()
+    return token_registry
@@ -2,18 +2,25 @@
 Transaction monitoring and blockchain explorer integration service
 """
 import asyncio
-import httpx
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from flask import current_app
+from sqlalchemy import insert, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import os
-from src.models.user import Transaction, Wallet, db
+from src.config import get_setting
+from src.services.explorer_sync import acquire_token, get_explorer_quota
+from src.utils.http_client import get_http_client
+from src.models.user import Transaction, Wallet, WalletSyncState, db
 
 class TransactionMonitor:
     """Monitor and sync transactions from blockchain explorers"""
     
     def __init__(self):
         self.etherscan_api_key = os.getenv('ETHERSCAN_API_KEY')
+        self.quota = get_explorer_quota()
+        self.http = get_http_client()
         
         # Chain IDs for Etherscan V2 API (testnet and mainnet)
         self.chain_ids = {
@@ -70,7 +77,8 @@ class TransactionMonitor:
             }
         }
     
-    async def get_address_transactions(self, address: str, network: str, page: int = 1, offset: int = 20) -> Dict:
+    async def get_address_transactions(self, address: str, network: str, page: int = 1, offset: int = 20,
+                                       start_block: int = 0, end_block: int = 99999999, sort: str = 'desc') -> Dict:
         """Get transaction history for an address from blockchain explorer"""
         try:
             if network not in self.explorer_apis:
@@ -85,62 +93,69 @@ class TransactionMonitor:
                 'module': 'account',
                 'action': 'txlist',
                 'address': address,
-                'startblock': 0,
-                'endblock': 99999999,
+                'startblock': start_block,
+                'endblock': end_block,
                 'page': page,
                 'offset': offset,
-                'sort': 'desc',
+                'sort': sort,
                 'apikey': explorer['api_key']
             }
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(explorer['base_url'], params=params)
+            await acquire_token(self.quota)
+            response = await self.http.request('explorer', 'GET', explorer['base_url'], params=params)
+            
+            if response.status_code == 200:
+                data = response.json()
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if data.get('status') == '1':
-                        transactions = []
-                        for tx in data.get('result', []):
-                            # Convert Wei to Ether
-                            value_eth = float(tx.get('value', '0')) / 10**18
-                            
-                            # Determine transaction type
-                            tx_type = 'receive' if tx.get('to', '').lower() == address.lower() else 'send'
-                            
-                            # Convert timestamp
-                            timestamp = datetime.fromtimestamp(int(tx.get('timeStamp', 0)))
-                            
-                            transaction = {
-                                'hash': tx.get('hash'),
-                                'from_address': tx.get('from'),
-                                'to_address': tx.get('to'),
-                                'value': str(value_eth),
-                                'gas_used': tx.get('gasUsed'),
-                                'gas_price': tx.get('gasPrice'),
-                                'block_number': int(tx.get('blockNumber', 0)),
-                                'timestamp': timestamp.isoformat(),
-                                'status': 'confirmed' if tx.get('txreceipt_status') == '1' else 'failed',
-                                'type': tx_type,
-                                'network': network
-                            }
-                            transactions.append(transaction)
+                if data.get('status') == '1':
+                    transactions = []
+                    for tx in data.get('result', []):
+                        # Convert Wei to Ether
+                        value_eth = float(tx.get('value', '0')) / 10**18
                         
-                        return {
-                            'success': True,
-                            'transactions': transactions,
-                            'total_count': len(transactions)
-                        }
-                    else:
-                        return {
-                            'success': False,
-                            'error': data.get('message', 'API request failed')
+                        # Determine transaction type
+                        tx_type = 'receive' if tx.get('to', '').lower() == address.lower() else 'send'
+                        
+                        # Convert timestamp
+                        timestamp = datetime.fromtimestamp(int(tx.get('timeStamp', 0)))
+                        
+                        transaction = {
+                            'hash': tx.get('hash'),
+                            'from_address': tx.get('from'),
+                            'to_address': tx.get('to'),
+                            'value': str(value_eth),
+                            'gas_used': tx.get('gasUsed'),
+                            'gas_price': tx.get('gasPrice'),
+                            'block_number': int(tx.get('blockNumber', 0)),
+                            'timestamp': timestamp.isoformat(),
+                            'status': 'confirmed' if tx.get('txreceipt_status') == '1' else 'failed',
+                            'type': tx_type,
+                            'network': network
                         }
+                        transactions.append(transaction)
+                    
+                    return {
+                        'success': True,
+                        'transactions': transactions,
+                        'total_count': len(transactions)
+                    }
+                elif data.get('message') == 'No transactions found':
+                    # Etherscan reports an empty block range as a failure
+                    return {
+                        'success': True,
+                        'transactions': [],
+                        'total_count': 0
+                    }
                 else:
                     return {
                         'success': False,
-                        'error': f'HTTP {response.status_code}: {response.text}'
+                        'error': data.get('message', 'API request failed')
                     }
+            else:
+                return {
+                    'success': False,
+                    'error': f'HTTP {response.status_code}: {response.text}'
+                }
                     
         except Exception as e:
             return {
@@ -148,73 +163,191 @@ class TransactionMonitor:
                 'error': f'Failed to fetch transactions: {str(e)}'
             }
     
-    async def sync_wallet_transactions(self, wallet_id: int) -> Dict:
-        """Sync transactions for a specific wallet from blockchain"""
+    async def fetch_block_range(self, address: str, network: str, start_block: int, end_block: int,
+                                sort: str, page_size: int, max_pages: int) -> Dict:
+        """Page through explorer results for a block range
+
+        Stops at the first short page (the range is exhausted) or after max_pages
+        requests, in which case 'exhausted' is False and the caller resumes later.
+        """
+        transactions = []
+        for page in range(1, max_pages + 1):
+            result = await self.get_address_transactions(
+                address, network, page=page, offset=page_size,
+                start_block=start_block, end_block=end_block, sort=sort
+            )
+            if not result['success']:
+                return result
+            transactions.extend(result['transactions'])
+            if len(result['transactions']) < page_size:
+                return {'success': True, 'transactions': transactions, 'exhausted': True, 'requests': page}
+        return {'success': True, 'transactions': transactions, 'exhausted': False, 'requests': max_pages}
+
+    async def sync_wallet_transactions(self, wallet_id: int, backfill: bool = False) -> Dict:
+        """Sync transactions for a specific wallet from blockchain
+
+        Incremental syncs only request blocks above the wallet's high-water mark.
+        The first sync takes the newest page and leaves older history to backfill,
+        which pages down from a persisted cursor on each call until it is complete.
+        """
         try:
             wallet = Wallet.query.get(wallet_id)
             if not wallet:
                 return {'success': False, 'error': 'Wallet not found'}
-            
-            # Get transactions from blockchain explorer
-            result = await self.get_address_transactions(
-                wallet.address, 
-                wallet.network,
-                page=1,
-                offset=50
-            )
-            
+
+            state = wallet.sync_state
+            if state is None:
+                state = WalletSyncState(wallet_id=wallet.id)
+                db.session.add(state)
+
+            page_size = int(get_setting('EXPLORER_PAGE_SIZE', 100))
+            max_pages = int(get_setting('EXPLORER_MAX_PAGES', 10))
+
+            if backfill:
+                result = await self._sync_backfill(wallet, state, page_size, max_pages)
+            else:
+                result = await self._sync_incremental(wallet, state, page_size, max_pages)
+
             if not result['success']:
+                db.session.rollback()
                 return result
-            
-            synced_count = 0
-            for tx_data in result['transactions']:
-                # Check if transaction already exists
-                existing_tx = Transaction.query.filter_by(
-                    transaction_hash=tx_data['hash']
-                ).first()
-                
-                if not existing_tx:
-                    # Create new transaction record
-                    new_tx = Transaction(
-                        user_id=wallet.user_id,
-                        wallet_id=wallet.id,
-                        transaction_hash=tx_data['hash'],
-                        from_address=tx_data['from_address'],
-                        to_address=tx_data['to_address'],
-                        amount=tx_data['value'],
-                        currency=self._get_network_currency(wallet.network),
-                        network=wallet.network,
-                        transaction_type=tx_data['type'],
-                        status=tx_data['status'],
-                        gas_fee=str(float(tx_data.get('gas_used', 0)) * float(tx_data.get('gas_price', 0)) / 10**18),
-                        block_number=tx_data['block_number'],
-                        created_at=datetime.fromisoformat(tx_data['timestamp']),
-                        confirmed_at=datetime.fromisoformat(tx_data['timestamp']) if tx_data['status'] == 'confirmed' else None
-                    )
-                    
-                    db.session.add(new_tx)
-                    synced_count += 1
-                else:
-                    # Update status if changed
-                    if existing_tx.status != tx_data['status']:
-                        existing_tx.status = tx_data['status']
-                        if tx_data['status'] == 'confirmed' and not existing_tx.confirmed_at:
-                            existing_tx.confirmed_at = datetime.fromisoformat(tx_data['timestamp'])
-            
+
+            synced_count = self._store_transactions(wallet, result['transactions'])
+            state.last_synced_at = datetime.utcnow()
+            if state.backfill_complete:
+                state.backfill_requested = False
             db.session.commit()
-            
+
             return {
                 'success': True,
                 'synced_transactions': synced_count,
-                'total_found': len(result['transactions'])
+                'total_found': len(result['transactions']),
+                'explorer_requests': result['requests'],
+                'last_synced_block': state.last_synced_block,
+                'backfill_complete': bool(state.backfill_complete)
             }
-            
+
         except Exception as e:
             db.session.rollback()
             return {
                 'success': False,
                 'error': f'Failed to sync transactions: {str(e)}'
             }
+
+    async def _sync_incremental(self, wallet: Wallet, state: WalletSyncState, page_size: int, max_pages: int) -> Dict:
+        """Fetch transactions above the high-water mark and advance it"""
+        if state.last_synced_block is None:
+            # First sync: newest page only, older history is left to backfill
+            result = await self.fetch_block_range(wallet.address, wallet.network, 0, 99999999, 'desc', page_size, 1)
+            if result['success']:
+                blocks = [tx['block_number'] for tx in result['transactions']]
+                state.last_synced_block = max(blocks, default=0)
+                if result['exhausted']:
+                    state.backfill_complete = True
+                else:
+                    # The oldest block may be partially covered, so backfill starts at it
+                    state.backfill_cursor = min(blocks)
+            return result
+
+        result = await self.fetch_block_range(
+            wallet.address, wallet.network, state.last_synced_block + 1, 99999999, 'asc', page_size, max_pages
+        )
+        if result['success'] and result['transactions']:
+            newest_block = max(tx['block_number'] for tx in result['transactions'])
+            # When cut short the newest block may be partially covered; resume at it next time
+            state.last_synced_block = newest_block if result['exhausted'] else max(state.last_synced_block, newest_block - 1)
+        return result
+
+    async def _sync_backfill(self, wallet: Wallet, state: WalletSyncState, page_size: int, max_pages: int) -> Dict:
+        """Fetch history below the backfill cursor and move it down"""
+        if state.backfill_complete:
+            return {'success': True, 'transactions': [], 'exhausted': True, 'requests': 0}
+        if state.last_synced_block is None:
+            return await self._sync_incremental(wallet, state, page_size, max_pages)
+
+        end_block = state.backfill_cursor if state.backfill_cursor is not None else state.last_synced_block
+        result = await self.fetch_block_range(wallet.address, wallet.network, 0, end_block, 'desc', page_size, max_pages)
+        if result['success']:
+            if result['exhausted']:
+                state.backfill_complete = True
+                state.backfill_cursor = None
+            else:
+                oldest_block = min(tx['block_number'] for tx in result['transactions'])
+                # Re-request the partially covered oldest block, but always make progress
+                state.backfill_cursor = oldest_block if oldest_block < end_block else end_block - 1
+        return result
+
+    def _store_transactions(self, wallet: Wallet, transactions: List[Dict]) -> int:
+        """Add new explorer transactions and update changed statuses, returns the number added
+
+        One IN query finds known hashes, new rows go in as one multi-row insert and
+        status changes as one bulk update, whatever the number of transactions.
+        """
+        by_hash = {tx_data['hash']: tx_data for tx_data in transactions}
+        if not by_hash:
+            return 0
+
+        existing = {
+            tx_hash: (tx_id, status, confirmed_at)
+            for tx_id, tx_hash, status, confirmed_at in db.session.query(
+                Transaction.id, Transaction.transaction_hash, Transaction.status, Transaction.confirmed_at
+            ).filter(
+                Transaction.transaction_hash.in_(list(by_hash)),
+                Transaction.wallet_id == wallet.id,
+                Transaction.log_index < 0
+            )
+        }
+
+        new_rows = []
+        status_updates = []
+        currency = self._get_network_currency(wallet.network)
+        for tx_hash, tx_data in by_hash.items():
+            timestamp = datetime.fromisoformat(tx_data['timestamp'])
+            if tx_hash not in existing:
+                new_rows.append({
+                    'user_id': wallet.user_id,
+                    'wallet_id': wallet.id,
+                    'transaction_hash': tx_hash,
+                    'from_address': tx_data['from_address'],
+                    'to_address': tx_data['to_address'],
+                    'amount': tx_data['value'],
+                    'currency': currency,
+                    'network': wallet.network,
+                    'transaction_type': tx_data['type'],
+                    'status': tx_data['status'],
+                    'gas_fee': str(float(tx_data.get('gas_used', 0)) * float(tx_data.get('gas_price', 0)) / 10**18),
+                    'block_number': tx_data['block_number'],
+                    'created_at': timestamp,
+                    'confirmed_at': timestamp if tx_data['status'] == 'confirmed' else None
+                })
+                continue
+
+            # Update status if changed
+            tx_id, status, confirmed_at = existing[tx_hash]
+            if status != tx_data['status']:
+                status_updates.append({
+                    'id': tx_id,
+                    'status': tx_data['status'],
+                    'confirmed_at': confirmed_at or (timestamp if tx_data['status'] == 'confirmed' else None)
+                })
+
+        synced_count = self._insert_new_transactions(new_rows) if new_rows else 0
+        if status_updates:
+            db.session.execute(update(Transaction), status_updates)
+        return synced_count
+
+    def _insert_new_transactions(self, rows: List[Dict]) -> int:
+        """Insert native transaction rows in one statement, skipping ones another writer stored meanwhile"""
+        rows = [{**row, 'log_index': -1} for row in rows]
+        conflict_key = ['transaction_hash', 'log_index', 'wallet_id']
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            statement = postgresql_insert(Transaction).values(rows).on_conflict_do_nothing(index_elements=conflict_key)
+        elif dialect == 'sqlite':
+            statement = sqlite_insert(Transaction).values(rows).on_conflict_do_nothing(index_elements=conflict_key)
+        else:
+            statement = insert(Transaction).values(rows)
+        return db.session.execute(statement).rowcount
     
     def _get_network_currency(self, network: str) -> str:
         """Get the native currency symbol for a network"""
@@ -245,31 +378,31 @@ class TransactionMonitor:
                 'apikey': explorer['api_key']
             }
             
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.get(explorer['base_url'], params=params)
+            await acquire_token(self.quota)
+            response = await self.http.request('explorer', 'GET', explorer['base_url'], params=params)
+            
+            if response.status_code == 200:
+                data = response.json()
                 
-                if response.status_code == 200:
-                    data = response.json()
+                if data.get('status') == '1':
+                    result = data.get('result', {})
+                    status = 'confirmed' if result.get('status') == '1' else 'failed'
                     
-                    if data.get('status') == '1':
-                        result = data.get('result', {})
-                        status = 'confirmed' if result.get('status') == '1' else 'failed'
-                        
-                        return {
-                            'success': True,
-                            'status': status,
-                            'hash': tx_hash
-                        }
-                    else:
-                        return {
-                            'success': False,
-                            'error': data.get('message', 'Transaction not found')
-                        }
+                    return {
+                        'success': True,
+                        'status': status,
+                        'hash': tx_hash
+                    }
                 else:
                     return {
                         'success': False,
-                        'error': f'HTTP {response.status_code}'
+                        'error': data.get('message', 'Transaction not found')
                     }
+            else:
+                return {
+                    'success': False,
+                    'error': f'HTTP {response.status_code}'
+                }
                     
         except Exception as e:
             return {
@@ -0,0 +1,163 @@
+"""
+Adaptive polling schedule for pending transactions
+Checks new transactions often, backs off exponentially as they age, parks them
+until their chain produces a new block and retires them as dropped after a timeout
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+class PendingTransactionScheduler:
+    """Priority queue of pending transactions ordered by next check time"""
+
+    def __init__(self, min_interval: float = 5, max_interval: float = 600, drop_timeout: float = 86400):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.drop_timeout = drop_timeout
+        self.heap = []  # (next_check, seq, tx_id); superseded items are skipped when popped
+        self.entries: Dict[int, Dict] = {}  # tx_id -> schedule entry
+        self.parked: Dict[str, set] = {}  # network -> tx_ids waiting for a new block
+        self.lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def _push(self, entry: Dict, next_check: float):
+        entry['next_check'] = next_check
+        heapq.heappush(self.heap, (next_check, next(self._seq), entry['tx_id']))
+
+    def add(self, tx_id: int, tx_hash: str, network: str, created_at: float, now: Optional[float] = None) -> bool:
+        """Schedule a pending transaction for an immediate first check, unless already scheduled"""
+        with self.lock:
+            if tx_id in self.entries:
+                return False
+            entry = {
+                'tx_id': tx_id,
+                'tx_hash': tx_hash,
+                'network': network,
+                'created_at': created_at,
+                'attempts': 0,
+                'checked_block': None
+            }
+            self.entries[tx_id] = entry
+            self._push(entry, now if now is not None else time.time())
+            return True
+
+    def remove(self, tx_id: int):
+        """Stop tracking a transaction"""
+        with self.lock:
+            entry = self.entries.pop(tx_id, None)
+            if entry:
+                self.parked.get(entry['network'], set()).discard(tx_id)
+
+    def scheduled_ids(self) -> set:
+        """Get ids of every tracked transaction"""
+        with self.lock:
+            return set(self.entries)
+
+    def pop_due(self, head_lookup: Optional[Callable[[str], Optional[int]]] = None,
+                now: Optional[float] = None) -> List[Dict]:
+        """Take every transaction whose check is due
+
+        A due transaction whose chain hasn't produced a block since its last check
+        can't have a new receipt, so it is parked until on_new_block re-arms it or,
+        if the chain stalls, until its drop deadline comes due and it is retired.
+        """
+        now = now if now is not None else time.time()
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                next_check, _, tx_id = heapq.heappop(self.heap)
+                entry = self.entries.get(tx_id)
+                if not entry or entry['next_check'] != next_check:
+                    continue
+
+                head = head_lookup(entry['network']) if head_lookup else None
+                expired = now - entry['created_at'] >= self.drop_timeout
+                if (not expired and entry['checked_block'] is not None
+                        and head is not None and head <= entry['checked_block']):
+                    self.parked.setdefault(entry['network'], set()).add(tx_id)
+                    # Still comes due at the drop deadline if no new block ever arrives
+                    self._push(entry, entry['created_at'] + self.drop_timeout)
+                    continue
+
+                entry['next_check'] = None
+                self.parked.get(entry['network'], set()).discard(tx_id)
+                due.append(dict(entry))
+        return due
+
+    def reschedule(self, tx_id: int, block_number: Optional[int] = None, now: Optional[float] = None) -> bool:
+        """Schedule the next check of a still-pending transaction with exponential backoff
+
+        Returns False (and stops tracking it) once the transaction has been
+        pending for longer than the drop timeout.
+        """
+        now = now if now is not None else time.time()
+        with self.lock:
+            entry = self.entries.get(tx_id)
+            if not entry:
+                return False
+            if now - entry['created_at'] >= self.drop_timeout:
+                del self.entries[tx_id]
+                return False
+
+            entry['attempts'] += 1
+            entry['checked_block'] = block_number
+            interval = min(self.max_interval, self.min_interval * 2 ** (entry['attempts'] - 1))
+            self._push(entry, now + interval)
+            return True
+
+    def on_new_block(self, network: str, block_number: int):
+        """Re-arm transactions parked waiting for a new block on this chain"""
+        now = time.time()
+        with self.lock:
+            for tx_id in self.parked.pop(network, set()):
+                entry = self.entries.get(tx_id)
+                if entry:
+                    self._push(entry, now)
+
+    def next_check_in(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the earliest scheduled check, None if nothing is scheduled"""
+        now = now if now is not None else time.time()
+        with self.lock:
+            while self.heap:
+                next_check, _, tx_id = self.heap[0]
+                entry = self.entries.get(tx_id)
+                if entry and entry['next_check'] == next_check:
+                    return max(0.0, next_check - now)
+                heapq.heappop(self.heap)
+        return None
+
+    def get_stats(self) -> Dict:
+        """Get scheduler size and configuration"""
+        with self.lock:
+            return {
+                'tracked': len(self.entries),
+                'parked': sum(len(tx_ids) for tx_ids in self.parked.values()),
+                'min_interval': self.min_interval,
+                'max_interval': self.max_interval,
+                'drop_timeout': self.drop_timeout
+            }
+
+
+# Global scheduler instance
+transaction_scheduler = None
+
+def get_transaction_scheduler():
+    """Get or create the pending transaction scheduler, re-armed by the chain-head tracker"""
+    global transaction_scheduler
+    if transaction_scheduler is None:
+        from src.services.blockchain import get_blockchain_service
+        transaction_scheduler = PendingTransactionScheduler(
+            min_interval=float(get_setting('TX_POLL_MIN_INTERVAL', 5)),
+            max_interval=float(get_setting('TX_POLL_MAX_INTERVAL', 600)),
+            drop_timeout=float(get_setting('TX_DROP_TIMEOUT', 86400))
+        )
+        get_blockchain_service().chain_head.add_listener(transaction_scheduler.on_new_block)
+    return transaction_scheduler
@@ -1,14 +1,21 @@
 import asyncio
 import json
 import logging
-from typing import Dict, Set, Optional
+from typing import Dict, Iterable, List, Set, Optional
 from flask import current_app, request
 from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
+from sqlalchemy import update
 from src.models.user import User, Wallet, Transaction, db
 from src.utils.security import JWTManager
-from src.services.blockchain import get_blockchain_service
+from src.services.blockchain import get_blockchain_service, get_price_service
+from src.services.async_blockchain import get_async_blockchain_service
+from src.services.tx_scheduler import get_transaction_scheduler
+from src.config import get_setting
+from src.utils.async_bridge import run_async
 from datetime import datetime, timedelta
+import calendar
 import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -88,6 +95,9 @@ class WebSocketManager:
                     # Remove session mapping
                     del self.user_sessions[session_id]
                     
+                    if price_ticker:
+                        price_ticker.remove_session(session_id)
+                    
                     # Leave user room
                     leave_room(f"user_{user_id}")
                     
@@ -145,22 +155,33 @@ class WebSocketManager:
         
         @self.socketio.on('get_live_price')
         def handle_get_live_price(data):
-            """Get live cryptocurrency prices"""
+            """Get the current price and keep receiving it from the price ticker"""
             try:
                 session_id = request.sid
                 if session_id not in self.user_sessions:
                     emit('error', {'message': 'Not authenticated'})
                     return
                 
-                symbol = data.get('symbol', 'ETH')
+                symbol = data.get('symbol', 'ethereum')
                 vs_currency = data.get('vs_currency', 'usd')
                 
-                # This would typically fetch from a price service
-                # For now, emit mock data
+                error = price_ticker.check_subscription(session_id, [symbol], vs_currency) if price_ticker else None
+                if error:
+                    emit('error', {'message': error})
+                    return
+                
+                result = run_async(get_price_service().get_price(symbol, vs_currency))
+                if not result['success']:
+                    emit('error', {'message': result['error']})
+                    return
+                
+                if price_ticker:
+                    join_room(price_ticker.subscribe(session_id, symbol, vs_currency))
+                
                 emit('live_price', {
                     'symbol': symbol,
-                    'price': 2500.00,  # Mock price
-                    'change_24h': 2.5,
+                    'price': result['price'],
+                    'change_24h': result['change_24h'],
                     'vs_currency': vs_currency,
                     'timestamp': datetime.utcnow().isoformat()
                 })
@@ -168,6 +189,58 @@ class WebSocketManager:
             except Exception as e:
                 logger.error(f"Live price error: {str(e)}")
                 emit('error', {'message': 'Failed to get live price'})
+        
+        @self.socketio.on('subscribe_prices')
+        def handle_subscribe_prices(data):
+            """Subscribe to price ticks for a list of symbols"""
+            try:
+                session_id = request.sid
+                if session_id not in self.user_sessions:
+                    emit('error', {'message': 'Not authenticated'})
+                    return
+                if not price_ticker:
+                    emit('error', {'message': 'Price ticker unavailable'})
+                    return
+                
+                symbols = data.get('symbols', [])
+                vs_currency = data.get('vs_currency', 'usd')
+                
+                error = price_ticker.check_subscription(session_id, symbols, vs_currency)
+                if error:
+                    emit('error', {'message': error})
+                    return
+                
+                for symbol in symbols:
+                    join_room(price_ticker.subscribe(session_id, symbol, vs_currency))
+                    # Send the last tick right away so new subscribers don't wait a full interval
+                    tick = price_ticker.get_last_tick(symbol, vs_currency)
+                    if tick:
+                        emit('price_update', tick)
+                
+                emit('subscription_confirmed', {
+                    'type': 'prices',
+                    'symbols': symbols,
+                    'vs_currency': vs_currency
+                })
+                
+            except Exception as e:
+                logger.error(f"Price subscription error: {str(e)}")
+                emit('error', {'message': 'Subscription failed'})
+        
+        @self.socketio.on('unsubscribe_prices')
+        def handle_unsubscribe_prices(data):
+            """Stop receiving price ticks for a list of symbols"""
+            try:
+                session_id = request.sid
+                if session_id not in self.user_sessions or not price_ticker:
+                    return
+                
+                vs_currency = data.get('vs_currency', 'usd')
+                for symbol in data.get('symbols', []):
+                    leave_room(price_ticker.unsubscribe(session_id, symbol, vs_currency))
+                
+            except Exception as e:
+                logger.error(f"Price unsubscription error: {str(e)}")
     
     def broadcast_balance_update(self, user_id: str, network: str, balance: str):
         """Broadcast balance update to user"""
@@ -183,6 +256,21 @@ class WebSocketManager:
         except Exception as e:
             logger.error(f"Failed to broadcast balance update: {str(e)}")
     
+    def broadcast_token_balance_update(self, user_id: str, network: str, token: str, balance: str):
+        """Broadcast ERC20 token balance update to user"""
+        try:
+            self.socketio.emit('token_balance_update', {
+                'network': network,
+                'token': token,
+                'balance': balance,
+                'timestamp': datetime.utcnow().isoformat()
+            }, room=f"balance_{network}_{user_id}")
+            
+            logger.info(f"Token balance update sent to user {user_id} for {network} {token}: {balance}")
+            
+        except Exception as e:
+            logger.error(f"Failed to broadcast token balance update: {str(e)}")
+    
     def broadcast_transaction_update(self, user_id: str, transaction_data: dict):
         """Broadcast transaction status update to user"""
         try:
@@ -223,7 +311,11 @@ class TransactionMonitor:
     def __init__(self, websocket_manager: WebSocketManager):
         self.websocket_manager = websocket_manager
         self.blockchain_service = get_blockchain_service()
+        self.scheduler = get_transaction_scheduler()
         self.monitoring = False
+        self.tick_interval = float(get_setting('TX_SCHEDULER_TICK', 2))
+        self.sync_interval = float(get_setting('TX_SCHEDULER_SYNC_INTERVAL', 15))
+        self.last_sync = 0
     
     async def start_monitoring(self):
         """Start monitoring pending transactions"""
@@ -233,7 +325,8 @@ class TransactionMonitor:
         while self.monitoring:
             try:
                 await self._check_pending_transactions()
-                await asyncio.sleep(30)  # Check every 30 seconds
+                # Only transactions whose scheduled check is due are looked up each tick
+                await asyncio.sleep(self.tick_interval)
                 
             except Exception as e:
                 logger.error(f"Transaction monitoring error: {str(e)}")
@@ -251,45 +344,94 @@ class TransactionMonitor:
         except Exception as e:
             logger.error(f"Error checking pending transactions: {str(e)}")
 
+    def _sync_scheduler(self):
+        """Schedule newly pending transactions and forget ones settled elsewhere"""
+        pending = Transaction.query.with_entities(
+            Transaction.id, Transaction.transaction_hash, Transaction.network, Transaction.created_at
+        ).filter(
+            Transaction.status == 'pending',
+            Transaction.transaction_hash.isnot(None)
+        ).all()
+        
+        pending_ids = set()
+        for tx_id, tx_hash, network, created_at in pending:
+            pending_ids.add(tx_id)
+            created_ts = calendar.timegm(created_at.utctimetuple()) if created_at else time.time()
+            self.scheduler.add(tx_id, tx_hash, network, created_ts)
+        
+        for tx_id in self.scheduler.scheduled_ids() - pending_ids:
+            self.scheduler.remove(tx_id)
+
     async def _check_pending_transactions_with_context(self):
-        """Check status of pending transactions with proper context"""
+        """Reconcile due pending transactions with batched receipt lookups and one bulk update"""
         from flask import current_app
         try:
             with current_app.app_context():
-                # Get all pending transactions
-                pending_txs = Transaction.query.filter_by(status='pending').all()
+                if time.time() - self.last_sync >= self.sync_interval:
+                    self._sync_scheduler()
+                    self.last_sync = time.time()
             
-            for tx in pending_txs:
-                if not tx.transaction_hash:
-                    continue
-                
-                # Check transaction status on blockchain
-                status_result = self.blockchain_service.get_transaction_status(
-                    tx.transaction_hash, tx.network
-                )
-                
+            chain_head = self.blockchain_service.chain_head
+            due = self.scheduler.pop_due(chain_head.get_cached_block_number)
+            if not due:
+                return
+            
+            # Heads before the check; a pending transaction is parked until they advance
+            heads = {entry['network']: chain_head.get_cached_block_number(entry['network']) for entry in due}
+            
+            # Receipts are fetched in JSON-RPC batches grouped by network
+            async_service = get_async_blockchain_service()
+            status_results = await async_service.get_transaction_statuses(
+                [(entry['tx_hash'], entry['network']) for entry in due]
+            )
+            
+            changes_by_id = {}
+            now = datetime.utcnow()
+            for entry, status_result in zip(due, status_results):
                 if status_result['success'] and status_result['status'] != 'pending':
-                    # Update transaction status
-                    old_status = tx.status
-                    tx.status = status_result['status']
-                    
+                    changes = {'status': status_result['status']}
                     if 'block_number' in status_result:
-                        tx.block_number = status_result['block_number']
-                    
-                    if tx.status == 'confirmed':
-                        tx.confirmed_at = datetime.utcnow()
-                    
-                    db.session.commit()
-                    
-                    # Broadcast update to user
-                    self.websocket_manager.broadcast_transaction_update(
-                        str(tx.user_id),
-                        tx.to_dict()
-                    )
-                    
-                    logger.info(f"Transaction {tx.id} status updated: {old_status} -> {tx.status}")
+                        changes['block_number'] = status_result['block_number']
+                    if status_result.get('gas_used') is not None:
+                        changes['gas_used'] = status_result['gas_used']
+                    if changes['status'] == 'confirmed':
+                        changes['confirmed_at'] = now
+                    self.scheduler.remove(entry['tx_id'])
+                    changes_by_id[entry['tx_id']] = changes
+                elif not self.scheduler.reschedule(entry['tx_id'], heads.get(entry['network'])):
+                    # Pending past the drop timeout: retire it
+                    changes_by_id[entry['tx_id']] = {'status': 'dropped'}
+            
+            if not changes_by_id:
+                return
+            
+            with current_app.app_context():
+                # Build payloads before the bulk update, which doesn't refresh loaded objects
+                notifications = []
+                for tx in Transaction.query.filter(Transaction.id.in_(list(changes_by_id))).all():
+                    if changes_by_id[tx.id]['status'] == 'dropped' and tx.transaction_type == 'send':
+                        # The dropped tx's nonce was never mined; later sends must not queue behind the gap
+                        self.blockchain_service.nonce_manager.resync(tx.network, tx.from_address)
+                    tx_data = tx.to_dict()
+                    tx_data.update(changes_by_id[tx.id])
+                    if 'confirmed_at' in changes_by_id[tx.id]:
+                        tx_data['confirmed_at'] = now.isoformat()
+                    notifications.append((tx.user_id, tx_data))
+                
+                # One executemany UPDATE keyed by primary key for every changed transaction
+                db.session.execute(update(Transaction), [
+                    {'id': tx_id, **changes} for tx_id, changes in changes_by_id.items()
+                ])
+                db.session.commit()
+            
+            for user_id, tx_data in notifications:
+                # Broadcast update to user
+                self.websocket_manager.broadcast_transaction_update(str(user_id), tx_data)
+            
+            logger.info(f"Reconciled {len(changes_by_id)} of {len(due)} due pending transactions")
                     
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error checking pending transactions: {str(e)}")
 
 class BalanceMonitor:
@@ -300,6 +442,7 @@ class BalanceMonitor:
         self.blockchain_service = get_blockchain_service()
         self.monitoring = False
         self.last_balances = {}
+        self.last_token_balances = {}
     
     async def start_monitoring(self):
         """Start monitoring wallet balances"""
@@ -335,13 +478,19 @@ class BalanceMonitor:
                 # Get all active wallets
                 wallets = Wallet.query.filter_by(is_active=True).all()
             
+            # Group addresses per network so balances can be fetched in batches
+            addresses_by_network = {}
             for wallet in wallets:
-                # Get current balance from blockchain
-                balance_result = self.blockchain_service.get_balance(
-                    wallet.address, wallet.network
-                )
+                addresses_by_network.setdefault(wallet.network, []).append(wallet.address)
+            
+            async_service = get_async_blockchain_service()
+            balance_results = await async_service.get_balances(addresses_by_network)
+            
+            changed_wallets = []
+            for wallet in wallets:
+                balance_result = balance_results.get(wallet.network, {}).get(wallet.address)
                 
-                if balance_result['success']:
+                if balance_result and balance_result['success']:
                     new_balance = balance_result['balance']
                     wallet_key = f"{wallet.user_id}_{wallet.network}"
                     
@@ -350,39 +499,246 @@ class BalanceMonitor:
                         self.last_balances[wallet_key] != new_balance):
                         
                         # Update wallet balance
-                        old_balance = wallet.balance
+                        changed_wallets.append((wallet, wallet.balance, new_balance))
                         wallet.balance = new_balance
-                        db.session.commit()
                         
                         # Store new balance
                         self.last_balances[wallet_key] = new_balance
-                        
-                        # Broadcast update to user if connected
-                        if self.websocket_manager.is_user_connected(str(wallet.user_id)):
-                            self.websocket_manager.broadcast_balance_update(
-                                str(wallet.user_id),
-                                wallet.network,
-                                new_balance
-                            )
-                            
-                            logger.info(f"Balance update for user {wallet.user_id} {wallet.network}: {old_balance} -> {new_balance}")
+            
+            if changed_wallets:
+                db.session.commit()
+            
+            for wallet, old_balance, new_balance in changed_wallets:
+                # Broadcast update to user if connected
+                if self.websocket_manager.is_user_connected(str(wallet.user_id)):
+                    self.websocket_manager.broadcast_balance_update(
+                        str(wallet.user_id),
+                        wallet.network,
+                        new_balance
+                    )
+                    
+                    logger.info(f"Balance update for user {wallet.user_id} {wallet.network}: {old_balance} -> {new_balance}")
+            
+            await self._check_token_balances(wallets)
                     
         except Exception as e:
             logger.error(f"Error checking wallet balances: {str(e)}")
 
+    async def _check_token_balances(self, wallets):
+        """Sweep ERC20 balances for every wallet with one multicall per network"""
+        contracts = self.blockchain_service.get_token_contracts()
+        
+        pairs_by_network = {}
+        wallets_by_address = {}
+        for wallet in wallets:
+            for token_symbol in contracts.get(wallet.network, {}):
+                pairs_by_network.setdefault(wallet.network, []).append((wallet.address, token_symbol))
+            wallets_by_address[(wallet.network, wallet.address)] = wallet
+        
+        if not pairs_by_network:
+            return
+        
+        loop = asyncio.get_running_loop()
+        token_results = await loop.run_in_executor(
+            None, self.blockchain_service.get_token_balances, pairs_by_network
+        )
+        
+        for network, network_results in token_results.items():
+            for (address, token_symbol), result in network_results.items():
+                if not result['success']:
+                    continue
+                
+                wallet = wallets_by_address[(network, address)]
+                token_key = f"{wallet.user_id}_{network}_{token_symbol}"
+                new_balance = result['balance']
+                
+                if self.last_token_balances.get(token_key) != new_balance:
+                    self.last_token_balances[token_key] = new_balance
+                    
+                    if self.websocket_manager.is_user_connected(str(wallet.user_id)):
+                        self.websocket_manager.broadcast_token_balance_update(
+                            str(wallet.user_id),
+                            network,
+                            token_symbol,
+                            new_balance
+                        )
+
+class PriceTicker:
+    """Polls prices for the union of subscribed symbols and pushes moves to per-symbol rooms"""
+
+    def __init__(self, websocket_manager: WebSocketManager, poll_interval: float = 5, min_change: float = 0.0005,
+                 supported_symbols: Iterable[str] = ('bitcoin', 'ethereum', 'matic-network', 'binancecoin', 'tether', 'usd-coin'),
+                 max_symbols: int = 20):
+        self.websocket_manager = websocket_manager
+        self.price_service = get_price_service()
+        self.poll_interval = poll_interval
+        self.min_change = min_change  # Relative move required before a tick is pushed
+        self.supported_symbols = {symbol.strip().lower() for symbol in supported_symbols if symbol.strip()}
+        self.max_symbols = max_symbols  # Subscriptions allowed per session
+        self.subscriptions: Dict[tuple, Set[str]] = {}  # (symbol, vs_currency) -> session_ids
+        self.session_keys: Dict[str, Set[tuple]] = {}  # session_id -> (symbol, vs_currency) keys
+        self.last_ticks: Dict[tuple, Dict] = {}
+        self.lock = threading.Lock()
+        self.ticking = False
+        self.stats = {'polls': 0, 'ticks': 0, 'suppressed': 0}
+
+    @staticmethod
+    def room(symbol: str, vs_currency: str) -> str:
+        return f"price_{symbol}_{vs_currency}"
+
+    def check_subscription(self, session_id: str, symbols, vs_currency) -> Optional[str]:
+        """Get why a session can't subscribe to these symbols, None if it can
+
+        Every subscribed symbol joins the poll, so only supported coin ids are
+        accepted and each session is capped at max_symbols subscriptions.
+        """
+        if not isinstance(symbols, list) or not all(isinstance(symbol, str) for symbol in symbols):
+            return 'symbols must be a list of coin ids'
+        if not isinstance(vs_currency, str) or not vs_currency:
+            return 'vs_currency must be a currency code'
+        if len(symbols) > self.max_symbols:
+            return f'At most {self.max_symbols} symbols can be subscribed'
+
+        unsupported = [symbol for symbol in symbols if symbol.lower() not in self.supported_symbols]
+        if unsupported:
+            return f'Unsupported symbol: {unsupported[0][:50]}'
+
+        keys = {(symbol.lower(), vs_currency.lower()) for symbol in symbols}
+        with self.lock:
+            keys |= self.session_keys.get(session_id, set())
+        if len(keys) > self.max_symbols:
+            return f'At most {self.max_symbols} symbols can be subscribed'
+        return None
+
+    def subscribe(self, session_id: str, symbol: str, vs_currency: str = 'usd') -> str:
+        """Add a session to a symbol's ticks; returns the room to join"""
+        key = (symbol.lower(), vs_currency.lower())
+        with self.lock:
+            self.subscriptions.setdefault(key, set()).add(session_id)
+            self.session_keys.setdefault(session_id, set()).add(key)
+        return self.room(*key)
+
+    def unsubscribe(self, session_id: str, symbol: str, vs_currency: str = 'usd') -> str:
+        """Remove a session from a symbol's ticks; returns the room to leave"""
+        key = (symbol.lower(), vs_currency.lower())
+        with self.lock:
+            self._discard(session_id, key)
+            self.session_keys.get(session_id, set()).discard(key)
+        return self.room(*key)
+
+    def remove_session(self, session_id: str):
+        """Drop every subscription of a disconnected session"""
+        with self.lock:
+            for key in self.session_keys.pop(session_id, set()):
+                self._discard(session_id, key)
+
+    def _discard(self, session_id: str, key: tuple):
+        sessions = self.subscriptions.get(key)
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                # Nobody is watching, so the symbol leaves the next poll
+                del self.subscriptions[key]
+                self.last_ticks.pop(key, None)
+
+    def get_last_tick(self, symbol: str, vs_currency: str = 'usd') -> Optional[Dict]:
+        return self.last_ticks.get((symbol.lower(), vs_currency.lower()))
+
+    async def start_ticking(self):
+        """Start pushing price ticks"""
+        self.ticking = True
+        logger.info("Price ticker started")
+
+        while self.ticking:
+            try:
+                await self.tick_once()
+                await asyncio.sleep(self.poll_interval)
+
+            except Exception as e:
+                logger.error(f"Price ticker error: {str(e)}")
+                await asyncio.sleep(30)  # Wait longer on error
+
+    def stop_ticking(self):
+        """Stop pushing price ticks"""
+        self.ticking = False
+        logger.info("Price ticker stopped")
+
+    async def tick_once(self) -> List[Dict]:
+        """Fetch every subscribed price in one batch and emit the ones that moved"""
+        with self.lock:
+            keys = list(self.subscriptions)
+        if not keys:
+            return []
+
+        symbols = list(dict.fromkeys(symbol for symbol, _ in keys))
+        vs_currencies = list(dict.fromkeys(vs_currency for _, vs_currency in keys))
+        results = await self.price_service.get_prices(symbols, vs_currencies)
+        self.stats['polls'] += 1
+
+        ticks = []
+        for key in keys:
+            result = results.get(key[0], {}).get(key[1])
+            if not result or not result['success']:
+                continue
+
+            last = self.last_ticks.get(key)
+            if last and not self._moved(last['price'], result['price']):
+                self.stats['suppressed'] += 1
+                continue
+
+            tick = {
+                'symbol': key[0],
+                'vs_currency': key[1],
+                'price': result['price'],
+                'previous_price': last['price'] if last else None,
+                'change_24h': result.get('change_24h'),
+                'timestamp': datetime.utcnow().isoformat()
+            }
+            with self.lock:
+                if key not in self.subscriptions:
+                    continue
+                self.last_ticks[key] = tick
+            ticks.append(tick)
+            self.websocket_manager.socketio.emit('price_update', tick, room=self.room(*key))
+
+        self.stats['ticks'] += len(ticks)
+        return ticks
+
+    def _moved(self, previous: float, price: float) -> bool:
+        if not previous:
+            return price != previous
+        return abs(price - previous) / abs(previous) >= self.min_change
+
+    def get_stats(self) -> Dict:
+        """Get subscription counts and tick counters"""
+        with self.lock:
+            return {
+                'symbols': len(self.subscriptions),
+                'subscribers': sum(len(sessions) for sessions in self.subscriptions.values()),
+                **self.stats
+            }
+
 # Global instances
 websocket_manager = None
 transaction_monitor = None
 balance_monitor = None
+price_ticker = None
 
 def init_websocket(app, socketio):
     """Initialize WebSocket services"""
-    global websocket_manager, transaction_monitor, balance_monitor
+    global websocket_manager, transaction_monitor, balance_monitor, price_ticker
 
     with app.app_context():
         websocket_manager = WebSocketManager(socketio)
         transaction_monitor = TransactionMonitor(websocket_manager)
         balance_monitor = BalanceMonitor(websocket_manager)
+        price_ticker = PriceTicker(
+            websocket_manager,
+            poll_interval=float(get_setting('PRICE_TICKER_INTERVAL', 5)),
+            min_change=float(get_setting('PRICE_TICKER_MIN_CHANGE', 0.0005)),
+            supported_symbols=str(get_setting('PRICE_TICKER_SYMBOLS', 'bitcoin,ethereum,matic-network,binancecoin,tether,usd-coin')).split(','),
+            max_symbols=int(get_setting('PRICE_TICKER_MAX_SYMBOLS', 20))
+        )
 
         logger.info("WebSocket services initialized")
 
@@ -397,3 +753,7 @@ def get_transaction_monitor():
 def get_balance_monitor():
     """Get balance monitor instance"""
     return balance_monitor
+
+def get_price_ticker():
+    """Get price ticker instance"""
+    return price_ticker
@@ -0,0 +1,95 @@
+"""
+Sync-to-async bridge
+Runs one long-lived asyncio loop in a daemon thread so synchronous Flask
+handlers can call async services without creating a loop per request, and
+loop-bound resources (HTTP pools, async Web3 sessions, caches) survive
+between requests
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Optional
+
+from src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBridge:
+    """Background event loop that runs coroutines submitted from other threads"""
+
+    def __init__(self, default_timeout: float = 30):
+        self.default_timeout = default_timeout
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the loop thread once"""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return self.loop
+
+            ready = threading.Event()
+
+            def run_loop():
+                self.loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self.loop)
+                ready.set()
+                self.loop.run_forever()
+
+            self.thread = threading.Thread(target=run_loop, name='async-bridge', daemon=True)
+            self.thread.start()
+            ready.wait()
+            logger.info("Async bridge event loop started")
+            return self.loop
+
+    def submit(self, coro: Awaitable) -> Future:
+        """Schedule a coroutine on the bridge loop and return a concurrent future
+
+        The task inherits the caller's context variables, so the Flask app and
+        request contexts of the calling handler stay available to it.
+        """
+        loop = self._ensure_loop()
+        if threading.current_thread() is self.thread:
+            # Blocking here would deadlock the loop the coroutine needs
+            coro.close()
+            raise RuntimeError("Bridge calls can't be made from the bridge loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the bridge loop and wait for its result
+
+        Raises TimeoutError, after cancelling the coroutine, if it doesn't
+        finish within timeout seconds.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout if timeout is not None else self.default_timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        """Stop the bridge loop"""
+        with self.lock:
+            if self.loop and self.thread and self.thread.is_alive():
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=5)
+            self.thread = None
+
+
+# Global bridge instance
+async_bridge = None
+
+def get_async_bridge():
+    """Get or create the shared async bridge"""
+    global async_bridge
+    if async_bridge is None:
+        async_bridge = AsyncBridge(default_timeout=float(get_setting('ASYNC_BRIDGE_TIMEOUT', 30)))
+    return async_bridge
+
+def run_async(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine from synchronous code on the shared bridge loop"""
+    return get_async_bridge().run(coro, timeout)
@@ -0,0 +1,191 @@
+"""
+Shared outbound HTTP client
+One managed layer for calls to third-party APIs: pooled keep-alive connections
+per host (one async pool per event loop plus one for blocking callers), HTTP/2
+when available, per-integration timeouts and retry policies, and metrics
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+import httpx
+
+from src.config import get_setting
+
+# httpx only negotiates HTTP/2 when the h2 package is installed
+try:
+    import h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Per-integration timeouts (seconds) and retries. Retries only apply to idempotent
+# methods, so KYC submissions are never sent twice.
+INTEGRATIONS = {
+    'coingecko': {'timeout': 10.0, 'retries': 2},
+    'explorer': {'timeout': 30.0, 'retries': 2},
+    'kyc': {'timeout': 30.0, 'retries': 0},
+    'supabase': {'timeout': 5.0, 'retries': 1},
+    'default': {'timeout': 15.0, 'retries': 1}
+}
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+
+class HTTPMetrics:
+    """Request counts, retries, errors and latency per integration"""
+
+    def __init__(self):
+        self.integrations: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    def _entry(self, integration: str) -> Dict:
+        if integration not in self.integrations:
+            self.integrations[integration] = {
+                'requests': 0, 'retries': 0, 'errors': 0, 'statuses': {}, 'total_latency': 0.0, 'max_latency': 0.0
+            }
+        return self.integrations[integration]
+
+    def record(self, integration: str, latency: float, status_code: Optional[int] = None):
+        with self.lock:
+            entry = self._entry(integration)
+            entry['requests'] += 1
+            entry['total_latency'] += latency
+            entry['max_latency'] = max(entry['max_latency'], latency)
+            if status_code is None:
+                entry['errors'] += 1
+            else:
+                entry['statuses'][status_code] = entry['statuses'].get(status_code, 0) + 1
+
+    def record_retry(self, integration: str):
+        with self.lock:
+            self._entry(integration)['retries'] += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                integration: {
+                    'requests': entry['requests'],
+                    'retries': entry['retries'],
+                    'errors': entry['errors'],
+                    'statuses': dict(entry['statuses']),
+                    'avg_latency': round(entry['total_latency'] / entry['requests'], 4) if entry['requests'] else None,
+                    'max_latency': round(entry['max_latency'], 4)
+                }
+                for integration, entry in self.integrations.items()
+            }
+
+
+class OutboundHTTPClient:
+    """Pooled HTTP clients shared by every outbound integration"""
+
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20, keepalive_expiry: float = 30,
+                 retry_backoff: float = 0.5):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.retry_backoff = retry_backoff
+        self.metrics = HTTPMetrics()
+        # httpx async pools are bound to the loop they were created on
+        self.async_clients = weakref.WeakKeyDictionary()
+        self.sync_client = None
+        self.lock = threading.Lock()
+
+    def _client_kwargs(self) -> Dict:
+        return {'limits': self.limits, 'http2': HTTP2_AVAILABLE, 'timeout': INTEGRATIONS['default']['timeout']}
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        """Get the connection pool of the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = self.async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**self._client_kwargs())
+            self.async_clients[loop] = client
+        return client
+
+    def get_sync_client(self) -> httpx.Client:
+        """Get the connection pool for blocking callers"""
+        with self.lock:
+            if self.sync_client is None or self.sync_client.is_closed:
+                self.sync_client = httpx.Client(**self._client_kwargs())
+            return self.sync_client
+
+    def _policy(self, integration: str, method: str, timeout: Optional[float]):
+        policy = INTEGRATIONS.get(integration, INTEGRATIONS['default'])
+        retries = policy['retries'] if method.upper() in IDEMPOTENT_METHODS else 0
+        return (timeout if timeout is not None else policy['timeout']), retries
+
+    async def request(self, integration: str, method: str, url: str, timeout: Optional[float] = None,
+                      **kwargs) -> httpx.Response:
+        """Send a request for an integration, retrying transient failures per its policy"""
+        timeout, retries = self._policy(integration, method, timeout)
+        client = self.get_async_client()
+
+        for attempt in range(retries + 1):
+            start_time = time.time()
+            try:
+                response = await client.request(method, url, timeout=timeout, **kwargs)
+            except httpx.TransportError:
+                self.metrics.record(integration, time.time() - start_time)
+                if attempt == retries:
+                    raise
+            else:
+                self.metrics.record(integration, time.time() - start_time, response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                    return response
+            self.metrics.record_retry(integration)
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    def request_sync(self, integration: str, method: str, url: str, timeout: Optional[float] = None,
+                     **kwargs) -> httpx.Response:
+        """Blocking twin of request for synchronous callers"""
+        timeout, retries = self._policy(integration, method, timeout)
+        client = self.get_sync_client()
+
+        for attempt in range(retries + 1):
+            start_time = time.time()
+            try:
+                response = client.request(method, url, timeout=timeout, **kwargs)
+            except httpx.TransportError:
+                self.metrics.record(integration, time.time() - start_time)
+                if attempt == retries:
+                    raise
+            else:
+                self.metrics.record(integration, time.time() - start_time, response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                    return response
+            self.metrics.record_retry(integration)
+            time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def get_stats(self) -> Dict:
+        """Get pool configuration and per-integration metrics"""
+        return {
+            'http2': HTTP2_AVAILABLE,
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+            'event_loop_pools': len(self.async_clients),
+            'integrations': self.metrics.get_stats()
+        }
+
+
+# Global client instance
+http_client = None
+
+def get_http_client():
+    """Get or create the shared outbound HTTP client"""
+    global http_client
+    if http_client is None:
+        http_client = OutboundHTTPClient(
+            max_connections=int(get_setting('HTTP_MAX_CONNECTIONS', 100)),
+            max_keepalive=int(get_setting('HTTP_MAX_KEEPALIVE', 20)),
+            keepalive_expiry=float(get_setting('HTTP_KEEPALIVE_EXPIRY', 30))
+        )
+    return http_client
@@ -197,5 +197,69 @@ class TestQRCodeAPI:
         assert 'address_type' in data
 
 
+def make_auth_header(sub, email):
+    """Build a bearer header with an unsigned development JWT"""
+    import base64
+    payload = base64.urlsafe_b64encode(json.dumps({'sub': sub, 'email': email}).encode()).decode().rstrip('=')
+    return {'Authorization': f'Bearer e30.{payload}.sig'}
+
+
+class TestPortfolioAPI:
+    """Test the portfolio snapshot endpoint"""
+
+    def test_portfolio_requires_auth(self, client):
+        """Test that the route is registered rather than served by the SPA catch-all"""
+        response = client.get('/api/wallet/portfolio')
+
+        assert response.status_code == 401
+        assert response.is_json
+
+    def test_portfolio_snapshot(self, client, test_user):
+        """Test a snapshot through the registered wallet blueprint"""
+        response = client.get('/api/wallet/portfolio?vs_currencies=usd&vs_currencies=eur',
+                              headers=make_auth_header('auth0|portfolio', 'test@example.com'))
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['success'] is True
+        assert data['wallets'] == []
+        assert set(data['valuation']['totals']) == {'usd', 'eur'}
+
+
+class TestSyncTransactionsAPI:
+    """Test queued explorer syncs"""
+
+    def test_backfill_is_queued(self, client, test_user):
+        """Test that ?backfill=true queues a backfill-priority sync"""
+        wallet = Wallet(user_id=test_user.id, network='ethereum', address='0x' + 'ab' * 20, encrypted_private_key='x')
+        db.session.add(wallet)
+        db.session.commit()
+
+        response = client.post('/api/wallet/sync-transactions/ethereum?backfill=true',
+                               headers=make_auth_header('auth0|sync', 'test@example.com'))
+
+        assert response.status_code == 202
+        data = json.loads(response.data)
+        assert data['queued'] is True
+        assert data['backfill_requested'] is True
+        assert wallet.sync_state.backfill_requested is True
+
+
+class TestPriceAPI:
+    """Test price endpoints"""
+
+    @pytest.mark.parametrize('vs_currencies', [[], 'usd', ['usd', 5], ['']])
+    def test_portfolio_value_rejects_invalid_currencies(self, client, vs_currencies):
+        """Test that vs_currencies must be a non-empty list of strings"""
+        response = client.post('/api/portfolio-value', json={
+            'holdings': {'ETH': 1},
+            'vs_currencies': vs_currencies
+        })
+
+        assert response.status_code == 400
+        data = json.loads(response.data)
+        assert data['success'] is False
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,1659 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+import requests
+from web3 import Web3
+from src.services.rpc_pool import EndpointRouter, HedgePolicy, PooledHTTPProvider, ProviderRegistry
+from src.services.token_registry import TokenRegistry
+from src.services.multicall import MULTICALL3_ADDRESS, TokenBalanceAggregator
+from src.services.gas_oracle import compute_fee_tiers
+from src.services.nonce_manager import InMemoryNonceManager, RedisNonceManager
+from src.services.async_blockchain import AsyncBlockchainService, PooledAsyncHTTPProvider
+from src.services.chain_head import ChainHeadTracker
+from src.services.tx_scheduler import PendingTransactionScheduler
+from src.services.monitor import IncomingTransactionScanner, WalletAddressIndex
+from src.services.transaction_monitor import TransactionMonitor
+from src.services.explorer_sync import ExplorerSyncScheduler, InMemoryTokenBucket, mark_wallet_requested
+from src.services.token_indexer import BlockRangeChunker, TokenTransferIndexer, TRANSFER_TOPIC, is_range_limit_error
+from src.utils.bloom_filter import BloomFilter
+from src.utils.http_client import OutboundHTTPClient
+from src.utils.async_bridge import AsyncBridge
+from src.services.blockchain import PriceService, chunk_price_ids
+from src.services.price_cache import PriceCache
+from src.services.price_history import PriceHistoryStore, compute_ohlc, resolve_history_dir
+from src.services.portfolio import PortfolioSnapshotService, PortfolioValuationEngine, value_holdings
+from src.services.websocket import PriceTicker
+
+
+class TestProviderRegistry:
+    """Test pooled Web3 provider registry"""
+
+    def test_unreachable_rpc_is_marked_unhealthy(self):
+        """Test that an unreachable RPC shows as unhealthy but keeps its provider"""
+        registry = ProviderRegistry(pool_size=2, timeout=0.5, health_check_interval=3600)
+
+        # Backoff only reorders endpoints; calls still go to the soonest-recovering one
+        assert registry.get_web3('ethereum', 'http://127.0.0.1:9') is not None
+        assert registry.get_health('ethereum') is False
+
+        stats = registry.get_stats()
+        assert stats['networks']['ethereum']['healthy'] is False
+        assert stats['networks']['ethereum']['rpc_errors'] >= 1
+        registry.stop()
+
+    def test_call_failure_does_not_change_health(self):
+        """Test that a failed call on a single endpoint neither hides the network nor marks it unhealthy"""
+        registry = ProviderRegistry(pool_size=2, timeout=0.5, health_check_interval=3600)
+        entry = registry._get_or_create_entry('ethereum', 'http://a')
+        entry['healthy'], entry['last_check'] = True, datetime.utcnow()
+
+        entry['router'].record_failure(entry['router'].endpoints[0], ValueError('timeout'))
+
+        assert registry.get_web3('ethereum', 'http://a') is entry['web3']
+        assert registry.get_health('ethereum') is True
+        assert [e.url for e in entry['router'].ranked_endpoints()] == ['http://a']
+        registry.stop()
+
+    def test_provider_is_reused(self):
+        """Test that the same provider entry is reused for the same RPC URL"""
+        registry = ProviderRegistry(pool_size=2, timeout=0.5, health_check_interval=3600)
+
+        first = registry._get_or_create_entry('polygon', 'http://127.0.0.1:9')
+        second = registry._get_or_create_entry('polygon', 'http://127.0.0.1:9')
+        assert first is second
+
+        third = registry._get_or_create_entry('polygon', 'http://127.0.0.1:10')
+        assert third is not first
+        registry.stop()
+
+
+class TestEndpointRouter:
+    """Test latency-scored RPC endpoint routing"""
+
+    def test_fastest_endpoint_is_preferred(self):
+        """Test that endpoints are ranked by their moving latency average"""
+        router = EndpointRouter(['http://a', 'http://b', 'http://c'])
+        slow, fast, unmeasured = router.endpoints
+
+        router.record_success(slow, 0.8)
+        router.record_success(fast, 0.1)
+
+        assert [e.url for e in router.ranked_endpoints()] == ['http://c', 'http://b', 'http://a']
+
+        router.record_success(unmeasured, 0.5)
+        assert router.ranked_endpoints()[0] is fast
+
+    def test_failing_endpoint_backs_off(self):
+        """Test that a failing endpoint leaves rotation until its backoff expires"""
+        router = EndpointRouter(['http://a', 'http://b'], base_backoff=60)
+        first, second = router.endpoints
+
+        router.record_failure(first, ValueError('timeout'))
+        router.record_failure(first, ValueError('timeout'))
+
+        assert router.ranked_endpoints() == [second]
+        assert first.backoff_until - second.backoff_until > 100  # 60s then 120s
+
+        router.record_failure(second, ValueError('timeout'))
+        assert not router.has_available()
+        assert router.ranked_endpoints() == [second]  # Soonest to recover
+
+    def test_provider_fails_over_to_next_endpoint(self):
+        """Test that a transport error on one endpoint retries on the next"""
+        router = EndpointRouter(['http://down', 'http://up'])
+        router.record_success(router.endpoints[0], 0.01)
+        router.record_success(router.endpoints[1], 0.5)
+        posted = []
+
+        def post(url, **kwargs):
+            posted.append(url)
+            if url == 'http://down':
+                raise requests.ConnectionError('refused')
+            return SimpleNamespace(raise_for_status=lambda: None, content=b'{"jsonrpc":"2.0","id":0,"result":"0x10"}')
+
+        provider = PooledHTTPProvider(router, SimpleNamespace(post=post), timeout=1)
+        response = provider.make_request('eth_blockNumber', [])
+
+        assert response['result'] == '0x10'
+        assert posted == ['http://down', 'http://up']
+        assert router.get_stats()[0]['available'] is False
+
+
+class TestHedgePolicy:
+    """Test hedged read requests"""
+
+    def test_slow_primary_is_hedged(self):
+        """Test that a read slower than the primary's usual latency is answered by the backup"""
+        router = EndpointRouter(['http://slow', 'http://fast'])
+        for _ in range(20):
+            router.record_success(router.endpoints[0], 0.01)
+        router.record_success(router.endpoints[1], 0.05)
+
+        def post(url, **kwargs):
+            if url == 'http://slow':
+                time.sleep(0.5)
+            body = b'{"jsonrpc":"2.0","id":0,"result":"%s"}' % url[7:].encode()
+            return SimpleNamespace(raise_for_status=lambda: None, content=body)
+
+        policy = HedgePolicy(enabled=True, percentile=90)
+        provider = PooledHTTPProvider(router, SimpleNamespace(post=post), timeout=1, hedge_policy=policy)
+
+        assert provider.make_request('eth_getBalance', ['0x0', 'latest'])['result'] == 'fast'
+        assert policy.get_stats()['hedges_won'] == 1
+
+    def test_hedges_are_capped_by_budget(self):
+        """Test that hedges stay under the configured share of calls"""
+        policy = HedgePolicy(enabled=True, max_ratio=0.25, burst=1)
+        policy.tokens = 0
+
+        hedges = 0
+        for _ in range(100):
+            assert policy.should_hedge('eth_getTransactionReceipt')
+            hedges += policy.try_acquire()
+
+        assert hedges == 25
+        assert not policy.should_hedge('eth_sendRawTransaction')
+
+
+class TestTokenRegistry:
+    """Test token registry caching"""
+
+    def test_decimals_are_fetched_once(self):
+        """Test that decimals are cached after the first RPC call"""
+        registry = TokenRegistry()
+        calls = []
+        contract = SimpleNamespace(functions=SimpleNamespace(
+            decimals=lambda: SimpleNamespace(call=lambda: calls.append(1) or 6)
+        ))
+        registry.contract_objects[('ethereum', 'USDT')] = (None, contract)
+
+        assert registry.get_decimals(None, 'ethereum', 'USDT') == 6
+        assert registry.get_decimals(None, 'ethereum', 'USDT') == 6
+        assert len(calls) == 1
+
+    def test_reload_keeps_metadata(self):
+        """Test that reloading drops contract objects but keeps metadata"""
+        registry = TokenRegistry()
+        registry.set_decimals('polygon', 'USDC', 6)
+        registry.contract_objects[('polygon', 'USDC')] = (None, object())
+
+        info = registry.reload()
+
+        assert registry.contract_objects == {}
+        assert registry.get_cached_decimals('polygon', 'USDC') == 6
+        assert info['tokens']['polygon']['USDC']['decimals'] == 6
+
+    def test_invalid_contract_address_is_skipped(self, monkeypatch):
+        """Test that one malformed contract env var only drops that token"""
+        monkeypatch.setenv('POLYGON_USDT_CONTRACT', 'not-an-address')
+        registry = TokenRegistry()
+
+        assert registry.get_address('polygon', 'USDT') is None
+        assert registry.get_address('polygon', 'USDC') is not None
+        assert registry.get_address('bsc', 'USDT') is not None
+
+
+class FakeMulticall:
+    """Multicall3 stub that answers aggregate3 decimals and balanceOf sub-calls from dicts"""
+
+    def __init__(self, codec, decimals, balances, failing=()):
+        self.codec = codec
+        self.decimals = decimals  # token address -> decimals
+        self.balances = balances  # (token address, holder) -> balance in wei
+        self.failing = set(failing)  # (token address, holder) pairs whose balanceOf reverts
+        self.chunks = []
+        self.functions = SimpleNamespace(aggregate3=self.aggregate3)
+
+    def aggregate3(self, calls):
+        self.chunks.append(list(calls))
+        return SimpleNamespace(call=lambda: [self.answer(target, bytes.fromhex(data[2:])) for target, _, data in calls])
+
+    def answer(self, target, data):
+        if data[:4] == Web3.keccak(text='decimals()')[:4]:
+            return (True, self.codec.encode(['uint8'], [self.decimals[target]]))
+        holder = self.codec.decode(['address'], data[4:])[0]
+        if (target, holder) in self.failing:
+            return (False, b'')
+        return (True, self.codec.encode(['uint256'], [self.balances[(target, holder)]]))
+
+
+class TestTokenBalanceAggregator:
+    """Test Multicall3 token balance aggregation"""
+
+    holders = [Web3.to_checksum_address(f'0x{i:040x}') for i in range(1, 6)]
+
+    def make_aggregator(self, registry, multicall, batch_size=500):
+        web3 = Web3()
+        contract = web3.eth.contract
+
+        def make_contract(address, abi):
+            return multicall if address == MULTICALL3_ADDRESS else contract(address=address, abi=abi)
+
+        fake_web3 = SimpleNamespace(eth=SimpleNamespace(contract=make_contract), codec=web3.codec)
+        fallbacks = []
+
+        def get_token_balance(address, network, token_symbol):
+            fallbacks.append((address, token_symbol))
+            return {'success': True, 'balance': 'fallback', 'token': token_symbol}
+
+        service = SimpleNamespace(
+            get_token_contracts=registry.get_contracts,
+            get_web3_instance=lambda network: fake_web3,
+            token_registry=registry,
+            get_token_balance=get_token_balance
+        )
+        return TokenBalanceAggregator(service, batch_size), fallbacks
+
+    def make_multicall(self, registry, failing=()):
+        usdt, usdc = registry.get_address('ethereum', 'USDT'), registry.get_address('ethereum', 'USDC')
+        balances = {}
+        for i, holder in enumerate(self.holders, start=1):
+            balances[(usdt, holder)] = i * 10**6
+            balances[(usdc, holder)] = i * 10**18
+        failing = {(registry.get_address('ethereum', symbol), holder) for holder, symbol in failing}
+        return FakeMulticall(Web3().codec, {usdt: 6, usdc: 18}, balances, failing)
+
+    def test_mixed_cached_and_uncached_decimals(self):
+        """Test that decimals calls lead the batch and balanceOf results line up after them"""
+        registry = TokenRegistry()
+        registry.set_decimals('ethereum', 'USDT', 6)
+        multicall = self.make_multicall(registry)
+        aggregator, fallbacks = self.make_aggregator(registry, multicall)
+        pairs = [(self.holders[0], 'USDT'), (self.holders[0], 'USDC'), (self.holders[1], 'USDT')]
+
+        results = aggregator.get_token_balances({'ethereum': pairs})['ethereum']
+
+        assert len(multicall.chunks) == 1 and len(multicall.chunks[0]) == 4
+        assert multicall.chunks[0][0][0] == registry.get_address('ethereum', 'USDC')
+        assert [results[pair]['balance'] for pair in pairs] == ['1.0', '1.0', '2.0']
+        assert results[pairs[1]]['balance_wei'] == str(10**18)
+        assert registry.get_cached_decimals('ethereum', 'USDC') == 18
+        assert fallbacks == []
+
+    def test_failed_sub_call_falls_back_to_single_call(self):
+        """Test that a reverted balanceOf is answered by get_token_balance"""
+        registry = TokenRegistry()
+        registry.set_decimals('ethereum', 'USDT', 6)
+        multicall = self.make_multicall(registry, failing=[(self.holders[1], 'USDT')])
+        aggregator, fallbacks = self.make_aggregator(registry, multicall)
+        pairs = [(self.holders[0], 'USDT'), (self.holders[1], 'USDT')]
+
+        results = aggregator.get_token_balances({'ethereum': pairs})['ethereum']
+
+        assert results[pairs[0]]['balance'] == '1.0'
+        assert results[pairs[1]]['balance'] == 'fallback'
+        assert fallbacks == [pairs[1]]
+
+    def test_pairs_are_split_across_chunks(self):
+        """Test that more calls than one batch are spread over several aggregate3 calls in order"""
+        registry = TokenRegistry()
+        registry.set_decimals('ethereum', 'USDT', 6)
+        multicall = self.make_multicall(registry)
+        aggregator, fallbacks = self.make_aggregator(registry, multicall, batch_size=2)
+        pairs = [(holder, 'USDC') for holder in self.holders]
+
+        results = aggregator.get_token_balances({'ethereum': pairs})['ethereum']
+
+        assert [len(calls) for calls in multicall.chunks] == [2, 2, 2]
+        assert [results[pair]['balance'] for pair in pairs] == ['1.0', '2.0', '3.0', '4.0', '5.0']
+        assert fallbacks == []
+
+
+class TestGasOracle:
+    """Test gas fee tier computation"""
+
+    def test_fee_tiers_from_fee_history(self):
+        """Test that tiers use the median reward per percentile and the next base fee"""
+        fee_history = {
+            'baseFeePerGas': [10, 12, 14, 20],
+            'gasUsedRatio': [0.5, 0.0, 0.7],
+            'reward': [[1, 2, 3], [100, 100, 100], [3, 4, 5]],
+            'oldestBlock': 100
+        }
+
+        fees = compute_fee_tiers(fee_history)
+
+        assert fees['base_fee'] == 20
+        # Empty block (gasUsedRatio 0) is ignored
+        assert fees['tiers']['slow']['max_priority_fee_per_gas'] == 2
+        assert fees['tiers']['standard']['max_priority_fee_per_gas'] == 3
+        assert fees['tiers']['fast']['max_fee_per_gas'] == 2 * 20 + 4
+        assert fees['tiers']['fast']['effective_gas_price'] == 24
+
+    def test_legacy_chain_returns_none(self):
+        """Test that chains without a base fee are reported as non EIP-1559"""
+        assert compute_fee_tiers({'baseFeePerGas': [0, 0], 'reward': [], 'gasUsedRatio': [0.1]}) is None
+
+
+
+class TestNonceManager:
+    """Test local nonce reservation"""
+
+    def test_nonces_are_reserved_without_refetching(self):
+        """Test that only the first reservation hits the node"""
+        manager = InMemoryNonceManager()
+        fetches = []
+
+        def fetch_pending():
+            fetches.append(1)
+            return 7
+
+        nonces = [manager.reserve('ethereum', '0xAbC', fetch_pending) for _ in range(3)]
+
+        assert nonces == [7, 8, 9]
+        assert len(fetches) == 1
+
+    def test_resync_refetches_pending_nonce(self):
+        """Test that a resync makes the next reservation use the node value"""
+        manager = InMemoryNonceManager()
+        manager.reserve('polygon', '0xabc', lambda: 3)
+        manager.reserve('polygon', '0xABC', lambda: 3)
+
+        manager.resync('polygon', '0xabc')
+
+        assert manager.reserve('polygon', '0xabc', lambda: 4) == 4
+
+    def test_async_reservations_share_the_counter(self):
+        """Test that async and sync reservations draw from the same sequence"""
+        manager = InMemoryNonceManager()
+
+        async def fetch_pending():
+            return 11
+
+        async def reserve_many():
+            return await asyncio.gather(*(manager.reserve_async('bsc', '0xabc', fetch_pending) for _ in range(3)))
+
+        assert sorted(asyncio.run(reserve_many())) == [11, 12, 13]
+        assert manager.reserve('bsc', '0xabc', lambda: 0) == 14
+
+    def test_idle_nonce_expires(self):
+        """Test that a nonce unused for key_ttl is refetched so outside sends can't leave it ahead"""
+        manager = InMemoryNonceManager(key_ttl=60)
+        assert manager.reserve('ethereum', '0xabc', lambda: 3) == 3
+        assert manager.reserve('ethereum', '0xabc', lambda: 3) == 4
+
+        manager.expires_at['ethereum:0xabc'] -= 61
+
+        assert manager.reserve('ethereum', '0xabc', lambda: 9) == 9
+
+        async def fetch_pending():
+            return 20
+
+        manager.expires_at['ethereum:0xabc'] -= 61
+        assert asyncio.run(manager.reserve_async('ethereum', '0xabc', fetch_pending)) == 20
+
+    def test_dropped_send_resyncs_nonce(self, monkeypatch):
+        """Test that retiring a dropped send makes the next reservation refetch the nonce"""
+        from datetime import datetime, timedelta
+        from flask import Flask
+        from src.models.user import User, Wallet, Transaction, db
+        from src.services.websocket import TransactionMonitor as PendingTransactionMonitor
+
+        class PendingStatuses:
+            async def get_transaction_statuses(self, pairs):
+                return [{'success': True, 'status': 'pending'} for _ in pairs]
+
+        monkeypatch.setattr('src.services.websocket.get_async_blockchain_service', lambda: PendingStatuses())
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            user = User(name='Nonce User', email='nonce@example.com')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, network='ethereum', address='0x' + 'ab' * 20, encrypted_private_key='x')
+            db.session.add(wallet)
+            db.session.commit()
+            db.session.add(Transaction(user_id=user.id, wallet_id=wallet.id, transaction_hash='0x01',
+                                       from_address=wallet.address, to_address='0x' + 'cd' * 20, amount='1',
+                                       currency='ETH', network='ethereum', transaction_type='send',
+                                       created_at=datetime.utcnow() - timedelta(hours=2)))
+            db.session.commit()
+
+            nonces = InMemoryNonceManager()
+            assert nonces.reserve('ethereum', wallet.address, lambda: 5) == 5
+            monitor = PendingTransactionMonitor.__new__(PendingTransactionMonitor)
+            monitor.websocket_manager = SimpleNamespace(broadcast_transaction_update=lambda user_id, tx_data: None)
+            monitor.blockchain_service = SimpleNamespace(
+                nonce_manager=nonces, chain_head=SimpleNamespace(get_cached_block_number=lambda network: None)
+            )
+            monitor.scheduler = PendingTransactionScheduler(drop_timeout=3600)
+            monitor.sync_interval, monitor.last_sync = 0, 0
+
+            asyncio.run(monitor._check_pending_transactions_with_context())
+
+            assert Transaction.query.one().status == 'dropped'
+            assert nonces.reserve('ethereum', wallet.address, lambda: 5) == 5
+            db.drop_all()
+
+    def test_redis_reservations_reseed_after_expiry_and_resync(self):
+        """Test that an expired or resynced key is reseeded from the node instead of counting from zero"""
+        redis_client = FakeRedis()
+        manager = RedisNonceManager(redis_client, key_ttl=60)
+
+        assert [manager.reserve('ethereum', '0xabc', lambda: 7) for _ in range(2)] == [7, 8]
+
+        redis_client.now += 61
+        assert manager.reserve('ethereum', '0xabc', lambda: 9) == 9
+
+        manager.resync('ethereum', '0xabc')
+        assert manager.reserve('ethereum', '0xabc', lambda: 12) == 12
+        assert manager.reserve('ethereum', '0xabc', lambda: 0) == 13
+
+    def test_redis_async_reservations_run_off_the_event_loop(self):
+        """Test that async reservations share the sequence and never call Redis on the loop thread"""
+        redis_client = FakeRedis()
+        manager = RedisNonceManager(redis_client)
+
+        async def fetch_pending():
+            return 5
+
+        async def reserve_many():
+            return await asyncio.gather(*(manager.reserve_async('bsc', '0xabc', fetch_pending) for _ in range(3)))
+
+        assert sorted(asyncio.run(reserve_many())) == [5, 6, 7]
+        assert manager.reserve('bsc', '0xabc', lambda: 0) == 8
+        assert redis_client.calls_on_event_loop == 0
+
+
+class FakeRedis:
+    """In-process Redis stub with key expiry that runs the nonce reserve script atomically"""
+
+    def __init__(self):
+        self.values = {}
+        self.expires_at = {}
+        self.now = 0
+        self.lock = threading.Lock()
+        self.calls_on_event_loop = 0
+
+    def _expire_keys(self):
+        for key, expires_at in list(self.expires_at.items()):
+            if expires_at <= self.now:
+                self.values.pop(key, None)
+                del self.expires_at[key]
+
+    def register_script(self, script):
+        def run(keys, args):
+            # Mirrors RESERVE_SCRIPT: SET NX the seed, else give up on a missing key, then INCR
+            with self.lock:
+                self.calls_on_event_loop += asyncio_running()
+                self._expire_keys()
+                key, (ttl, seed) = keys[0], args
+                if seed != '':
+                    self.values.setdefault(key, int(seed))
+                elif key not in self.values:
+                    return None
+                self.values[key] += 1
+                self.expires_at[key] = self.now + ttl
+                return self.values[key] - 1
+        return run
+
+    def delete(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+            self.expires_at.pop(key, None)
+
+
+def asyncio_running():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+
+class FakeAsyncBatchProvider:
+    """Async provider stub that answers eth_getBalance batches"""
+
+    def __init__(self, balances, fail_batches=0):
+        self.balances = balances
+        self.fail_batches = fail_batches
+        self.batch_sizes = []
+
+    async def make_batch_request(self, calls):
+        self.batch_sizes.append(len(calls))
+        if self.fail_batches:
+            self.fail_batches -= 1
+            raise ValueError('batch rejected')
+        return [{'id': i, 'result': hex(self.balances[params[0]])} for i, (method, params) in enumerate(calls)]
+
+
+class TestAsyncBlockchainService:
+    """Test async blockchain service"""
+
+    def test_balances_are_fetched_in_concurrent_batches(self):
+        """Test that balances are batched per network and failed batches fall back"""
+        balances = {f'0x{i:040x}': i * 10**18 for i in range(5)}
+        provider = FakeAsyncBatchProvider(balances, fail_batches=1)
+        service = AsyncBlockchainService(SimpleNamespace(), batch_size=2)
+        service.get_web3_instance = lambda network: SimpleNamespace(provider=provider)
+
+        result = asyncio.run(service.get_balances({'ethereum': list(balances)}))
+
+        assert sorted(provider.batch_sizes) == [1, 2, 2]
+        assert set(result['ethereum']) == set(balances)
+        succeeded = [r for r in result['ethereum'].values() if r['success']]
+        assert len(succeeded) == 3
+        assert all(r['balance_wei'] == str(balances[a]) for a, r in result['ethereum'].items() if r['success'])
+
+    def test_transaction_statuses_use_batched_receipts(self):
+        """Test that receipts are fetched in batches and counted against the tracked head"""
+        receipts = {
+            '0xaa': {'status': '0x1', 'blockNumber': hex(100), 'gasUsed': hex(21000)},
+            '0xbb': {'status': '0x0', 'blockNumber': hex(105), 'gasUsed': hex(50000)},
+            '0xcc': None
+        }
+        batch_sizes = []
+
+        async def make_batch_request(calls):
+            batch_sizes.append(len(calls))
+            return [{'id': i, 'result': receipts[params[0]]} for i, (method, params) in enumerate(calls)]
+
+        tracker = ChainHeadTracker(SimpleNamespace(), poll_interval=3600)
+        tracker.observe('ethereum', 110)
+        service = AsyncBlockchainService(SimpleNamespace(chain_head=tracker), batch_size=2)
+        provider = SimpleNamespace(make_batch_request=make_batch_request)
+        service.get_web3_instance = lambda network: SimpleNamespace(provider=provider)
+
+        results = asyncio.run(service.get_transaction_statuses([('0xaa', 'ethereum'), ('0xbb', 'ethereum'), ('0xcc', 'ethereum')]))
+
+        assert sorted(batch_sizes) == [1, 2]
+        assert [r['status'] for r in results] == ['confirmed', 'failed', 'pending']
+        assert [r['confirmations'] for r in results] == [10, 5, 0]
+        assert results[1]['gas_used'] == 50000
+        tracker.stop()
+
+
+
+class FakeEth:
+    """eth namespace stub that counts block number lookups"""
+
+    def __init__(self, block_number):
+        self.head = block_number
+        self.lookups = 0
+
+    @property
+    def block_number(self):
+        self.lookups += 1
+        return self.head
+
+
+class TestChainHeadTracker:
+    """Test shared chain-head tracking"""
+
+    def test_block_number_is_served_from_memory(self):
+        """Test that repeated reads reuse the tracked head"""
+        eth = FakeEth(100)
+        service = SimpleNamespace(get_web3_instance=lambda network: SimpleNamespace(eth=eth))
+        tracker = ChainHeadTracker(service, poll_interval=3600)
+
+        assert [tracker.get_block_number('ethereum') for _ in range(500)] == [100] * 500
+        assert eth.lookups == 1
+        tracker.stop()
+
+    def test_listeners_are_notified_on_advance_only(self):
+        """Test that the head never rewinds and listeners fire once per new block"""
+        tracker = ChainHeadTracker(SimpleNamespace(), poll_interval=3600)
+        seen = []
+        tracker.add_listener(lambda network, block_number: seen.append((network, block_number)))
+
+        tracker.observe('polygon', 10)
+        tracker.observe('polygon', 10)
+        tracker.observe('polygon', 9)
+        tracker.observe('polygon', 12)
+
+        assert seen == [('polygon', 10), ('polygon', 12)]
+        assert tracker.get_cached_block_number('polygon') == 12
+        tracker.stop()
+
+
+
+class TestPendingTransactionScheduler:
+    """Test adaptive pending transaction polling"""
+
+    def test_checks_back_off_exponentially(self):
+        """Test that each pending result doubles the wait up to the maximum"""
+        scheduler = PendingTransactionScheduler(min_interval=5, max_interval=30, drop_timeout=3600)
+        scheduler.add(1, '0xaa', 'ethereum', created_at=0, now=0)
+
+        now = 0
+        waits = []
+        for _ in range(5):
+            assert [entry['tx_id'] for entry in scheduler.pop_due(now=now)] == [1]
+            scheduler.reschedule(1, now=now)
+            waits.append(scheduler.next_check_in(now=now))
+            assert scheduler.pop_due(now=now + waits[-1] - 1) == []
+            now += waits[-1]
+
+        assert waits == [5, 10, 20, 30, 30]
+
+    def test_parked_until_new_block(self):
+        """Test that a due transaction waits for its chain to advance"""
+        scheduler = PendingTransactionScheduler(min_interval=5, drop_timeout=3600)
+        heads = {'polygon': 100}
+        scheduler.add(1, '0xaa', 'polygon', created_at=0, now=0)
+        scheduler.pop_due(heads.get, now=0)
+        scheduler.reschedule(1, block_number=100, now=0)
+
+        assert scheduler.pop_due(heads.get, now=10) == []
+        assert scheduler.get_stats()['parked'] == 1
+
+        heads['polygon'] = 101
+        scheduler.on_new_block('polygon', 101)
+        assert [entry['tx_id'] for entry in scheduler.pop_due(heads.get)] == [1]
+
+    def test_dropped_after_timeout(self):
+        """Test that a transaction pending past the timeout is retired"""
+        scheduler = PendingTransactionScheduler(drop_timeout=60)
+        scheduler.add(1, '0xaa', 'bsc', created_at=0, now=0)
+        scheduler.pop_due(now=0)
+
+        assert scheduler.reschedule(1, now=30)
+        assert not scheduler.reschedule(1, now=61)
+        assert scheduler.scheduled_ids() == set()
+
+    def test_expired_transaction_is_not_parked(self):
+        """Test that a transaction past the timeout is handed out for retirement even if its chain stalled"""
+        scheduler = PendingTransactionScheduler(min_interval=5, drop_timeout=60)
+        heads = {'polygon': 100}
+        scheduler.add(1, '0xaa', 'polygon', created_at=0, now=0)
+        scheduler.pop_due(heads.get, now=0)
+        scheduler.reschedule(1, block_number=100, now=58)
+
+        assert [entry['tx_id'] for entry in scheduler.pop_due(heads.get, now=63)] == [1]
+        assert scheduler.get_stats()['parked'] == 0
+        assert not scheduler.reschedule(1, block_number=100, now=63)
+        assert scheduler.scheduled_ids() == set()
+
+    def test_parked_transaction_expires_on_stalled_chain(self):
+        """Test that a parked transaction comes due at its drop deadline without a new block"""
+        scheduler = PendingTransactionScheduler(min_interval=5, drop_timeout=60)
+        heads = {'polygon': 100}
+        scheduler.add(1, '0xaa', 'polygon', created_at=0, now=0)
+        scheduler.pop_due(heads.get, now=0)
+        scheduler.reschedule(1, block_number=100, now=0)
+
+        assert scheduler.pop_due(heads.get, now=10) == []
+        assert scheduler.get_stats()['parked'] == 1
+        assert scheduler.next_check_in(now=10) == 50
+
+        assert [entry['tx_id'] for entry in scheduler.pop_due(heads.get, now=60)] == [1]
+        assert scheduler.get_stats()['parked'] == 0
+        assert not scheduler.reschedule(1, block_number=100, now=60)
+
+
+class TestWalletAddressIndex:
+    """Test custodial address matching"""
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Test that every added item is reported present"""
+        bloom = BloomFilter(1000, 0.01)
+        addresses = [f"0x{i:040x}" for i in range(1000)]
+        bloom.update(addresses)
+
+        assert all(address in bloom for address in addresses)
+        false_positives = sum(f"0x{i:040x}" in bloom for i in range(1000, 11000))
+        assert false_positives < 300
+
+    def test_match_is_case_insensitive_and_per_network(self):
+        """Test that checksummed addresses match and networks stay separate"""
+        index = WalletAddressIndex()
+        index.load([(1, 10, 'ethereum', '0xAbC0000000000000000000000000000000000001')])
+
+        assert index.match('ethereum', '0xabc0000000000000000000000000000000000001') == (1, 10)
+        assert index.match('polygon', '0xabc0000000000000000000000000000000000001') is None
+        assert index.match('ethereum', '0x0000000000000000000000000000000000000002') is None
+        assert index.match('ethereum', None) is None
+
+    def test_match_block_picks_value_transfers_to_wallets(self):
+        """Test that only non-zero transfers to custodial addresses are matched"""
+        scanner = IncomingTransactionScanner.__new__(IncomingTransactionScanner)
+        scanner.index = WalletAddressIndex()
+        scanner.index.load([(1, 10, 'ethereum', '0x00000000000000000000000000000000000000aa')])
+        scanner.stats = {'transactions_seen': 0, 'matches': 0}
+        wallet = '0x00000000000000000000000000000000000000AA'
+        block = {
+            'number': '0x64',
+            'timestamp': '0x5f5e100',
+            'transactions': [
+                {'hash': '0x01', 'from': '0xf1', 'to': wallet, 'value': '0xde0b6b3a7640000', 'gasPrice': '0x1'},
+                {'hash': '0x02', 'from': '0xf1', 'to': wallet, 'value': '0x0'},
+                {'hash': '0x03', 'from': '0xf1', 'to': '0x00000000000000000000000000000000000000bb', 'value': '0x1'},
+                {'hash': '0x04', 'from': '0xf1', 'to': None, 'value': '0x1'}
+            ]
+        }
+
+        matches = scanner.match_block('ethereum', block)
+
+        assert [match['hash'] for match in matches] == ['0x01']
+        assert matches[0]['value'] == 10**18
+        assert matches[0]['block_number'] == 100
+        assert (matches[0]['wallet_id'], matches[0]['user_id']) == (1, 10)
+        assert scanner.stats == {'transactions_seen': 4, 'matches': 1}
+
+
+class FakeLogService:
+    """Async service stub whose eth_getLogs rejects ranges wider than a limit"""
+
+    def __init__(self, max_range, error=None):
+        self.max_range = max_range
+        self.error = error or ValueError("eth_getLogs failed: {'code': -32005, 'message': 'query returned more than 10000 results'}")
+        self.queries = []
+
+    async def get_logs(self, network, address, topics, from_block, to_block):
+        self.queries.append((from_block, to_block))
+        if to_block - from_block + 1 > self.max_range:
+            raise self.error
+        return [{'blockNumber': hex(from_block)}]
+
+
+class TestTokenTransferIndexer:
+    """Test adaptive log ranges and Transfer matching"""
+
+    def make_indexer(self):
+        indexer = TokenTransferIndexer.__new__(TokenTransferIndexer)
+        indexer.initial_range = 1000
+        indexer.max_range = 4000
+        indexer.chunkers = {}
+        indexer.stats = {'log_queries': 0, 'range_retries': 0, 'logs_seen': 0, 'recorded': 0}
+        return indexer
+
+    def test_range_limit_errors(self):
+        """Test that provider size complaints are told apart from other failures"""
+        assert is_range_limit_error(ValueError('query returned more than 10000 results'))
+        assert is_range_limit_error(ValueError('block range is too wide, limit exceeded'))
+        assert is_range_limit_error(asyncio.TimeoutError())
+        assert not is_range_limit_error(ValueError('invalid address'))
+
+    def test_chunker_bounds(self):
+        """Test that the range halves down to the minimum and grows back after successes"""
+        chunker = BlockRangeChunker(initial_size=4, min_size=1, max_size=10, grow_after=2)
+        assert chunker.shrink() and chunker.size == 2
+        assert chunker.shrink() and chunker.size == 1
+        assert not chunker.shrink()
+
+        chunker.record_success()
+        assert chunker.size == 1
+        chunker.record_success()
+        assert chunker.size == 2
+        for _ in range(10):
+            chunker.record_success()
+        assert chunker.size == 10
+
+    def test_iter_logs_shrinks_and_covers_range(self, monkeypatch):
+        """Test that rejected ranges are retried smaller without gaps or overlaps"""
+        service = FakeLogService(max_range=300)
+        monkeypatch.setattr('src.services.token_indexer.get_async_blockchain_service', lambda: service)
+        indexer = self.make_indexer()
+
+        async def collect():
+            return [chunk_end async for chunk_end, _ in indexer.iter_logs('ethereum', '0xToken', 1, 1000)]
+
+        chunk_ends = asyncio.run(collect())
+
+        accepted = [query for query in service.queries if query[1] - query[0] + 1 <= 300]
+        assert accepted[0][0] == 1 and accepted[-1][1] == 1000
+        assert all(later[0] == earlier[1] + 1 for earlier, later in zip(accepted, accepted[1:]))
+        assert chunk_ends == [end for _, end in accepted]
+        assert indexer.stats['range_retries'] == len(service.queries) - len(accepted)
+
+    def test_iter_logs_retries_timeout_with_smaller_range(self, monkeypatch):
+        """Test that a timed-out log query is followed by a successful smaller range"""
+        service = FakeLogService(max_range=500, error=asyncio.TimeoutError())
+        monkeypatch.setattr('src.services.token_indexer.get_async_blockchain_service', lambda: service)
+        indexer = self.make_indexer()
+
+        async def collect():
+            return [chunk_end async for chunk_end, _ in indexer.iter_logs('ethereum', '0xToken', 1, 1000)]
+
+        assert asyncio.run(collect()) == [500, 1000]
+        assert service.queries == [(1, 1000), (1, 500), (501, 1000)]
+        assert indexer.stats['range_retries'] == 1
+
+    def test_log_query_timeout_keeps_endpoint_in_rotation(self):
+        """Test that an eth_getLogs timeout does not back off the endpoint but other timeouts do"""
+        class TimeoutSession:
+            def post(self, url, **kwargs):
+                raise asyncio.TimeoutError()
+
+        router = EndpointRouter(['http://a'])
+        provider = PooledAsyncHTTPProvider(router, TimeoutSession(), timeout=1)
+
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(provider.make_request('eth_getLogs', [{}]))
+        assert router.has_available()
+
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(provider.make_request('eth_blockNumber', []))
+        assert not router.has_available()
+
+    def test_match_logs_by_topic(self):
+        """Test that receipts and sends of custodial wallets are matched from topics"""
+        indexer = self.make_indexer()
+        indexer.index = WalletAddressIndex()
+        indexer.index.load([(1, 10, 'polygon', '0x00000000000000000000000000000000000000aa')])
+        ours = '0x' + '0' * 24 + '00000000000000000000000000000000000000aa'
+        other = '0x' + '0' * 24 + '00000000000000000000000000000000000000bb'
+        log = {'transactionHash': '0x01', 'logIndex': '0x0', 'blockNumber': '0x10', 'data': hex(5 * 10**6)}
+        logs = [
+            dict(log, topics=[TRANSFER_TOPIC, other, ours]),
+            dict(log, transactionHash='0x02', topics=[TRANSFER_TOPIC, ours, other]),
+            dict(log, transactionHash='0x03', topics=[TRANSFER_TOPIC, other, other]),
+            dict(log, transactionHash='0x04', topics=[TRANSFER_TOPIC, other, ours], removed=True),
+            dict(log, transactionHash='0x05', topics=[TRANSFER_TOPIC, other, ours, '0x01'])
+        ]
+
+        matches = indexer.match_logs('polygon', logs)
+
+        assert [(match['hash'], match['transaction_type']) for match in matches] == [('0x01', 'receive'), ('0x02', 'send')]
+        assert matches[0]['value'] == 5 * 10**6
+        assert matches[0]['block_number'] == 16
+
+    def test_every_transfer_leg_is_recorded(self, monkeypatch):
+        """Test that several Transfer logs of one transaction each get a row per custodial wallet"""
+        from flask import Flask
+        from src.models.user import User, Wallet, Transaction, db
+
+        class FakeTokenService:
+            async def get_token_decimals(self, network, symbol):
+                return 6
+
+            async def get_blocks(self, network, numbers, full_transactions=False):
+                return {number: {'timestamp': hex(1700000000)} for number in numbers}
+
+        monkeypatch.setattr('src.services.token_indexer.get_async_blockchain_service', lambda: FakeTokenService())
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            user = User(name='Token User', email='token@example.com')
+            db.session.add(user)
+            db.session.commit()
+            wallets = [
+                Wallet(user_id=user.id, network='polygon', address=f'0x{i:040x}', encrypted_private_key='x')
+                for i in (0xaa, 0xbb)
+            ]
+            db.session.add_all(wallets)
+            db.session.commit()
+            # The send path already stored wallet aa's payout without a log index
+            db.session.add(Transaction(user_id=user.id, wallet_id=wallets[0].id, transaction_hash='0x01',
+                                       from_address=wallets[0].address, to_address=wallets[1].address,
+                                       amount='1', currency='USDT', network='polygon', transaction_type='send'))
+            db.session.commit()
+
+            indexer = self.make_indexer()
+            indexer.websocket_manager = None
+            indexer.index = WalletAddressIndex()
+            indexer.index.load([(wallet.id, user.id, 'polygon', wallet.address) for wallet in wallets])
+            topic = lambda address: '0x' + '0' * 24 + address[2:]
+            other = '0x' + 'cc' * 20
+            log = {'transactionHash': '0x01', 'blockNumber': '0x10', 'data': hex(10**6)}
+            logs = [
+                # Internal transfer aa -> bb, then a batch payout from elsewhere to both wallets in the same tx
+                dict(log, logIndex='0x0', topics=[TRANSFER_TOPIC, topic(wallets[0].address), topic(wallets[1].address)]),
+                dict(log, logIndex='0x1', topics=[TRANSFER_TOPIC, topic(other), topic(wallets[0].address)]),
+                dict(log, logIndex='0x2', topics=[TRANSFER_TOPIC, topic(other), topic(wallets[1].address)])
+            ]
+
+            asyncio.run(indexer._record('polygon', 'USDT', '0xToken', indexer.match_logs('polygon', logs), 16))
+            asyncio.run(indexer._record('polygon', 'USDT', '0xToken', indexer.match_logs('polygon', logs), 16))
+
+            rows = Transaction.query.filter_by(transaction_hash='0x01').order_by(Transaction.log_index).all()
+            assert [(row.log_index, row.wallet_id, row.transaction_type) for row in rows] == [
+                (-1, wallets[0].id, 'send'),
+                (0, wallets[1].id, 'receive'),
+                (1, wallets[0].id, 'receive'),
+                (2, wallets[1].id, 'receive')
+            ]
+            assert indexer.stats['recorded'] == 3
+            db.drop_all()
+
+
+class PagedExplorerMonitor(TransactionMonitor):
+    """Explorer sync over an in-memory chain with one transaction per block"""
+
+    def __init__(self, blocks):
+        super().__init__()
+        self.blocks = blocks
+        self.requests = []
+
+    async def get_address_transactions(self, address, network, page=1, offset=20,
+                                       start_block=0, end_block=99999999, sort='desc'):
+        self.requests.append((start_block, end_block, page))
+        numbers = sorted((b for b in self.blocks if start_block <= b <= end_block), reverse=sort == 'desc')
+        return {
+            'success': True,
+            'transactions': [{'block_number': b} for b in numbers[(page - 1) * offset:page * offset]]
+        }
+
+
+class TestExplorerSync:
+    """Test block-range paging of explorer sync"""
+
+    def test_incremental_range_stops_at_short_page(self):
+        """Test that only blocks above the high-water mark are requested"""
+        monitor = PagedExplorerMonitor(range(1, 101))
+
+        result = asyncio.run(monitor.fetch_block_range('0xaa', 'ethereum', 96, 99999999, 'asc', 10, 5))
+
+        assert result['exhausted']
+        assert [tx['block_number'] for tx in result['transactions']] == [96, 97, 98, 99, 100]
+        assert monitor.requests == [(96, 99999999, 1)]
+
+    def test_range_cut_short_at_max_pages(self):
+        """Test that a long range is left unexhausted after max_pages requests"""
+        monitor = PagedExplorerMonitor(range(1, 101))
+
+        result = asyncio.run(monitor.fetch_block_range('0xaa', 'ethereum', 0, 80, 'desc', 10, 3))
+
+        assert not result['exhausted']
+        assert result['requests'] == 3
+        assert min(tx['block_number'] for tx in result['transactions']) == 51
+
+    def test_store_transactions_in_bulk(self):
+        """Test that new rows are inserted once and changed statuses updated in bulk"""
+        from datetime import datetime
+        from flask import Flask
+        from sqlalchemy import event
+        from src.models.user import User, Wallet, Transaction, db
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            user = User(name='Sync User', email='sync@example.com')
+            db.session.add(user)
+            db.session.commit()
+            wallet = Wallet(user_id=user.id, network='ethereum', address='0xaa', encrypted_private_key='x')
+            db.session.add(wallet)
+            db.session.commit()
+            db.session.add(Transaction(
+                user_id=user.id, wallet_id=wallet.id, transaction_hash='0x01', from_address='0xaa',
+                to_address='0xbb', amount='1', currency='ETH', network='ethereum',
+                transaction_type='send', status='pending'
+            ))
+            db.session.commit()
+
+            def tx(tx_hash, status='confirmed'):
+                return {
+                    'hash': tx_hash, 'from_address': '0xbb', 'to_address': '0xaa', 'value': '1',
+                    'gas_used': '21000', 'gas_price': '1', 'block_number': 1, 'type': 'receive',
+                    'timestamp': datetime(2024, 1, 1).isoformat(), 'status': status
+                }
+
+            db.session.refresh(wallet)
+            statements = []
+            event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+            monitor = TransactionMonitor()
+            added = monitor._store_transactions(wallet, [tx('0x01')] + [tx(f'0x{i:02x}') for i in range(2, 30)] + [tx('0x02')])
+            db.session.commit()
+
+            assert added == 28
+            assert len(statements) == 3
+            assert Transaction.query.count() == 29
+            assert Transaction.query.filter_by(transaction_hash='0x01').one().status == 'confirmed'
+            db.drop_all()
+
+
+class TestExplorerSyncScheduler:
+    """Test quota budgeting and wallet ordering of background explorer sync"""
+
+    def test_token_bucket_limits_rate(self):
+        """Test that the bucket allows a burst and then asks callers to wait"""
+        bucket = InMemoryTokenBucket(rate=5, capacity=2)
+
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == 0
+        wait = bucket.try_acquire()
+        assert 0 < wait <= 0.2
+
+        bucket.updated_at -= wait
+        assert bucket.try_acquire() == 0
+
+    def test_due_wallets_recently_active_first(self):
+        """Test that stale wallets are due and recently viewed ones come first"""
+        from datetime import datetime, timedelta
+        from flask import Flask
+        from src.models.user import User, Wallet, WalletSyncState, db
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        now = datetime(2024, 1, 1, 12, 0)
+        with app.app_context():
+            db.create_all()
+            user = User(name='Sync User', email='sync@example.com')
+            db.session.add(user)
+            db.session.commit()
+            wallets = [
+                Wallet(user_id=user.id, network='ethereum', address=f'0x{i:02x}', encrypted_private_key='x')
+                for i in range(4)
+            ]
+            db.session.add_all(wallets)
+            db.session.commit()
+            db.session.add_all([
+                # Idle and synced recently: not due
+                WalletSyncState(wallet_id=wallets[0].id, last_synced_at=now - timedelta(minutes=5)),
+                # Idle and stale: due
+                WalletSyncState(wallet_id=wallets[1].id, last_synced_at=now - timedelta(hours=2)),
+                # Viewed a minute ago and synced five minutes ago: due first
+                WalletSyncState(wallet_id=wallets[2].id, last_synced_at=now - timedelta(minutes=5),
+                                last_requested_at=now - timedelta(minutes=1))
+                # wallets[3] has never been synced: due
+            ])
+            db.session.commit()
+
+            scheduler = ExplorerSyncScheduler(None, active_stale_after=60, idle_stale_after=3600)
+            due = scheduler.due_wallet_ids(now)
+
+            assert due[0] == wallets[2].id
+            assert set(due) == {wallets[1].id, wallets[2].id, wallets[3].id}
+            db.drop_all()
+
+    def test_requested_wallet_is_due_regardless_of_staleness(self):
+        """Test that a sync request made after the last sync queues a freshly synced wallet"""
+        from datetime import datetime, timedelta
+        from flask import Flask
+        from src.models.user import User, Wallet, WalletSyncState, db
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        now = datetime(2024, 1, 1, 12, 0)
+        with app.app_context():
+            db.create_all()
+            user = User(name='Sync User', email='sync@example.com')
+            db.session.add(user)
+            db.session.commit()
+            wallets = [
+                Wallet(user_id=user.id, network='ethereum', address=f'0x{i:02x}', encrypted_private_key='x')
+                for i in range(2)
+            ]
+            db.session.add_all(wallets)
+            db.session.commit()
+            db.session.add_all([
+                # Requested after its sync ten seconds ago: due
+                WalletSyncState(wallet_id=wallets[0].id, last_synced_at=now - timedelta(seconds=20),
+                                last_requested_at=now - timedelta(seconds=10)),
+                # Requested before that sync: already served
+                WalletSyncState(wallet_id=wallets[1].id, last_synced_at=now - timedelta(seconds=20),
+                                last_requested_at=now - timedelta(seconds=30))
+            ])
+            db.session.commit()
+
+            scheduler = ExplorerSyncScheduler(None, active_stale_after=60, idle_stale_after=3600)
+
+            assert scheduler.due_wallet_ids(now) == [wallets[0].id]
+            db.drop_all()
+
+    def test_backfill_request_keeps_wallet_due_until_complete(self):
+        """Test that a requested backfill is due on every pass and first in line until history is complete"""
+        from datetime import datetime, timedelta
+        from flask import Flask
+        from src.models.user import User, Wallet, WalletSyncState, db
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        now = datetime.utcnow()
+        with app.app_context():
+            db.create_all()
+            user = User(name='Sync User', email='sync@example.com')
+            db.session.add(user)
+            db.session.commit()
+            wallets = [
+                Wallet(user_id=user.id, network='ethereum', address=f'0x{i:02x}', encrypted_private_key='x')
+                for i in range(2)
+            ]
+            db.session.add_all(wallets)
+            db.session.commit()
+            db.session.add_all([
+                WalletSyncState(wallet_id=wallets[0].id, last_synced_at=now - timedelta(seconds=5),
+                                last_requested_at=now - timedelta(seconds=10)),
+                # Never synced, so due anyway; the backfill request should still go first
+                WalletSyncState(wallet_id=wallets[1].id)
+            ])
+            db.session.commit()
+            scheduler = ExplorerSyncScheduler(None, active_stale_after=60, idle_stale_after=3600)
+            assert scheduler.due_wallet_ids(now) == [wallets[1].id]
+
+            mark_wallet_requested(wallets[0], backfill=True)
+            wallets[0].sync_state.last_synced_at = datetime.utcnow()
+            db.session.commit()
+            assert scheduler.due_wallet_ids() == [wallets[0].id, wallets[1].id]
+
+            wallets[0].sync_state.backfill_complete = True
+            db.session.commit()
+            assert scheduler.due_wallet_ids() == [wallets[1].id]
+            db.drop_all()
+
+
+class TestOutboundHTTPClient:
+    """Test retry policies and metrics of the shared HTTP client"""
+
+    def make_client(self, statuses):
+        import httpx
+        responses = iter(statuses)
+        client = OutboundHTTPClient(retry_backoff=0)
+        client.sync_client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(next(responses))))
+        return client
+
+    def test_idempotent_request_retried_on_transient_status(self):
+        """Test that a GET is retried after a 503 and the retry is counted"""
+        client = self.make_client([503, 200])
+
+        response = client.request_sync('coingecko', 'GET', 'https://api.example.com/price')
+
+        assert response.status_code == 200
+        stats = client.get_stats()['integrations']['coingecko']
+        assert stats['requests'] == 2
+        assert stats['retries'] == 1
+        assert stats['statuses'] == {503: 1, 200: 1}
+
+    def test_non_idempotent_request_not_retried(self):
+        """Test that a POST is sent once even when the response is retryable"""
+        client = self.make_client([503, 200])
+
+        response = client.request_sync('explorer', 'POST', 'https://api.example.com/verify')
+
+        assert response.status_code == 503
+        assert client.get_stats()['integrations']['explorer']['retries'] == 0
+
+    def test_async_pool_reused_within_loop(self):
+        """Test that requests on one event loop share one connection pool"""
+        client = OutboundHTTPClient()
+
+        async def pools():
+            return client.get_async_client(), client.get_async_client()
+
+        first, second = asyncio.run(pools())
+        assert first is second
+
+
+class TestAsyncBridge:
+    """Test running coroutines on the shared background loop"""
+
+    def test_runs_on_one_persistent_loop(self):
+        """Test that successive calls reuse the same event loop"""
+        bridge = AsyncBridge()
+
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        try:
+            assert bridge.run(current_loop()) is bridge.run(current_loop())
+        finally:
+            bridge.stop()
+
+    def test_timeout_cancels_coroutine(self):
+        """Test that a slow coroutine times out and is cancelled"""
+        bridge = AsyncBridge()
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        try:
+            with pytest.raises(TimeoutError):
+                bridge.run(slow(), timeout=0.05)
+            time.sleep(0.05)
+            assert cancelled == [True]
+        finally:
+            bridge.stop()
+
+    def test_caller_context_is_visible(self):
+        """Test that the Flask app context of the caller reaches the coroutine"""
+        from flask import Flask, current_app
+        app = Flask('bridge-test')
+        bridge = AsyncBridge()
+
+        async def app_name():
+            return current_app.name
+
+        try:
+            with app.app_context():
+                assert bridge.run(app_name()) == 'bridge-test'
+        finally:
+            bridge.stop()
+
+
+class FakePriceHTTPClient:
+    """Outbound client stub answering /simple/price from a table"""
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    async def request(self, integration, method, url, params=None, **kwargs):
+        import httpx
+        self.calls.append(params)
+        ids = params['ids'].split(',')
+        currencies = params['vs_currencies'].split(',')
+        body = {
+            coin_id: {
+                **{currency: self.prices[coin_id] for currency in currencies},
+                **{f'{currency}_24h_change': 1.5 for currency in currencies}
+            }
+            for coin_id in ids if coin_id in self.prices
+        }
+        return httpx.Response(200, json=body)
+
+
+class TestPriceService:
+    """Test batched price fetching"""
+
+    def make_service(self, monkeypatch, prices):
+        http = FakePriceHTTPClient(prices)
+        monkeypatch.setattr('src.services.blockchain.get_http_client', lambda: http)
+        history = PriceHistoryStore('unused', flush_interval=float('inf'))
+        monkeypatch.setattr('src.services.blockchain.get_price_history_store', lambda: history)
+        service = PriceService()
+        service.api_key = 'key'
+        service.demo_mode = False
+        return service, http
+
+    def test_chunk_price_ids_respects_limits(self):
+        """Test that id chunks stay within the length and count limits"""
+        ids = [f'coin-{i}' for i in range(20)]
+
+        chunks = chunk_price_ids(ids, max_length=30, max_count=3)
+
+        assert [coin_id for chunk in chunks for coin_id in chunk] == ids
+        assert all(len(','.join(chunk)) <= 30 and len(chunk) <= 3 for chunk in chunks)
+
+    def test_portfolio_prices_in_one_call(self, monkeypatch):
+        """Test that ten coins and two currencies cost one upstream call"""
+        coins = [f'coin-{i}' for i in range(10)]
+        service, http = self.make_service(monkeypatch, {coin: float(i) for i, coin in enumerate(coins)})
+
+        results = asyncio.run(service.get_prices(coins, ['usd', 'eur']))
+
+        assert len(http.calls) == 1
+        assert results['coin-3']['eur']['price'] == 3.0
+        assert results['coin-3']['usd']['change_24h'] == 1.5
+
+    def test_unknown_coin_reported_per_symbol(self, monkeypatch):
+        """Test that a missing coin fails alone and symbols map back case-insensitively"""
+        service, http = self.make_service(monkeypatch, {'ethereum': 2500.0})
+
+        results = asyncio.run(service.get_prices(['Ethereum', 'not-a-coin']))
+
+        assert results['Ethereum']['usd']['price'] == 2500.0
+        assert not results['not-a-coin']['usd']['success']
+        assert asyncio.run(service.get_price('ethereum'))['price'] == 2500.0
+
+    def test_cached_prices_skip_upstream(self, monkeypatch):
+        """Test that only pairs missing from the cache are fetched"""
+        service, http = self.make_service(monkeypatch, {'bitcoin': 43000.0, 'ethereum': 2500.0})
+        monkeypatch.setattr(service.cache, '_ensure_thread', lambda: None)
+
+        asyncio.run(service.get_prices(['bitcoin']))
+        results = asyncio.run(service.get_prices(['bitcoin', 'ethereum']))
+
+        assert [call['ids'] for call in http.calls] == ['bitcoin', 'ethereum']
+        assert results['bitcoin']['usd']['price'] == 43000.0
+
+
+class TestPriceCache:
+    """Test stale-while-revalidate price caching"""
+
+    def make_cache(self, **kwargs):
+        calls = []
+
+        async def fetcher(ids, vs_currencies):
+            calls.append((ids, vs_currencies))
+            return {
+                coin_id: {vs: {'success': coin_id != 'unknown', 'price': 1.0} for vs in vs_currencies}
+                for coin_id in ids
+            }
+
+        cache = PriceCache(fetcher, **kwargs)
+        cache._ensure_thread = lambda: None
+        return cache, calls
+
+    def test_fresh_stale_and_expired_entries(self):
+        """Test that entries are served fresh, then marked stale, then dropped"""
+        cache, _ = self.make_cache(fresh_ttl=30, stale_ttl=300)
+        cache.store({'bitcoin': {'usd': {'success': True, 'price': 1.0}}})
+        key = ('bitcoin', 'usd')
+
+        assert 'stale' not in cache.get_many([key])[key]
+        cache.entries[key]['updated_at'] -= 60
+        assert cache.get_many([key])[key]['stale'] is True
+        cache.entries[key]['updated_at'] -= 600
+        assert cache.get_many([key]) == {}
+
+    def test_refresher_batches_hot_keys(self):
+        """Test that one refresh fetches every hot pair and drops unknown coins"""
+        cache, calls = self.make_cache(hot_window=600)
+        cache.get_many([('bitcoin', 'usd'), ('ethereum', 'eur'), ('unknown', 'usd')])
+        cache.requested_at[('dogecoin', 'usd')] = 0  # Outside the hot window
+
+        asyncio.run(cache.refresh_hot())
+
+        assert calls == [(['bitcoin', 'ethereum', 'unknown'], ['usd', 'eur'])]
+        assert ('ethereum', 'eur') in cache.entries
+        assert set(cache.requested_at) == {('bitcoin', 'usd'), ('ethereum', 'eur')}
+
+    def test_concurrent_misses_share_one_fetch(self):
+        """Test that callers missing the same pair at once wait for a single upstream call"""
+        cache, calls = self.make_cache()
+        fetcher = cache.fetcher
+
+        async def slow_fetcher(ids, vs_currencies):
+            await asyncio.sleep(0.05)
+            return await fetcher(ids, vs_currencies)
+
+        cache.fetcher = slow_fetcher
+
+        async def fetch_concurrently():
+            return await asyncio.gather(
+                cache.fetch([('bitcoin', 'usd')]),
+                cache.fetch([('bitcoin', 'usd'), ('ethereum', 'usd')])
+            )
+
+        first, second = asyncio.run(fetch_concurrently())
+
+        assert calls == [(['bitcoin'], ['usd']), (['ethereum'], ['usd'])]
+        assert first[('bitcoin', 'usd')] is second[('bitcoin', 'usd')]
+        assert cache.stats['coalesced'] == 1
+        assert cache.in_flight == {}
+
+    def test_failed_fetch_reaches_every_waiter(self):
+        """Test that a failing upstream call is raised to joined callers and not left in flight"""
+        cache, _ = self.make_cache()
+
+        async def failing_fetcher(ids, vs_currencies):
+            await asyncio.sleep(0.05)
+            raise ValueError('upstream down')
+
+        cache.fetcher = failing_fetcher
+
+        async def fetch_concurrently():
+            return await asyncio.gather(
+                cache.fetch([('bitcoin', 'usd')]), cache.fetch([('bitcoin', 'usd')]), return_exceptions=True
+            )
+
+        results = asyncio.run(fetch_concurrently())
+
+        assert [str(result) for result in results] == ['upstream down', 'upstream down']
+        assert cache.in_flight == {}
+
+
+class TestPriceTicker:
+    """Test Socket.IO price tick fan-out"""
+
+    def make_ticker(self, prices):
+        emitted = []
+        socketio = SimpleNamespace(emit=lambda event, data, room=None: emitted.append((room, data['price'])))
+        ticker = PriceTicker(SimpleNamespace(socketio=socketio), min_change=0.01)
+        calls = []
+
+        async def get_prices(symbols, vs_currencies):
+            calls.append((symbols, vs_currencies))
+            return {
+                symbol: {vs: {'success': True, 'price': prices[symbol], 'change_24h': 0.0} for vs in vs_currencies}
+                for symbol in symbols
+            }
+
+        ticker.price_service = SimpleNamespace(get_prices=get_prices)
+        return ticker, calls, emitted
+
+    def test_one_poll_for_all_subscribers(self):
+        """Test that many sessions on a symbol cost one poll and one emit per room"""
+        prices = {'ethereum': 2500.0, 'bitcoin': 43000.0}
+        ticker, calls, emitted = self.make_ticker(prices)
+        for session_id in range(100):
+            ticker.subscribe(str(session_id), 'ETHEREUM')
+        ticker.subscribe('0', 'bitcoin')
+
+        asyncio.run(ticker.tick_once())
+
+        assert calls == [(['ethereum', 'bitcoin'], ['usd'])]
+        assert sorted(emitted) == [('price_bitcoin_usd', 43000.0), ('price_ethereum_usd', 2500.0)]
+
+    def test_small_moves_are_suppressed(self):
+        """Test that ticks are only pushed when the price moves past the threshold"""
+        prices = {'ethereum': 2500.0}
+        ticker, _, emitted = self.make_ticker(prices)
+        ticker.subscribe('a', 'ethereum')
+
+        asyncio.run(ticker.tick_once())
+        prices['ethereum'] = 2510.0  # 0.4%
+        asyncio.run(ticker.tick_once())
+        prices['ethereum'] = 2550.0  # 2% from the last push
+        ticks = asyncio.run(ticker.tick_once())
+
+        assert [price for _, price in emitted] == [2500.0, 2550.0]
+        assert ticks[0]['previous_price'] == 2500.0
+
+    def test_disconnect_drops_symbol_from_poll(self):
+        """Test that a symbol without subscribers is no longer polled"""
+        ticker, calls, _ = self.make_ticker({'ethereum': 2500.0})
+        ticker.subscribe('a', 'ethereum')
+        ticker.remove_session('a')
+
+        assert asyncio.run(ticker.tick_once()) == []
+        assert calls == []
+
+    def test_subscriptions_are_validated_and_capped(self):
+        """Test that only supported symbols are accepted, up to the per-session cap"""
+        ticker, _, _ = self.make_ticker({})
+        ticker.supported_symbols = {'bitcoin', 'ethereum', 'tether'}
+        ticker.max_symbols = 2
+
+        assert ticker.check_subscription('a', ['Bitcoin', 'ethereum'], 'usd') is None
+        assert ticker.check_subscription('a', 'bitcoin', 'usd') == 'symbols must be a list of coin ids'
+        assert ticker.check_subscription('a', ['bitcoin', 'x' * 1000], 'usd') == f"Unsupported symbol: {'x' * 50}"
+        assert ticker.check_subscription('a', ['bitcoin', 'ethereum', 'tether'], 'usd') is not None
+
+        ticker.subscribe('a', 'bitcoin')
+        ticker.subscribe('a', 'ethereum')
+        assert ticker.check_subscription('a', ['bitcoin'], 'usd') is None
+        assert ticker.check_subscription('a', ['tether'], 'usd') == 'At most 2 symbols can be subscribed'
+        assert ticker.check_subscription('b', ['tether'], 'usd') is None
+
+
+class TestPriceHistoryStore:
+    """Test OHLC downsampling and segment file storage"""
+
+    def test_compute_ohlc(self):
+        """Test that points are bucketed into open/high/low/close candles"""
+        timestamps = np.array([0, 10, 50, 60, 119], dtype=np.float64)
+        prices = np.array([5, 7, 4, 6, 8], dtype=np.float64)
+
+        candles = compute_ohlc(timestamps, prices, 60)
+
+        assert candles['time'].tolist() == [0, 60]
+        assert candles[0][['open', 'high', 'low', 'close']].tolist() == (5.0, 7.0, 4.0, 4.0)
+        assert candles[1][['open', 'high', 'low', 'close']].tolist() == (6.0, 8.0, 6.0, 8.0)
+
+    def test_history_spans_flushed_and_recent_points(self, tmp_path):
+        """Test that a query merges segment files with points not yet flushed"""
+        store = PriceHistoryStore(str(tmp_path), flush_interval=float('inf'))
+        for minute, price in enumerate([100.0, 104.0, 98.0, 101.0]):
+            store.record('Ethereum', 'usd', price, 3600 + minute * 60 + 5)
+        store.flush(now=3600 + 3 * 60 + 30)  # The last minute is still open
+        store.record('ethereum', 'usd', 110.0, 3600 + 3 * 60 + 40)
+
+        minutes = store.get_history('ethereum', 'usd', '1m', start=3600, end=7200)
+        hours = store.get_history('ethereum', 'usd', '1h', start=3700, end=7200)
+
+        assert (tmp_path / 'ethereum_usd' / '1m' / '0.npy').exists()
+        assert minutes['close'].tolist() == [100.0, 104.0, 98.0, 110.0]
+        assert hours[['time', 'open', 'high', 'low', 'close']].tolist() == [(3600, 100.0, 110.0, 98.0, 110.0)]
+
+    def test_retention_drops_old_segments(self, tmp_path):
+        """Test that 1m segments past retention are deleted while daily candles remain"""
+        store = PriceHistoryStore(str(tmp_path), flush_interval=float('inf'),
+                                  retention={'1m': 86400, '1h': None, '1d': None})
+        store.record('bitcoin', 'usd', 43000.0, 100)
+        store.flush(now=200)
+        store.record('bitcoin', 'usd', 44000.0, 3 * 86400)
+        store.flush(now=3 * 86400 + 120)
+
+        assert not (tmp_path / 'bitcoin_usd' / '1m' / '0.npy').exists()
+        assert store.get_history('bitcoin', 'usd', '1d', start=0, end=4 * 86400)['close'].tolist() == [43000.0, 44000.0]
+
+    def test_background_flusher_writes_segments(self, tmp_path):
+        """Test that completed minutes reach the segment files without an explicit flush"""
+        store = PriceHistoryStore(str(tmp_path), flush_interval=0.05)
+        timestamp = time.time() - 120  # In a completed minute and within 1m retention
+        store.record('bitcoin', 'usd', 43000.0, timestamp)
+
+        segment = tmp_path / 'bitcoin_usd' / '1m' / f'{int(timestamp) // 86400 * 86400}.npy'
+        deadline = time.time() + 5
+        while not segment.exists() and time.time() < deadline:
+            time.sleep(0.05)
+        store.stop()
+
+        assert segment.exists()
+        assert store.get_history('bitcoin', 'usd', '1m', start=timestamp - 60)['close'].tolist() == [43000.0]
+
+    def test_workers_sharing_a_directory_keep_every_candle(self, tmp_path):
+        """Test that stores flushing into one segment at once (as gunicorn workers do) lose no bars"""
+        stores = [PriceHistoryStore(str(tmp_path), flush_interval=float('inf')) for _ in range(8)]
+        for i, store in enumerate(stores):
+            for minute in range(i, 200, len(stores)):
+                store.record('bitcoin', 'usd', 43000.0 + minute, minute * 60)
+
+        threads = [threading.Thread(target=store.flush, kwargs={'now': 86400 - 60}) for store in stores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        reader = PriceHistoryStore(str(tmp_path), flush_interval=float('inf'))
+        assert len(reader.get_history('bitcoin', 'usd', '1m', start=0, end=86400)) == 200
+
+    def test_relative_directory_is_under_instance_folder(self, tmp_path):
+        """Test that a relative history directory doesn't depend on the working directory"""
+        from flask import Flask
+        app = Flask(__name__, instance_path=str(tmp_path))
+
+        with app.app_context():
+            assert resolve_history_dir('price_history') == str(tmp_path / 'price_history')
+        assert resolve_history_dir(str(tmp_path / 'abs')) == str(tmp_path / 'abs')
+
+
+class TestPortfolioValuation:
+    """Test vectorized portfolio valuation"""
+
+    def make_engine(self, prices):
+        calls = []
+
+        async def get_prices(ids, vs_currencies):
+            calls.append(ids)
+            return {
+                coin_id: {vs: {'success': True, 'price': prices[coin_id][vs], 'change_24h': 25.0} for vs in vs_currencies}
+                for coin_id in ids if coin_id in prices
+            }
+
+        return PortfolioValuationEngine(SimpleNamespace(get_prices=get_prices)), calls
+
+    def test_value_holdings(self):
+        """Test totals, shares and 24h P&L across currencies"""
+        prices = np.array([[2000.0, 1800.0], [1.0, np.nan]])
+        changes = np.array([[25.0, 25.0], [0.0, 0.0]])
+
+        valuation = value_holdings(['ETH', 'USDT'], np.array([2.0, 1000.0]), ['usd', 'eur'], prices, changes)
+
+        assert valuation['totals']['usd']['value'] == 5000.0
+        assert valuation['totals']['usd']['pnl_24h'] == pytest.approx(800.0)
+        assert valuation['totals']['eur'] == pytest.approx(
+            {'value': 3600.0, 'pnl_24h': 720.0, 'change_24h': 25.0, 'complete': False, 'stale': False}
+        )
+        assert valuation['assets']['ETH']['values']['usd']['share'] == 0.8
+        assert valuation['assets']['USDT']['values']['eur']['value'] is None
+
+    def test_user_valuation_sums_networks(self):
+        """Test that one asset held on several networks is valued once from its summed amount"""
+        prices = {'ethereum': {'usd': 2000.0}, 'tether': {'usd': 1.0}}
+        engine, calls = self.make_engine(prices)
+        symbols = {'ethereum': 'ETH', 'arbitrum': 'ETH'}
+        native = {'ethereum': '1.5', 'arbitrum': '0.5'}
+        tokens = {'ethereum': {'USDT': '100'}, 'arbitrum': {'USDT': 'n/a'}}
+
+        valuation = asyncio.run(engine.value_user(native, tokens, symbols))
+
+        assert calls == [['ethereum', 'tether']]
+        assert valuation['assets']['ETH']['amount'] == 2.0
+        assert valuation['assets']['USDT']['amount'] == 100.0
+        assert valuation['totals']['usd']['value'] == 4100.0
+
+
+class TestPortfolioSnapshotService:
+    """Test concurrent portfolio fan-out with per-source fallbacks"""
+
+    def make_service(self, native_delays, token_balance='100'):
+        blockchain_service = SimpleNamespace(
+            networks={'ethereum': {'symbol': 'ETH'}, 'polygon': {'symbol': 'MATIC'}},
+            get_token_contracts=lambda: {'ethereum': {'USDT': '0xdac17f958d2ee523a2206206994597c13d831ec7'}},
+            get_token_balances=lambda pairs: {
+                network: {pair: {'success': token_balance is not None, 'balance': token_balance} for pair in network_pairs}
+                for network, network_pairs in pairs.items()
+            }
+        )
+        cache = PriceCache(None)
+        cache._ensure_thread = lambda: None
+
+        async def get_prices(ids, vs_currencies):
+            prices = {'ethereum': 2000.0, 'matic-network': 1.0, 'tether': 1.0}
+            return {coin_id: {vs: {'success': True, 'price': prices[coin_id]} for vs in vs_currencies} for coin_id in ids}
+
+        engine = PortfolioValuationEngine(SimpleNamespace(get_prices=get_prices, cache=cache))
+        service = PortfolioSnapshotService(blockchain_service, engine, balance_timeout=0.2)
+
+        async def fetch_native(network, addresses):
+            await asyncio.sleep(native_delays[network])
+            return {address: {'success': True, 'balance': '2'} for address in addresses}
+
+        service._fetch_native = fetch_native
+        return service
+
+    wallets = [
+        {'id': 1, 'network': 'ethereum', 'address': '0xaaa', 'balance': '1'},
+        {'id': 2, 'network': 'polygon', 'address': '0xbbb', 'balance': '5'}
+    ]
+
+    def test_slow_chain_falls_back_to_stored_balance(self):
+        """Test that chains are queried concurrently and a timed-out one serves its stored balance"""
+        service = self.make_service({'ethereum': 0.1, 'polygon': 1.0})
+
+        start_time = time.time()
+        snapshot = asyncio.run(service.build(self.wallets))
+
+        assert time.time() - start_time < 0.5
+        assert [(wallet['balance'], wallet['stale']) for wallet in snapshot['wallets']] == [('2', False), ('5', True)]
+        assert snapshot['sources']['balances:polygon']['status'] == 'timeout'
+        assert snapshot['sources']['balances:ethereum']['status'] == 'ok'
+        assert snapshot['valuation']['totals']['usd']['value'] == 2 * 2000.0 + 5 * 1.0 + 100.0
+        assert snapshot['stale'] is True
+
+    def test_token_balance_falls_back_to_last_known(self):
+        """Test that a failed token read reuses the last balance seen, marked stale"""
+        service = self.make_service({'ethereum': 0, 'polygon': 0})
+        first = asyncio.run(service.build(self.wallets))
+
+        service.blockchain_service.get_token_balances = lambda pairs: {}
+        second = asyncio.run(service.build(self.wallets))
+
+        assert first['wallets'][0]['tokens']['USDT'] == {'balance': '100', 'stale': False}
+        assert second['wallets'][0]['tokens']['USDT'] == {'balance': '100', 'stale': True}
+        assert first['stale'] is False
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])